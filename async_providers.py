@@ -0,0 +1,177 @@
+import itertools
+import json
+import os
+import time
+
+from chat_messages import gemini_body, openai_body
+from gemini_stream import GEMINI_BASE_URL, SSEDecoder, chunk_text, stream_url
+from providers import ProviderError
+from resilience import async_call_with_retry
+from telemetry import StreamTimer
+
+# httpx ships as httpx2 with newer OpenAI SDKs; either provides the asyncio client
+try:
+    import httpx2 as httpx
+except ImportError:
+    try:
+        import httpx
+    except ImportError:
+        httpx = None
+
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+# Upstream client defaults for the asyncio API
+MAX_CONNECTIONS = 512     # sockets open to upstream across all requests
+SHARD_SIZE = 64           # sockets per client; see AsyncClientPool
+KEEPALIVE_EXPIRY = 60     # seconds an idle socket stays open
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60         # longest gap between streamed chunks
+
+
+# Function to build one asyncio HTTP client with a bounded connection pool
+def build_async_client(max_connections=SHARD_SIZE):
+    if httpx is None:
+        raise RuntimeError("the asyncio API needs httpx (installed with the openai package)")
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+    )
+
+
+# The upstream connections shared by every request, spread over several small clients.
+# httpcore checks every pooled connection each time a request is queued, so one client
+# with hundreds of sockets spends more time scanning its pool than sending; requests are
+# handed to the clients round-robin instead.
+class AsyncClientPool:
+    def __init__(self, max_connections=MAX_CONNECTIONS, shard_size=SHARD_SIZE):
+        shards = max(1, -(-max_connections // shard_size))
+        self.clients = [build_async_client(-(-max_connections // shards)) for _ in range(shards)]
+        self._next = itertools.cycle(self.clients)
+
+    def get(self):
+        return next(self._next)
+
+    async def aclose(self):
+        for client in self.clients:
+            await client.aclose()
+
+
+# A streaming reply from an asyncio provider: `async for` over the text chunks, then
+# aclose() to release the connection (also done when iteration ends)
+class AsyncTextStream:
+    def __init__(self, response, chunk_text, name):
+        self.response = response
+        self.chunk_text = chunk_text
+        self.name = name
+        self.timer = StreamTimer()
+        self.parts = []
+        self.usage = None
+
+    async def __aiter__(self):
+        decoder = SSEDecoder()
+        error = None
+        try:
+            async for line in self.response.aiter_lines():
+                for text in self._texts(decoder.feed, line):
+                    yield text
+            for text in self._texts(lambda _: decoder.flush(), None):
+                yield text
+        except httpx.HTTPError as e:
+            error = e
+            raise ProviderError(f"{self.name} stream broke off: {e}") from e
+        except ProviderError as e:
+            error = e
+            raise
+        finally:
+            await self.response.aclose()
+            self.timer.finish("".join(self.parts), self.usage, error)
+
+    # Function to decode one line into its text chunks, timing the decoding
+    def _texts(self, decode, line):
+        started = time.perf_counter()
+        texts = []
+        for chunk in decode(line):
+            if "error" in chunk:
+                error = chunk["error"]
+                raise ProviderError(error.get("message", str(error)) if isinstance(error, dict) else str(error))
+            self.usage = chunk.get("usageMetadata", self.usage)
+            text = self.chunk_text(chunk)
+            if text:
+                texts.append(text)
+        self.timer.parse += time.perf_counter() - started
+        if texts:
+            self.timer.chunk()
+            self.parts.extend(texts)
+        return texts
+
+    async def aclose(self):
+        await self.response.aclose()
+
+
+# Function to POST a pre-encoded body with retries and start reading the SSE reply.
+# HTTP errors are raised here, before any text is handed out.
+async def _open_stream(clients, endpoint, url, body, headers, chunk_text, name, api_key=None):
+    client = clients.get()
+    try:
+        response = await async_call_with_retry(
+            endpoint,
+            lambda: client.send(client.build_request("POST", url, content=body, headers=headers), stream=True),
+            api_key=api_key,
+        )
+    except httpx.HTTPError as e:
+        raise ProviderError(f"{name} request failed: {e!r}") from e
+    if response.status_code != 200:
+        text = (await response.aread()).decode("utf-8", errors="replace")
+        await response.aclose()
+        raise ProviderError(f"{name} returned {response.status_code} - {text}")
+    return AsyncTextStream(response, chunk_text, name)
+
+
+# Gemini over the streamGenerateContent REST endpoint, without blocking the event loop
+class AsyncGeminiProvider:
+    def __init__(self, clients, api_key, model="gemini-2.0-flash", base_url=GEMINI_BASE_URL):
+        self.clients = clients
+        self.name = f"gemini/{model}"
+        self.api_key = api_key
+        self.url = stream_url(model, api_key, base_url)
+
+    async def stream(self, messages):
+        return await self.stream_payload(gemini_body(messages))
+
+    # Function to stream a request body built by the caller, as a dict or encoded bytes
+    # (the older app variants build their own Gemini payloads)
+    async def stream_payload(self, payload):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        return await _open_stream(
+            self.clients, self.url.split("?", 1)[0], self.url, body,
+            {"Content-Type": "application/json"}, chunk_text, self.name, self.api_key,
+        )
+
+
+# Function to pull the text out of one OpenAI chat-completions stream chunk
+def openai_chunk_text(chunk):
+    try:
+        return chunk["choices"][0]["delta"].get("content") or ""
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return ""
+
+
+# OpenAI chat completions over plain HTTP, without blocking the event loop
+class AsyncOpenAIProvider:
+    def __init__(self, clients, api_key, model="gpt-3.5-turbo", base_url=OPENAI_BASE_URL):
+        self.clients = clients
+        self.name = f"openai/{model}"
+        self.model = model
+        self.url = f"{base_url.rstrip('/')}/chat/completions"
+        self.api_key = api_key
+        self.headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+
+    async def stream(self, messages):
+        return await _open_stream(
+            self.clients, self.name, self.url, openai_body(self.model, messages, stream=True),
+            self.headers, openai_chunk_text, self.name, self.api_key,
+        )
@@ -0,0 +1,281 @@
+# Offline batch evaluation: run every prompt in a JSONL file through one app variant's
+# pipeline (its local routing, then its guardrails and the completion cache or its
+# upstream call) and write one JSONL result per prompt. Used to compare answers across
+# versions of the apps; --no-cache asks upstream for every prompt.
+#
+#   GEMINI_API_KEY=... python batch_eval.py prompts.jsonl results.jsonl --variant geminiAppV4
+#   python batch_eval.py prompts.jsonl results.jsonl --variant geminiAppV6.py --concurrency 128 --rate 50
+#
+# Each input line is a JSON object; the prompt is read from --field (by default the first
+# of prompt, message, input, body) and the record id from --id-field (default id or
+# request_id, else the line number). Plain strings are accepted as prompts too. Results
+# are appended as they finish, so an interrupted run continues where it stopped when
+# started again with the same output file; --retry-errors also redoes failed prompts.
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from async_providers import AsyncClientPool, AsyncGeminiProvider, AsyncOpenAIProvider
+from faq_index import get_index
+from guardrails import guardrails
+from pipeline import VARIANTS, Turn, answer_key, resolve_variant, validate
+from providers import ProviderError
+from resilience import CircuitOpenError
+from response_cache import completion_cache
+from shared_state import off_loop
+
+PROMPT_FIELDS = ("prompt", "message", "input", "body")
+ID_FIELDS = ("id", "request_id")
+
+
+# Token bucket limiting how many upstream requests start per second
+class RateLimiter:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# Function to pull the id and prompt out of one input line
+def parse_record(line, number, field, id_field):
+    record = json.loads(line)
+    if isinstance(record, str):
+        return str(number), record, {}
+    fields = [field] if field else PROMPT_FIELDS
+    prompt = next((record[name] for name in fields if isinstance(record.get(name), str)), None)
+    if prompt is None:
+        raise ValueError(f"no prompt field ({', '.join(fields)})")
+    ids = [id_field] if id_field else ID_FIELDS
+    record_id = next((str(record[name]) for name in ids if record.get(name) is not None), str(number))
+    return record_id, prompt, record
+
+
+# Function to collect the ids already in an output file, so a rerun can skip them.
+# A line cut off by a crash, or one without an id, is ignored and that prompt is run
+# again.
+def finished_ids(path, retry_errors):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(result, dict) or result.get("id") is None:
+                continue
+            if not (retry_errors and result.get("error")):
+                done.add(result["id"])
+    return done
+
+
+# Runs one variant's pipeline over many prompts with a bounded pool of workers
+class BatchRunner:
+    def __init__(self, variant, providers, concurrency, rate=0, timeout=120, model=None, use_cache=True):
+        # Each variant's pipeline is shared with its app (see pipeline.VARIANTS),
+        # including its guardrails and the completion cache
+        config = VARIANTS[variant]
+        self.stages = ([validate] if config["validate"] else []) + config["stages"]
+        self.upstream = config["upstream"]
+        self.guarded = bool(config.get("guardrails"))
+        self.model = model or (self.upstream["model"] if self.upstream else None)
+        self.use_cache = use_cache
+        self.variant = variant
+        self.providers = providers
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate) if rate else None
+        self.timeout = timeout
+        self.sources = Counter()
+        self.latencies = []
+        self.errors = 0
+
+    # Function to answer one prompt; returns (reply, source)
+    async def answer(self, prompt):
+        turn = Turn(prompt)
+        for stage in self.stages:
+            reply = stage(turn)
+            if reply:
+                return reply, stage.__name__
+        provider = self.providers[self.upstream["provider"]]
+        cache_key = answer_key(prompt, self.model, self.upstream, guardrails.names() if self.guarded else ())
+
+        # Function returning the cached reply, or else the opened stream
+        async def open_reply():
+            cached = await off_loop(completion_cache.get, cache_key) if self.use_cache else None
+            if cached:
+                return cached
+            if self.limiter:
+                await self.limiter.acquire()
+            request = self.upstream["request"](prompt)
+            if isinstance(request, list):
+                return await provider.stream(request)
+            return await provider.stream_payload(request)
+
+        # As in the apps, a message a guardrail blocks gets the check's reply and is not
+        # sent upstream (or is dropped unread if the call was already on its way)
+        if self.guarded:
+            refusal, opened = await guardrails.arun(prompt, open_reply)
+            if refusal:
+                return refusal, "guardrail"
+        else:
+            opened = await open_reply()
+        if isinstance(opened, str):
+            return opened, "cache"
+        # Closed however the read ends, so a prompt that times out mid-reply does not
+        # leave its upstream connection open
+        try:
+            reply = "".join([chunk async for chunk in opened])
+        finally:
+            await opened.aclose()
+        if reply and self.use_cache:
+            await off_loop(completion_cache.put, cache_key, reply)
+        return reply, provider.name
+
+    async def run_one(self, record_id, prompt, record):
+        started = time.perf_counter()
+        result = {"id": record_id, "variant": self.variant, "prompt": prompt}
+        try:
+            reply, source = await asyncio.wait_for(self.answer(prompt), self.timeout)
+            result.update(reply=reply, source=source)
+            self.sources[source] += 1
+        except (ProviderError, CircuitOpenError, asyncio.TimeoutError) as e:
+            result.update(reply=None, error=str(e) or type(e).__name__)
+            self.errors += 1
+        except Exception as e:
+            # Anything else fails this prompt only; the rest of the batch carries on
+            result.update(reply=None, error=f"{type(e).__name__}: {e}")
+            self.errors += 1
+        elapsed = time.perf_counter() - started
+        self.latencies.append(elapsed)
+        result["elapsed_ms"] = round(elapsed * 1000, 1)
+        if "expected" in record:
+            result["expected"] = record["expected"]
+        return result
+
+    async def worker(self, queue, out):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            out.write(json.dumps(await self.run_one(*item), ensure_ascii=False) + "\n")
+            out.flush()
+
+    # Function to stream records from `lines` through the workers into `out`
+    async def run(self, lines, out, skip, field=None, id_field=None):
+        # A short queue keeps memory flat however large the input is
+        queue = asyncio.Queue(self.concurrency * 2)
+        workers = [asyncio.create_task(self.worker(queue, out)) for _ in range(self.concurrency)]
+        skipped = invalid = 0
+        try:
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record_id, prompt, record = parse_record(line, number, field, id_field)
+                except ValueError as e:
+                    print(f"line {number}: skipped, {e}", file=sys.stderr)
+                    invalid += 1
+                    continue
+                if record_id in skip:
+                    skipped += 1
+                    continue
+                await queue.put((record_id, prompt, record))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+        return skipped, invalid
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+async def main_async(args):
+    try:
+        variant = resolve_variant(args.variant)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    upstream = VARIANTS[variant]["upstream"]
+    clients = AsyncClientPool(args.concurrency)
+    providers = {}
+    if upstream:
+        provider_name = upstream["provider"]
+        model = args.model or upstream["model"]
+        key_name = f"{provider_name.upper()}_API_KEY"
+        if not os.environ.get(key_name):
+            raise SystemExit(f"{variant} calls {provider_name}; set {key_name}")
+        provider_class = AsyncGeminiProvider if provider_name == "gemini" else AsyncOpenAIProvider
+        providers[provider_name] = provider_class(clients, os.environ[key_name], model)
+
+    # The FAQ index is opened (or built) before the first prompt rather than by it
+    await asyncio.to_thread(get_index)
+    runner = BatchRunner(variant, providers, args.concurrency, args.rate, args.timeout, args.model,
+                         use_cache=not args.no_cache)
+    skip = finished_ids(args.output, args.retry_errors)
+    started = time.perf_counter()
+    try:
+        with open(args.input, encoding="utf-8") as lines, open(args.output, "a", encoding="utf-8") as out:
+            skipped, invalid = await runner.run(lines, out, skip, args.field, args.id_field)
+    finally:
+        await clients.aclose()
+    wall = time.perf_counter() - started
+
+    done = len(runner.latencies)
+    print(
+        f"{variant}: {done} prompts in {wall:.1f}s ({done / wall if wall else 0:.0f}/s), "
+        f"{runner.errors} errors, {skipped} already done, {invalid} unreadable"
+    )
+    print("  sources: " + ", ".join(f"{source} {count}" for source, count in runner.sources.most_common()))
+    print(
+        f"  latency p50 {percentile(runner.latencies, .5) * 1000:.0f}ms, "
+        f"p95 {percentile(runner.latencies, .95) * 1000:.0f}ms, p99 {percentile(runner.latencies, .99) * 1000:.0f}ms"
+    )
+    return 1 if runner.errors else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through an app variant's pipeline")
+    parser.add_argument("input", help="JSONL file of prompts")
+    parser.add_argument("output", help="JSONL file results are appended to (also used to resume)")
+    parser.add_argument("--variant", default="chat_api.py", help=f"one of: {', '.join(VARIANTS)}")
+    parser.add_argument("--model", help="override the variant's upstream model")
+    parser.add_argument("--concurrency", type=int, default=64, help="prompts in flight at once")
+    parser.add_argument("--rate", type=float, default=0, help="max upstream requests per second (0: no limit)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed per prompt")
+    parser.add_argument("--field", help="JSON field holding the prompt")
+    parser.add_argument("--id-field", help="JSON field holding the record id")
+    parser.add_argument("--retry-errors", action="store_true", help="rerun prompts that failed in the output file")
+    parser.add_argument("--no-cache", action="store_true", help="always ask upstream instead of reusing cached answers")
+    return parser
+
+
+def main():
+    try:
+        sys.exit(asyncio.run(main_async(build_parser().parse_args())))
+    except KeyboardInterrupt:
+        # Finished results are already on disk
+        sys.exit("interrupted; run the same command again to resume")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# Benchmark: routing questions across models (model_router.py) against one fixed model.
+#
+# Starts benchmarks/mock_llm.py with a cheap fast model that sometimes stops at max
+# tokens, a mid model and a slow strong one (see --mock-args), then answers --turns
+# questions: mostly short ones, some describing several symptoms and a few long
+# histories, at random conversation depths. Each question is asked once of --fixed (the
+# model the apps use today) and once through the cascade, which picks a model per
+# question and escalates truncated or unsure answers. Reports first-token and full
+# answer latency, calls per model, answers that were still truncated and the estimated
+# cost at list prices. Run from the repository root:
+#
+#   python benchmarks/bench_cascade.py --turns 300
+#   python benchmarks/bench_cascade.py --fixed gemini-1.5-pro --budget 0.5
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from context_budget import count_tokens  # noqa: E402
+from gemini_stream import stream_gemini, stream_url  # noqa: E402
+from load_test import percentile, start_mock  # noqa: E402
+from model_router import ModelCascade, call_cost, payload_tokens, routing_stats  # noqa: E402
+
+SHORT = ("What is a fever?", "How much water should I drink a day?", "Is coffee bad for sleep?",
+         "What helps with a sore throat?", "How long does a cold last?", "Can I exercise with a cold?",
+         "What is a normal resting heart rate?", "Are eggs bad for cholesterol?")
+SYMPTOMS = ("I have had a headache for 3 days", "my stomach is upset after meals", "I keep coughing at night",
+            "I feel dizzy when I stand up", "I have had trouble sleeping for a week", "my chest feels tight",
+            "there is a dull pain in my lower back", "I have a mild fever in the evenings")
+HISTORY = ("I am 54 and was diagnosed with type 2 diabetes last year.", "I take metformin and a statin.",
+           "My blood pressure has been around 145/90 at home.", "My father had a heart attack at 60.",
+           "I walk for 20 minutes most days but my diet is not great.", "I drink two or three coffees a day.",
+           "Last month my doctor changed the dose of my blood pressure medicine.",
+           "I sometimes forget doses when I travel for work.")
+
+
+# Function to draw one question: mostly short, some with several symptoms, a few long
+# histories; returns (prompt, depth)
+def make_question(rng):
+    kind = rng.random()
+    if kind < 0.6:
+        prompt = rng.choice(SHORT)
+    elif kind < 0.9:
+        prompt = ", and ".join(rng.sample(SYMPTOMS, rng.randint(2, 3))) + ". What could this be?"
+    else:
+        prompt = " ".join(rng.sample(HISTORY, len(HISTORY)) + rng.sample(SYMPTOMS, 3)) + (
+            " Given all of this, what should I change and what should I ask my doctor about?")
+    return prompt, rng.randint(0, 10)
+
+
+def payload_for(prompt):
+    return {"contents": [{"parts": [{"text": prompt}]}]}
+
+
+# Function to ask `model` and read the whole answer; returns (stream, first token seconds)
+def ask(base_url, session, model, payload, watch=None):
+    started = time.perf_counter()
+    stream = stream_gemini(stream_url(model, "bench-routing", base_url=base_url), payload, session=session)
+    first = None
+    for _ in (watch(stream) if watch else stream):
+        if first is None:
+            first = time.perf_counter() - started
+    return stream, first
+
+
+def run_fixed(args, base_url, session, questions):
+    first_tokens, turns, cost, truncated = [], [], 0.0, 0
+    for prompt, _ in questions:
+        payload = payload_for(prompt)
+        started = time.perf_counter()
+        stream, first = ask(base_url, session, args.fixed, payload)
+        turns.append(time.perf_counter() - started)
+        first_tokens.append(first or 0.0)
+        cost += call_cost(args.fixed, payload_tokens(payload), count_tokens(stream.text))
+        truncated += stream.finish_reason == "MAX_TOKENS"
+    return first_tokens, turns, Counter({args.fixed: len(questions)}), cost, truncated
+
+
+def run_cascade(args, base_url, session, questions):
+    cascade = ModelCascade(args.models.split(","), budget=args.budget)
+    first_tokens, turns, calls, truncated = [], [], Counter(), 0
+    for prompt, depth in questions:
+        payload = payload_for(prompt)
+        started = time.perf_counter()
+        decision = cascade.route(prompt, depth)
+        first = None
+        while True:
+            calls[decision["model"]] += 1
+            stream, attempt_first = ask(base_url, session, decision["model"], payload,
+                                        lambda stream: cascade.watch(decision, stream))
+            first = first if first is not None else attempt_first
+            if cascade.attempt(decision, payload, stream.text, stream.finish_reason, stream.error) is None:
+                cascade.finish(decision, args.fixed)
+                break
+        turns.append(time.perf_counter() - started)
+        first_tokens.append(first or 0.0)
+        truncated += stream.finish_reason == "MAX_TOKENS"
+    return first_tokens, turns, calls, routing_stats.snapshot()["cost_usd"], truncated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare routing questions across models with one fixed model")
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--fixed", default="gemini-1.5-flash", help="the model every question goes to today")
+    parser.add_argument("--models", default="gemini-1.5-flash-8b,gemini-1.5-flash,gemini-1.5-pro",
+                        help="cascade models, cheapest first")
+    parser.add_argument("--budget", type=float, default=2.5, help="first-token p95 budget in seconds")
+    parser.add_argument("--mock-args", default=(
+        "--tokens-per-sec 400 --reply-tokens uniform:60,200 "
+        "--model-latency gemini-1.5-flash-8b=lognormal:-2.3,0.3 --model-latency gemini-1.5-flash=lognormal:-1.6,0.3 "
+        "--model-latency gemini-1.5-pro=lognormal:-0.5,0.3 --model-truncate gemini-1.5-flash-8b=0.1"),
+        help="arguments for benchmarks/mock_llm.py")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    questions = [make_question(rng) for _ in range(args.turns)]
+    mock, mock_url = start_mock(args.mock_args)
+    base_url = f"{mock_url}/v1beta/models"
+    session = requests.Session()
+    print(f"{args.turns} questions; fixed model {args.fixed}, cascade {args.models}\n")
+    print(f"{'':<10}{'first token p50':>16}{'p95':>8}{'answer p50':>12}{'p95':>8}"
+          f"{'truncated':>11}{'cost/1k turns':>15}  calls")
+    try:
+        for name, run in (("fixed", run_fixed), ("cascade", run_cascade)):
+            first_tokens, turns, calls, cost, truncated = run(args, base_url, session, questions)
+            print(f"{name:<10}{percentile(first_tokens, .5) * 1000:>14.0f}ms{percentile(first_tokens, .95) * 1000:>6.0f}ms"
+                  f"{percentile(turns, .5) * 1000:>10.0f}ms{percentile(turns, .95) * 1000:>6.0f}ms"
+                  f"{truncated:>11}{cost / len(questions) * 1000:>14.4f}$  "
+                  + ", ".join(f"{model} {count}" for model, count in calls.most_common()))
+        stats = routing_stats.snapshot()
+        print(f"\ncascade: {stats['escalations']} escalations ({stats['escalation_rate']:.1%}) {stats['reasons']}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# Load test for the asyncio HTTP API (chat_api.py): many concurrent sessions, each
+# streaming its replies over SSE.
+#
+# Starts benchmarks/mock_llm.py and chat_api.py as subprocesses (the API pointed at the
+# mock), then opens --sessions concurrent connections that each send --turns messages.
+# Reports turns per second, latency and time-to-first-token percentiles, errors, and the
+# CPU time / RSS of the API server. Run from the repository root:
+#
+#   python benchmarks/bench_chat_api.py --sessions 1000 --turns 3
+#   python benchmarks/bench_chat_api.py --sessions 2000 --max-upstream 256 --mock-args "--latency fixed:0.3"
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from async_providers import httpx  # noqa: E402
+from load_test import PROMPTS, percentile, start_mock  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Function to read the CPU seconds and RSS of another process from /proc
+def proc_usage(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    with open(f"/proc/{pid}/statm") as f:
+        rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    ticks = os.sysconf("SC_CLK_TCK")
+    return {"cpu_seconds": (int(fields[11]) + int(fields[12])) / ticks, "rss_bytes": rss}
+
+
+# Function to start the API server against the mock and wait until it answers
+def start_api(mock_url, args, db_path):
+    port = free_port()
+    env = dict(
+        os.environ,
+        GEMINI_BASE_URL=f"{mock_url}/v1beta/models",
+        GEMINI_API_KEY="bench-api",
+        CONVERSATION_DB=db_path,
+    )
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "chat_api.py"), "--port", str(port),
+         "--max-upstream", str(args.max_upstream), "--queue-timeout", str(args.queue_timeout)],
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if httpx.get(f"{url}/healthz", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit("chat_api.py failed to start")
+
+
+# Function to run one session: send each turn with stream=true and time the events
+async def run_session(client, url, index, args):
+    turns = []
+    session_id = None
+    for turn in range(args.turns):
+        body = {"message": PROMPTS[(index + turn) % len(PROMPTS)], "stream": True, "session_id": session_id}
+        start = time.perf_counter()
+        first = None
+        failed = False
+        try:
+            async with client.stream("POST", f"{url}/v1/chat", json=body) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    failed = True
+                else:
+                    event = None
+                    async for line in response.aiter_lines():
+                        if line.startswith("event:"):
+                            event = line[6:].strip()
+                        elif line.startswith("data:"):
+                            data = json.loads(line[5:])
+                            if event == "session":
+                                session_id = data["session_id"]
+                            elif event == "error":
+                                failed = True
+                            elif first is None and "text" in data:
+                                first = time.perf_counter()
+                            event = None
+        except httpx.HTTPError:
+            failed = True
+        end = time.perf_counter()
+        turns.append({"failed": failed, "latency": end - start, "ttft": first - start if first else None})
+    return turns
+
+
+async def run(url, args):
+    # Idle connections are dropped before the server's 30s keep-alive closes them
+    limits = httpx.Limits(max_connections=args.sessions, max_keepalive_connections=args.sessions, keepalive_expiry=20)
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        started = time.perf_counter()
+        sessions = await asyncio.gather(*(run_session(client, url, i, args) for i in range(args.sessions)))
+        wall = time.perf_counter() - started
+        stats = (await client.get(f"{url}/v1/stats")).json()
+    return [turn for session in sessions for turn in session], wall, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the asyncio chat API with concurrent SSE sessions")
+    parser.add_argument("--sessions", type=int, default=1000, help="concurrent sessions")
+    parser.add_argument("--turns", type=int, default=3, help="messages sent per session")
+    parser.add_argument("--max-upstream", type=int, default=256, help="passed to chat_api.py")
+    parser.add_argument("--queue-timeout", type=float, default=30.0, help="passed to chat_api.py")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request")
+    parser.add_argument("--mock-args", default="--latency fixed:0.2", help="arguments for benchmarks/mock_llm.py")
+    args = parser.parse_args()
+
+    mock, mock_url = start_mock(args.mock_args)
+    directory = tempfile.TemporaryDirectory()
+    api, url = start_api(mock_url, args, os.path.join(directory.name, "conversations.db"))
+    try:
+        before = proc_usage(api.pid)
+        turns, wall, stats = asyncio.run(run(url, args))
+        after = proc_usage(api.pid)
+    finally:
+        api.terminate()
+        mock.terminate()
+        api.wait()
+        mock.wait()
+        directory.cleanup()
+
+    ok = [turn for turn in turns if not turn["failed"]]
+    latencies = [turn["latency"] for turn in ok]
+    ttfts = [turn["ttft"] for turn in ok if turn["ttft"] is not None]
+    print(f"{args.sessions} concurrent sessions x {args.turns} turns, max upstream {args.max_upstream}\n")
+    print(f"turns {len(turns)}, errors {len(turns) - len(ok)}, {len(ok) / wall:.0f} turns/s over {wall:.1f}s")
+    for name, values in (("latency", latencies), ("ttft", ttfts)):
+        print(f"{name:<8} " + "  ".join(
+            f"p{int(q * 100)} {percentile(values, q) * 1000:6.0f}ms" for q in (.5, .95, .99) if values
+        ))
+    print(
+        f"server cpu {after['cpu_seconds'] - before['cpu_seconds']:.2f}s, rss {after['rss_bytes'] / 2**20:.0f}MB; "
+        f"local {stats['local']}, upstream {stats['upstream']}, rejected {stats['rejected']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Benchmark: request size and build latency as a conversation grows.
+#
+# Compares sending the full history (what app.py used to do) against
+# ConversationContext. Run from the repository root:
+#
+#   python benchmarks/bench_context_budget.py --turns 250
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_messages import Message, openai_body  # noqa: E402
+from context_budget import ConversationContext  # noqa: E402
+
+WORDS = (
+    "headache fever cough dizzy nausea sleep stress blood pressure sugar diet exercise "
+    "doctor medicine dose morning evening pain sharp dull days weeks water tired"
+).split()
+
+
+# Function to generate a chat turn of realistic length
+def fake_turn(rng, role):
+    length = rng.randint(8, 40) if role == "user" else rng.randint(40, 160)
+    sentences = []
+    while length > 0:
+        n = min(length, rng.randint(6, 14))
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + ".")
+        length -= n
+    return " ".join(sentences)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark token-budgeted conversation context")
+    parser.add_argument("--turns", type=int, default=250)
+    parser.add_argument("--budget", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    context = ConversationContext(token_budget=args.budget)
+    messages = []
+    checkpoints = {1, 10, 25, 50, 100, 150, 200, args.turns}
+
+    print(f"{'turn':>5} {'full tok':>9} {'full KB':>8} {'budget tok':>10} {'budget KB':>9} {'build us':>9} {'body us':>8}")
+    worst = 0
+    for turn in range(1, args.turns + 1):
+        messages.append(Message("user", fake_turn(rng, "user")))
+
+        start = time.perf_counter()
+        request = context.build(messages)
+        build_us = (time.perf_counter() - start) * 1e6
+        start = time.perf_counter()
+        body = openai_body("gpt-3.5-turbo", request)
+        body_us = (time.perf_counter() - start) * 1e6
+
+        tokens = context.request_tokens(request)
+        worst = max(worst, tokens)
+        if turn in checkpoints:
+            full_body = openai_body("gpt-3.5-turbo", messages)
+            print(
+                f"{turn:>5} {context.request_tokens(messages):>9} {len(full_body) / 1024:>8.1f} "
+                f"{tokens:>10} {len(body) / 1024:>9.1f} {build_us:>9.1f} {body_us:>8.1f}"
+            )
+
+        messages.append(Message("assistant", fake_turn(rng, "assistant")))
+
+    print(f"\nlargest budgeted request: {worst} tokens (budget {args.budget})")
+    if worst > args.budget:
+        sys.exit("budget exceeded")
+
+
+if __name__ == "__main__":
+    main()
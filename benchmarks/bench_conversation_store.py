@@ -0,0 +1,135 @@
+# Benchmark: server memory for many simultaneous chat sessions.
+#
+# Fills N sessions with a realistic history, once as plain in-memory lists (what
+# st.session_state.messages used to be) and once in the disk-backed conversation store,
+# each in a fresh process, and reports Python heap and RSS growth, plus what remains
+# after idle sessions are evicted. Also times appends, a full-history read and resuming a conversation. Run from
+# the repository root:
+#
+#   python benchmarks/bench_conversation_store.py --sessions 1000 --messages 60
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conversation_store import ConversationStore, SQLiteBackend  # noqa: E402
+from mock_llm import process_usage  # noqa: E402
+
+WORDS = (
+    "headache fever cough dizzy nausea sleep stress blood pressure sugar diet exercise "
+    "doctor medicine dose morning evening pain sharp dull days weeks water tired"
+).split()
+
+
+# Function to generate one session's messages, alternating user and assistant turns
+def fake_history(rng, count):
+    messages = []
+    for i in range(count):
+        role = "user" if i % 2 == 0 else "assistant"
+        words = rng.randint(8, 40) if role == "user" else rng.randint(80, 350)
+        messages.append({"role": role, "content": " ".join(rng.choice(WORDS) for _ in range(words))})
+    return messages
+
+
+# Function to measure memory growth while holding every session. Runs in its own
+# process so RSS is not skewed by memory freed from an earlier run; with `trace` the
+# Python heap is measured with tracemalloc instead (which inflates RSS itself).
+def measure(mode, args, trace):
+    rng = random.Random(args.seed)
+    # Sessions are built from JSON in both modes, like a fresh request payload
+    encoded = [json.dumps(fake_history(rng, args.messages)) for _ in range(args.sessions)]
+    result = {}
+    if trace:
+        tracemalloc.start()
+
+    def usage():
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] if trace else process_usage()["rss_bytes"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ConversationStore(SQLiteBackend(os.path.join(directory, "bench.db")), hot_window=args.hot_window)
+        base = usage()
+        started = time.perf_counter()
+        if mode == "lists":
+            sessions = [json.loads(history) for history in encoded]
+        else:
+            sessions = []
+            for history in encoded:
+                conversation = store.open()
+                for message in json.loads(history):
+                    conversation.append(message)
+                sessions.append(conversation)
+        result["append_us"] = (time.perf_counter() - started) / (args.sessions * args.messages) * 1e6
+        result["active"] = usage() - base
+
+        if mode == "store":
+            started = time.perf_counter()
+            for conversation in sessions[:100]:
+                list(conversation)
+            result["read_ms"] = (time.perf_counter() - started) / min(100, len(sessions)) * 1000
+
+            store.idle_timeout = 0
+            store.evict_idle(force=True)
+            result["evicted"] = usage() - base
+
+            started = time.perf_counter()
+            resumed = store.open(sessions[0].id)
+            resumed[-1]
+            result["resume_ms"] = (time.perf_counter() - started) * 1000
+        store.backend.close()
+    return result
+
+
+def run_child(mode, args, trace):
+    command = [sys.executable, os.path.abspath(__file__), "--mode", mode, "--sessions", str(args.sessions),
+               "--messages", str(args.messages), "--hot-window", str(args.hot_window), "--seed", str(args.seed)]
+    if trace:
+        command.append("--trace")
+    return json.loads(subprocess.run(command, capture_output=True, text=True, check=True).stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark server memory with many chat sessions")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=60, help="messages per session")
+    parser.add_argument("--hot-window", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--mode", choices=["lists", "store"], help=argparse.SUPPRESS)
+    parser.add_argument("--trace", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode, args, args.trace)))
+        return
+
+    results = {(mode, trace): run_child(mode, args, trace) for mode in ("lists", "store") for trace in (False, True)}
+    mb = 2**20
+    lists_heap = results["lists", True]["active"]
+    store = results["store", True]
+    print(f"{args.sessions} sessions x {args.messages} messages, hot window {args.hot_window}\n")
+    print(f"{'':<24}{'heap MB':>10}{'RSS MB':>10}")
+    print(f"{'in-memory lists':<24}{lists_heap / mb:>10.1f}{results['lists', False]['active'] / mb:>10.1f}")
+    print(f"{'conversation store':<24}{store['active'] / mb:>10.1f}{results['store', False]['active'] / mb:>10.1f}")
+    print(f"{'store, idle evicted':<24}{store['evicted'] / mb:>10.1f}{results['store', False]['evicted'] / mb:>10.1f}")
+    print(
+        f"\nheap saved: {(1 - store['active'] / lists_heap) * 100:.0f}% while active, "
+        f"{(1 - store['evicted'] / lists_heap) * 100:.0f}% after eviction"
+    )
+    fast = results["store", False]
+    print(
+        f"append {fast['append_us']:.0f}us/message, full history read {fast['read_ms']:.2f}ms, "
+        f"resume {fast['resume_ms']:.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Benchmark: running guardrails alongside the upstream call (guardrails.py).
+#
+# First times each built-in check over the load-test prompts. Then starts
+# benchmarks/mock_llm.py and, with an extra simulated classifier check of --check-ms
+# added to the pipeline, measures time to the first reply chunk when the checks run
+# before the call (sequential) and alongside it (speculative), and how fast a blocked
+# message is answered in each mode. Run from the repository root:
+#
+#   python benchmarks/bench_guardrails.py --check-ms 150 --turns 20
+#   python benchmarks/bench_guardrails.py --check-ms 400 --mock-args "--latency fixed:0.3"
+import argparse
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_stream import stream_gemini, stream_url  # noqa: E402
+from guardrails import DEFAULT_CHECKS, GuardrailPipeline  # noqa: E402
+from load_test import PROMPTS, percentile, start_mock  # noqa: E402
+
+# Caught only by the simulated classifier, so a blocked turn waits for it
+BLOCKED = "What household chemicals are dangerous to mix?"
+
+
+# Function to build a check that takes `seconds` and blocks messages containing `trigger`
+def slow_classifier(seconds, trigger):
+    def check(user_input):
+        time.sleep(seconds)
+        return "blocked by classifier" if trigger in user_input else None
+    return check
+
+
+# Function to time one turn: guardrails plus the call, up to the first chunk
+def turn(pipeline, prompt, url, session, speculate):
+    payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    start = time.perf_counter()
+    refusal, stream = pipeline.run(prompt, lambda: stream_gemini(url, payload, session=session), speculate=speculate)
+    if refusal:
+        return time.perf_counter() - start
+    for _ in stream:
+        elapsed = time.perf_counter() - start
+        stream.close()
+        return elapsed
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark guardrails run before versus alongside the upstream call")
+    parser.add_argument("--check-ms", type=float, default=150.0, help="latency of the simulated classifier check")
+    parser.add_argument("--turns", type=int, default=20, help="turns per mode")
+    parser.add_argument("--iterations", type=int, default=20000, help="calls per built-in check when timing them")
+    parser.add_argument("--mock-args", default="--latency fixed:0.3 --tokens-per-sec 200",
+                        help="arguments for benchmarks/mock_llm.py")
+    args = parser.parse_args()
+
+    print(f"{'check':<18}{'per call':>10}")
+    for guard in DEFAULT_CHECKS:
+        start = time.perf_counter()
+        for i in range(args.iterations):
+            guard["check"](PROMPTS[i % len(PROMPTS)])
+        print(f"{guard['name']:<18}{(time.perf_counter() - start) / args.iterations * 1e6:>8.1f}us")
+
+    pipeline = GuardrailPipeline()
+    pipeline.add("classifier", slow_classifier(args.check_ms / 1000, "dangerous"))
+    mock, mock_url = start_mock(args.mock_args)
+    url = stream_url("gemini-1.5-flash", "bench-guardrails", base_url=f"{mock_url}/v1beta/models")
+    session = requests.Session()
+    try:
+        print(f"\nwith a {args.check_ms:.0f}ms classifier check")
+        print(f"{'':<14}{'first chunk p50':>16}{'p95':>9}{'blocked p50':>13}{'upstream calls':>16}")
+        for name, speculate in (("sequential", False), ("speculative", True)):
+            before = requests.get(f"{mock_url}/_mock/stats").json()["requests"]
+            passed = [turn(pipeline, PROMPTS[i % len(PROMPTS)], url, session, speculate) for i in range(args.turns)]
+            blocked = [turn(pipeline, BLOCKED, url, session, speculate) for _ in range(args.turns)]
+            calls = requests.get(f"{mock_url}/_mock/stats").json()["requests"] - before
+            print(f"{name:<14}{percentile(passed, .5) * 1000:>14.0f}ms{percentile(passed, .95) * 1000:>7.0f}ms"
+                  f"{percentile(blocked, .5) * 1000:>11.0f}ms{calls:>16}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+
+if __name__ == "__main__":
+    main()
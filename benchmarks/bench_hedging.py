@@ -0,0 +1,123 @@
+# Benchmark: tail latency with and without hedged requests.
+#
+# Starts a local stand-in for the Gemini streaming endpoint whose time-to-first-token
+# has a slow tail, then sends the same workload through a single provider and through
+# HedgedRouter (primary and backup both pointing at the stand-in). Run from the
+# repository root:
+#
+#   python benchmarks/bench_hedging.py --requests 400 --slow-rate 0.03
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_pool import get_session  # noqa: E402
+from providers import GeminiProvider, HedgeStats, HedgedRouter, LatencyTracker  # noqa: E402
+
+
+# Stand-in server: a fraction of requests stall before the first token
+def make_handler(args, rng, lock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                slow = rng.random() < args.slow_rate
+                delay = rng.uniform(1.0, 2.0) if slow else rng.lognormvariate(-2.5, 0.3)
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(args.chunks):
+                event = {"candidates": [{"content": {"parts": [{"text": f"token{i} "}]}}]}
+                data = f"data: {json.dumps(event)}\r\n\r\n".encode()
+                try:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    self.wfile.flush()
+                except OSError:
+                    return
+                time.sleep(0.005)
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+# Function to send the workload and collect (ttft, total) per request
+def run(stream_fn, requests, concurrency):
+    def one(_):
+        start = time.perf_counter()
+        ttft = None
+        for _chunk in stream_fn():
+            if ttft is None:
+                ttft = time.perf_counter() - start
+        return ttft, time.perf_counter() - start
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(one, range(requests)))
+
+
+def report(label, results):
+    ttfts = [r[0] for r in results]
+    totals = [r[1] for r in results]
+    print(
+        f"{label:<10} ttft p50 {percentile(ttfts, .5) * 1000:7.0f}ms  p95 {percentile(ttfts, .95) * 1000:7.0f}ms  "
+        f"p99 {percentile(ttfts, .99) * 1000:7.0f}ms | total p99 {percentile(totals, .99) * 1000:7.0f}ms"
+    )
+    return percentile(ttfts, .99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hedged requests against a slow-tailed stand-in server")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--chunks", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args, random.Random(args.seed), threading.Lock()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1beta/models"
+    session = get_session("bench", "local")
+    messages = [{"role": "user", "content": "What are the symptoms of diabetes?"}]
+
+    primary = GeminiProvider("local", "primary-model", session=session, base_url=base_url)
+    backup = GeminiProvider("local", "backup-model", session=session, base_url=base_url)
+
+    baseline = run(lambda: primary.stream(messages), args.requests, args.concurrency)
+
+    stats = HedgeStats()
+    router = HedgedRouter(primary, backup, tracker=LatencyTracker(), stats=stats)
+    hedged = run(lambda: router.stream(messages), args.requests, args.concurrency)
+
+    base_p99 = report("single", baseline)
+    hedged_p99 = report("hedged", hedged)
+    summary = stats.as_dict()
+    print(
+        f"\np99 ttft improvement: {(1 - hedged_p99 / base_p99) * 100:.1f}%  "
+        f"extra request rate: {summary['extra_request_rate'] * 100:.1f}%  "
+        f"hedge wins: {summary['hedge_wins']}/{summary['hedges']}"
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
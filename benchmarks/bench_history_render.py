@@ -0,0 +1,120 @@
+# Benchmark: cost of one rerun as a conversation grows, drawing the whole history
+# (the old loop over st.session_state.messages) vs chat_history.render_history.
+#
+# Each conversation is written to a conversation store first, then a small Streamlit
+# script is run through AppTest and rerun a few times. Reports the rerun time, the
+# time spent drawing history, the number of messages drawn and the serialized size of
+# the elements sent, which stands in for the websocket payload. Run from the
+# repository root:
+#
+#   python benchmarks/bench_history_render.py --lengths 10 100 500 2000
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from conversation_store import ConversationStore, SQLiteBackend  # noqa: E402
+
+WORDS = (
+    "headache fever cough dizzy nausea sleep stress blood pressure sugar diet exercise "
+    "doctor medicine dose morning evening pain sharp dull days weeks water tired"
+).split()
+
+SCRIPT = """
+import sys
+import time
+sys.path.insert(0, {root!r})
+import streamlit as st
+from chat_history import render_history
+from conversation_store import ConversationStore, SQLiteBackend
+
+if "messages" not in st.session_state:
+    st.session_state.messages = ConversationStore(SQLiteBackend({db!r})).open({cid!r})
+started = time.perf_counter()
+if {mode!r} == "full":
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+    st.session_state.drawn = len(st.session_state.messages)
+else:
+    st.session_state.drawn = render_history(st.session_state, st.session_state.messages).stats()["messages_drawn"]
+st.session_state.history_ms = (time.perf_counter() - started) * 1000
+"""
+
+
+# Function to write a conversation of `length` messages; returns its id
+def fill(store, rng, length):
+    conversation = store.open()
+    for i in range(length):
+        role = "user" if i % 2 == 0 else "assistant"
+        words = rng.randint(8, 40) if role == "user" else rng.randint(80, 350)
+        conversation.append({"role": role, "content": " ".join(rng.choice(WORDS) for _ in range(words))})
+    return conversation.id
+
+
+# Function to total the serialized size of every element in the rendered tree
+def payload_bytes(node):
+    size = 0
+    proto = getattr(node, "proto", None)
+    if proto is not None and not getattr(node, "children", None):
+        size += len(proto.SerializeToString())
+    for child in getattr(node, "children", {}).values():
+        size += payload_bytes(child)
+    return size
+
+
+# Function to run the script and rerun it; returns the median rerun measurements
+def measure(db, cid, mode, reruns):
+    at = AppTest.from_string(SCRIPT.format(root=ROOT, db=db, cid=cid, mode=mode), default_timeout=120)
+    at.run()
+    samples = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        at.run()
+        samples.append(((time.perf_counter() - started) * 1000, at.session_state.history_ms))
+    samples.sort()
+    rerun_ms, history_ms = samples[len(samples) // 2]
+    return {
+        "rerun_ms": rerun_ms,
+        "history_ms": history_ms,
+        "drawn": at.session_state.drawn,
+        "payload_kb": payload_bytes(at._tree) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat history rendering per rerun")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 500, 2000],
+                        help="conversation lengths in messages")
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        db = os.path.join(directory, "bench.db")
+        store = ConversationStore(SQLiteBackend(db))
+        conversations = {length: fill(store, rng, length) for length in args.lengths}
+        store.backend.close()
+
+        print(f"{'messages':>8}  {'renderer':<10}{'rerun ms':>10}{'history ms':>12}{'drawn':>7}{'payload KB':>12}")
+        for length, cid in conversations.items():
+            for mode in ("full", "windowed"):
+                result = measure(db, cid, mode, args.reruns)
+                print(
+                    f"{length:>8}  {mode:<10}{result['rerun_ms']:>10.1f}{result['history_ms']:>12.2f}"
+                    f"{result['drawn']:>7}{result['payload_kb']:>12.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# Benchmark: the image pipeline and cache (images.py).
+#
+# Three parts. Decoding: time and peak extra memory to turn an inline base64 image part
+# into bytes with base64.b64decode (which copies the text first) and with images.py.
+# Generation: starts benchmarks/mock_llm.py and sends --turns image requests drawn from
+# --prompts distinct prompts, with and without the image cache, counting upstream calls
+# and turn latency. History: draws a history holding --history images (via AppTest, no
+# browser) at full size and as thumbnails, reporting image bytes sent per rerun and
+# rerun time. Run from the repository root:
+#
+#   python benchmarks/bench_images.py --turns 40 --prompts 8 --image-size 512
+#   python benchmarks/bench_images.py --history 20 --image-size 1024
+import argparse
+import base64
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import requests
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gemini_stream import generate_content, generate_url  # noqa: E402
+from images import ImageCache, decode_image, fetch_image, image_key, image_message  # noqa: E402
+from load_test import percentile, start_mock  # noqa: E402
+from mock_llm import IMAGE_PROMPT, synthetic_png  # noqa: E402
+
+SUBJECTS = ("the human heart", "a knee joint", "the lungs", "a healthy skin cell", "the inner ear",
+            "a kidney", "the spine", "a blood vessel", "the digestive system", "an eye")
+
+SCRIPT = """
+import sys
+
+import streamlit as st
+
+sys.path.insert(0, {root!r})
+from images import ImageCache, render_image_message
+
+cache = ImageCache({directory!r})
+for index, text in enumerate({messages!r}):
+    with st.chat_message("assistant"):
+        if {mode!r} == "thumbnails":
+            render_image_message(text, key=f"image_{{index}}", cache=cache)
+        else:
+            st.image(cache.get(text[-65:-1]), caption="Generated Medical Image")
+"""
+
+
+# Function to time decoding and measure the peak memory it adds beyond the result
+def measure_decode(decode, response, size, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        decode(response)
+    elapsed = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    data = decode(response)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del data
+    return elapsed, peak - size
+
+
+def bench_decode(args):
+    image = synthetic_png(args.image_size, b"decode")
+    response = {"candidates": [{"content": {"parts": [
+        {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(image).decode("ascii")}}]}}]}
+
+    def b64decode(response):
+        return base64.b64decode(response["candidates"][0]["content"]["parts"][0]["inlineData"]["data"])
+
+    print(f"decoding a {len(image) / 1024:.0f} KB image")
+    print(f"{'':<18}{'ms/image':>10}{'extra peak KB':>15}")
+    for name, decode in (("base64.b64decode", b64decode), ("images.py", decode_image)):
+        elapsed, extra = measure_decode(decode, response, len(image), args.repeat)
+        print(f"{name:<18}{elapsed * 1000:>10.2f}{extra / 1024:>15.0f}")
+
+
+def bench_generate(args, directory):
+    rng = random.Random(args.seed)
+    mock, mock_url = start_mock(f"{args.mock_args} --image-size {args.image_size}")
+    url = generate_url("gemini-1.5-flash", "bench-images", base_url=f"{mock_url}/v1beta/models")
+    session = requests.Session()
+    prompts = [f"{IMAGE_PROMPT} {subject}" for subject in SUBJECTS[:args.prompts]]
+    turns = [rng.choice(prompts) for _ in range(args.turns)]
+    print(f"\n{args.turns} image turns over {len(prompts)} prompts")
+    print(f"{'':<14}{'upstream calls':>16}{'turn p50':>10}{'p95':>8}")
+    try:
+        for name in ("no cache", "image cache"):
+            cache = ImageCache(os.path.join(directory, "generate"))
+            cache.clear()
+            before = requests.get(f"{mock_url}/_mock/stats").json()["requests"]
+            latencies = []
+            for prompt in turns:
+                payload = {"contents": [{"parts": [{"text": prompt}]}]}
+                key = image_key(prompt, "gemini-1.5-flash")
+                start = time.perf_counter()
+                if name == "no cache":
+                    decode_image(generate_content(url, payload, session=session))
+                elif cache.get(key) is None:
+                    fetch_image(url, payload, key, session, cache=cache)
+                    cache.get(key)
+                latencies.append(time.perf_counter() - start)
+            calls = requests.get(f"{mock_url}/_mock/stats").json()["requests"] - before
+            print(f"{name:<14}{calls:>16}{percentile(latencies, .5) * 1000:>8.1f}ms"
+                  f"{percentile(latencies, .95) * 1000:>6.0f}ms")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+
+def bench_history(args, directory):
+    cache = ImageCache(os.path.join(directory, "history"))
+    messages = []
+    for index in range(args.history):
+        key = image_key(f"history image {index}", "gemini-1.5-flash")
+        cache.put(key, synthetic_png(args.image_size, key.encode()))
+        messages.append(image_message(key, "Generated Medical Image"))
+    full = sum(len(cache.get(message[-65:-1])) for message in messages)
+    thumbnails = sum(len(cache.thumbnail(message[-65:-1])) for message in messages)
+
+    print(f"\nhistory of {args.history} images, {args.reruns} reruns")
+    print(f"{'':<14}{'image KB/rerun':>16}{'rerun ms':>10}")
+    for mode, size in (("full size", full), ("thumbnails", thumbnails)):
+        script = SCRIPT.format(root=ROOT, directory=cache.directory, messages=messages, mode=mode)
+        at = AppTest.from_string(script, default_timeout=120)
+        at.run()
+        start = time.perf_counter()
+        for _ in range(args.reruns):
+            at.run()
+        elapsed = (time.perf_counter() - start) / args.reruns
+        print(f"{mode:<14}{size / 1024:>16.0f}{elapsed * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image decoding, the on-disk image cache and history thumbnails")
+    parser.add_argument("--image-size", type=int, default=512, help="pixels per side of the synthetic images")
+    parser.add_argument("--repeat", type=int, default=20, help="decodes timed per method")
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--prompts", type=int, default=8, help="distinct image prompts among the turns")
+    parser.add_argument("--history", type=int, default=10, help="images in the drawn history")
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--mock-args", default="--latency fixed:1.0", help="arguments for benchmarks/mock_llm.py")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_images_")
+    try:
+        bench_decode(args)
+        bench_generate(args, directory)
+        bench_history(args, directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
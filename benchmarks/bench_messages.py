@@ -0,0 +1,123 @@
+# Benchmark: compact Message records vs plain {"role", "content"} dicts.
+#
+# Measures the bytes one session's history occupies (ASCII, non-ASCII and emoji-heavy
+# conversations), and the time to serialize a long conversation into an OpenAI or
+# Gemini request body: the old path (rebuild a list of dicts, then json.dumps) against
+# openai_body / gemini_body over already encoded messages. Run from the repository root:
+#
+#   python benchmarks/bench_messages.py --messages 200
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_messages import Message, gemini_body, openai_body  # noqa: E402
+
+WORDS = {
+    "ascii": "headache fever cough dizzy nausea sleep stress blood pressure diet doctor dose pain".split(),
+    "non-ascii": "Kopfschmerzen fièvre tête médecin douleur 头痛 发烧 睡眠 صداع ألم".split(),
+    "emoji": "headache 🤒 fever 🤕 pills 💊 sleep 😴 doctor 🩺 water 💧 ok 👍".split(),
+}
+
+
+# Function to generate one conversation, alternating user and assistant turns
+def fake_history(rng, words, count):
+    messages = []
+    for i in range(count):
+        role = "user" if i % 2 == 0 else "assistant"
+        length = rng.randint(8, 40) if role == "user" else rng.randint(80, 350)
+        messages.append({"role": role, "content": " ".join(rng.choice(words) for _ in range(length))})
+    return messages
+
+
+# Function to measure the heap bytes held by the history built from `encoded` JSON
+def session_bytes(encoded, build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        history = build(json.loads(encoded))
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del history
+    return held
+
+
+# Function to time `fn` and return microseconds per call (best of `repeat`)
+def time_call(fn, number, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+# The request bodies as they were built before: a fresh list of dicts, then json.dumps
+def old_openai_body(model, history):
+    messages = [{"role": m["role"], "content": m["content"]} for m in history]
+    return json.dumps({"model": model, "messages": messages, "stream": True}).encode("utf-8")
+
+
+def old_gemini_body(history):
+    contents = []
+    system = []
+    for message in history:
+        if message["role"] == "system":
+            system.append({"text": message["content"]})
+        else:
+            role = "model" if message["role"] == "assistant" else "user"
+            contents.append({"role": role, "parts": [{"text": message["content"]}]})
+    payload = {"contents": contents}
+    if system:
+        payload["systemInstruction"] = {"parts": system}
+    return json.dumps(payload).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compact chat messages against plain dicts")
+    parser.add_argument("--messages", type=int, default=200, help="messages per conversation")
+    parser.add_argument("--number", type=int, default=50, help="serializations per timed run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"one session, {args.messages} messages\n")
+    print(f"{'content':<12}{'dicts KB':>10}{'Messages KB':>13}{'saved':>8}")
+    histories = {}
+    for name, words in WORDS.items():
+        history = fake_history(rng, words, args.messages)
+        histories[name] = history
+        encoded = json.dumps(history)
+        dicts = session_bytes(encoded, lambda h: h)
+        compact = session_bytes(encoded, lambda h: [Message.coerce(m) for m in h])
+        print(f"{name:<12}{dicts / 1024:>10.1f}{compact / 1024:>13.1f}{(1 - compact / dicts) * 100:>7.0f}%")
+
+    print(f"\n{'request body':<24}{'old us':>10}{'new us':>10}{'speedup':>9}")
+    for name, history in histories.items():
+        compact = [Message.coerce(m) for m in history]
+        cases = {
+            "openai": (lambda: old_openai_body("gpt-3.5-turbo", history),
+                       lambda: openai_body("gpt-3.5-turbo", compact, stream=True)),
+            "gemini": (lambda: old_gemini_body(history), lambda: gemini_body(compact)),
+        }
+        for protocol, (old, new) in cases.items():
+            # Both paths must produce the same request
+            assert json.loads(old()) == json.loads(new())
+            old_us = time_call(old, args.number, args.repeat)
+            new_us = time_call(new, args.number, args.repeat)
+            print(f"{protocol + ' / ' + name:<24}{old_us:>10.0f}{new_us:>10.0f}{old_us / new_us:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# Benchmark: hit rate, wasted calls and latency saved by prefetching answers to the
+# bot's follow-up questions (prefetch.py).
+#
+# Starts benchmarks/mock_llm.py and plays --conversations two-turn conversations: a
+# message that makes the bot ask its follow-up questions, then after --think-time one
+# reply: a clicked quick reply (--clicked of the time), or a typed one, either a
+# paraphrase of a predicted answer or a message no prediction covers. Only clicked
+# replies may be answered from a prediction; typed ones are asked of the model. Reports
+# hits per kind of reply, the upstream calls spent per hit, and the reply latency for
+# hits against asking the model at that point. Run from the repository root:
+#
+#   python benchmarks/bench_prefetch.py --conversations 40 --think-time 2
+#   python benchmarks/bench_prefetch.py --budget 2 --mock-args "--latency fixed:1.5"
+import argparse
+import os
+import random
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_stream import generate_content, generate_url  # noqa: E402
+from intent_router import CONDITIONS, describe_symptoms  # noqa: E402
+from load_test import percentile, start_mock  # noqa: E402
+from prefetch import FOLLOW_UPS, Prefetcher, prefetch_stats  # noqa: E402
+from response_cache import completion_cache  # noqa: E402
+
+# First turns and the question set the bot answers them with
+OPENERS = [
+    ("symptoms", {"duration": "3", "type": "dull"}),
+    ("cough", {}),
+    ("headache", {}),
+    ("insomnia", {}),
+]
+
+# Typed second turns: answers to the follow-ups in the user's own words, then replies
+# no prediction covers
+REPLIES = {
+    "symptoms": ["yes, bright light bothers me", "I've had a fever since yesterday", "my neck is stiff",
+                 "loud noise makes it worse"],
+    "cough": ["it's dry", "lots of phlegm", "a bit short of breath"],
+    "headache": ["it's throbbing", "sharp, behind my eyes", "I feel dizzy too"],
+    "insomnia": ["I can't fall asleep", "I wake up at 3am", "work stress mostly"],
+}
+UNPREDICTED = ["no fever, no neck pain", "what should I eat?", "thanks", "is it contagious?"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure prefetching of answers to the bot's follow-up questions")
+    parser.add_argument("--conversations", type=int, default=40)
+    parser.add_argument("--think-time", type=float, default=2.0, help="seconds before the user replies")
+    parser.add_argument("--clicked", type=float, default=0.5, help="share of replies sent as quick replies")
+    parser.add_argument("--unpredicted", type=float, default=0.3, help="share of typed replies no prediction covers")
+    parser.add_argument("--budget", type=int, default=6, help="speculative calls per session")
+    parser.add_argument("--mock-args", default="--latency fixed:0.8 --tokens-per-sec 80",
+                        help="arguments for benchmarks/mock_llm.py")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mock, mock_url = start_mock(args.mock_args)
+    url = generate_url("gemini-1.5-flash", "bench-prefetch", base_url=f"{mock_url}/v1beta/models")
+    session = requests.Session()
+    questions = {condition["name"]: condition["reply"] for condition in CONDITIONS}
+    hits, misses = [], []
+    served = {"clicked": 0, "typed": 0}
+    try:
+        for _ in range(args.conversations):
+            # Fresh wording per conversation so predictions are not shared through the cache
+            completion_cache.clear()
+            topic, symptoms = rng.choice(OPENERS)
+            question = describe_symptoms(symptoms) if topic == "symptoms" else questions[topic]
+            prefetcher = Prefetcher(url, session, budget=args.budget)
+            prefetcher.schedule(topic, question, symptoms)
+            time.sleep(args.think_time)
+
+            if rng.random() < args.clicked:
+                kind, reply = "clicked", rng.choice([follow_up["answer"] for follow_up in FOLLOW_UPS[topic]])
+            else:
+                kind, reply = "typed", rng.choice(UNPREDICTED if rng.random() < args.unpredicted else REPLIES[topic])
+            start = time.perf_counter()
+            answer = prefetcher.lookup(reply)
+            if answer is None:
+                # What the turn would cost without a prediction: asking the model now
+                payload = {"contents": [{"role": "user", "parts": [{"text": reply}]}]}
+                generate_content(url, payload, session=session)
+                misses.append(time.perf_counter() - start)
+            else:
+                hits.append(time.perf_counter() - start)
+                served[kind] += 1
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    snapshot = prefetch_stats.snapshot()
+    print(f"{args.conversations} conversations, {args.think_time:g}s think time, "
+          f"{args.clicked:.0%} quick replies, {args.unpredicted:.0%} of typed replies unpredicted\n")
+    print(f"replies answered from a prediction: {len(hits)}/{args.conversations} "
+          f"({served['clicked']} quick replies, {served['typed']} typed)")
+    print(f"speculative upstream calls: {snapshot['calls']} ({snapshot['hits']} served, {snapshot['wasted']} wasted), "
+          f"{snapshot['calls'] / max(1, snapshot['hits']):.1f} calls per hit")
+    if hits:
+        print(f"reply latency with a prediction: p50 {percentile(hits, .5) * 1000:.1f}ms")
+    if misses:
+        print(f"reply latency asking the model:  p50 {percentile(misses, .5) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
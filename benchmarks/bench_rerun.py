@@ -0,0 +1,89 @@
+# Benchmark: cold start and rerun cost of the Streamlit app variants.
+#
+# Starts benchmarks/mock_llm.py and, for each variant, a fresh Python process that
+# drives the app through AppTest (no browser). It reports:
+# - Cold start: the first run of the script in that process, i.e. importing its
+#   modules on top of Streamlit and drawing the key prompt.
+# - Rerun: the wall time of --reruns reruns after the key is entered and one message
+#   (--prompt) has been answered, which is what every widget interaction costs.
+# --root runs another checkout (e.g. a `git worktree` of an older commit), to compare
+# before and after a change. Run from the repository root:
+#
+#   python benchmarks/bench_rerun.py --reruns 30
+#   git worktree add /tmp/before HEAD~1 && python benchmarks/bench_rerun.py --root /tmp/before
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from load_test import start_mock  # noqa: E402
+
+VARIANTS = ("app.py", "streamlitApp", "streamlit_app.py", "geminiApp.py", "geminiAppV2.py", "geminiAppV3.py",
+            "geminiAppV4", "geminiAppV5", "geminiAppV6.py")
+
+# Runs in a fresh process per variant and prints one JSON line
+DRIVER = """
+import json, os, sys, time
+from streamlit.testing.v1 import AppTest
+
+path, prompt, reruns = sys.argv[1], sys.argv[2], int(sys.argv[3])
+os.chdir(os.path.dirname(path))
+sys.path.insert(0, os.path.dirname(path))
+at = AppTest.from_file(path, default_timeout=120)
+start = time.perf_counter()
+at.run()
+cold = time.perf_counter() - start
+at.text_input[0].set_value("bench-rerun").run()
+at.chat_input[0].set_value(prompt).run()
+times = []
+for _ in range(reruns):
+    start = time.perf_counter()
+    at.run()
+    times.append(time.perf_counter() - start)
+times.sort()
+print(json.dumps({"cold": cold, "p50": times[len(times) // 2], "mean": sum(times) / len(times),
+                  "errors": len(at.exception)}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start and rerun wall time of the app variants")
+    parser.add_argument("--root", default=ROOT, help="checkout whose apps are measured")
+    parser.add_argument("--reruns", type=int, default=30)
+    parser.add_argument("--prompt", default="What helps with a headache?")
+    parser.add_argument("--mock-args", default="--latency fixed:0.05 --tokens-per-sec 0",
+                        help="arguments for benchmarks/mock_llm.py")
+    args = parser.parse_args()
+
+    mock, mock_url = start_mock(args.mock_args)
+    env = dict(os.environ, GEMINI_BASE_URL=f"{mock_url}/v1beta/models", OPENAI_BASE_URL=f"{mock_url}/v1",
+               CONVERSATION_DB=":memory:")
+    root = os.path.abspath(args.root)
+    print(f"{root}, {args.reruns} reruns after one answered message\n")
+    print(f"{'variant':<18}{'cold start':>12}{'rerun p50':>11}{'mean':>9}")
+    try:
+        for variant in VARIANTS:
+            path = os.path.join(root, variant)
+            if not os.path.exists(path):
+                continue
+            result = subprocess.run([sys.executable, "-c", DRIVER, path, args.prompt, str(args.reruns)],
+                                    env=env, capture_output=True, text=True)
+            lines = result.stdout.strip().splitlines()
+            if result.returncode or not lines:
+                print(f"{variant:<18}failed: {result.stderr.strip().splitlines()[-1:]}")
+                continue
+            row = json.loads(lines[-1])
+            errors = f"  ({row['errors']} errors)" if row["errors"] else ""
+            print(f"{variant:<18}{row['cold'] * 1000:>10.0f}ms{row['p50'] * 1000:>9.1f}ms"
+                  f"{row['mean'] * 1000:>7.1f}ms{errors}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Benchmark: building and querying the FAQ retrieval index (faq_index.py) at scale.
+#
+# Generates a synthetic FAQ corpus (--answers answers, each asked --phrasings ways, from
+# a vocabulary of medical-ish words), builds the index into a temporary directory and
+# reports build time, the time to open it memory-mapped, and query latency and recall
+# for a brute-force scan against IVF probing. Queries are paraphrases of known
+# questions (words dropped and swapped), so recall@1 is how often the right answer
+# comes back first. CPU only. Run from the repository root:
+#
+#   python benchmarks/bench_retrieval.py --answers 50000 --phrasings 2
+#   python benchmarks/bench_retrieval.py --answers 100000 --phrasings 2 --nprobe 4 8 16 32
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from faq_index import FAQIndex  # noqa: E402
+
+STEMS = (
+    "cardio neuro gastro derma pulmo nephro hepato osteo endo immuno hemato onco psych ortho "
+    "rhino oto ophthal uro gyno pedia geria myo arthro angio lympho"
+).split()
+ENDINGS = "itis osis algia emia pathy plasia trophy sclerosis spasm oma ectomy scopy gram logy".split()
+TEMPLATES = [
+    "what are the symptoms of {a} {b}",
+    "how do i treat {a} with {b}",
+    "is {a} linked to {b} and {c}",
+    "can {a} cause {b} in {c}",
+    "how long does {a} last after {b}",
+    "what should i eat with {a} and {b}",
+]
+
+
+# Function to build a random vocabulary of word-like terms
+def vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add(rng.choice(STEMS) + rng.choice(ENDINGS) + str(rng.randint(0, 99)))
+    return sorted(words)
+
+
+# Function to generate FAQ entries; each answer gets several phrasings sharing its terms
+def synthetic_corpus(rng, answers, phrasings, words):
+    entries = []
+    for i in range(answers):
+        terms = rng.sample(words, 5)
+        questions = []
+        for _ in range(phrasings):
+            a, b, c = rng.sample(terms, 3)
+            questions.append(rng.choice(TEMPLATES).format(a=a, b=b, c=c) + " " + " ".join(rng.sample(terms, 2)))
+        entries.append({"questions": questions, "answer": f"Vetted answer {i} about {' '.join(terms)}."})
+    return entries
+
+
+# Function to paraphrase a question: drop one word and swap two neighbours
+def paraphrase(rng, question):
+    words = question.split()
+    words.pop(rng.randrange(len(words)))
+    i = rng.randrange(len(words) - 1)
+    words[i], words[i + 1] = words[i + 1], words[i]
+    return " ".join(words)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# Function to time queries and count how often the expected answer ranks first
+def measure(queries, search):
+    timings, hits = [], 0
+    for text, expected in queries:
+        start = time.perf_counter()
+        results = search(text)
+        timings.append(time.perf_counter() - start)
+        hits += bool(results) and results[0][1] == expected
+    return timings, hits / len(queries)
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark building and querying the FAQ retrieval index")
+    parser.add_argument("--answers", type=int, default=50000, help="answers in the synthetic corpus")
+    parser.add_argument("--phrasings", type=int, default=2, help="question phrasings per answer (index rows)")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="distinct terms in the corpus")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=3, help="answers returned per query")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16], help="IVF lists probed per query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    entries = synthetic_corpus(rng, args.answers, args.phrasings, vocabulary(rng, args.vocabulary))
+    queries = [(paraphrase(rng, rng.choice(entries[i]["questions"])), i)
+               for i in (rng.randrange(len(entries)) for _ in range(args.queries))]
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        FAQIndex.build(entries, directory)
+        build = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+        before = rss_mb()
+        start = time.perf_counter()
+        index = FAQIndex(directory)
+        load = time.perf_counter() - start
+        print(f"{index.meta['rows']} rows, {index.meta['answers']} answers, {index.meta['dimensions']} dimensions, "
+              f"{index.meta['lists']} IVF lists, {size / 2**20:.0f}MB on disk")
+        print(f"build {build:.1f}s, open (mmap) {load * 1000:.1f}ms\n")
+
+        runs = [("brute force", lambda text: index.search(text, args.k, exact=True))]
+        if index.centroids is not None:
+            runs += [(f"ivf nprobe {n}", lambda text, n=n: index.search(text, args.k, nprobe=n)) for n in args.nprobe]
+        print(f"{'search':<16}{'p50':>9}{'p99':>9}{'qps':>8}{'recall@1':>10}")
+        for name, search in runs:
+            timings, recall = measure(queries, search)
+            print(f"{name:<16}{percentile(timings, .5) * 1000:>7.2f}ms{percentile(timings, .99) * 1000:>7.2f}ms"
+                  f"{len(timings) / sum(timings):>8.0f}{recall:>10.3f}")
+        print(f"\nrss after queries +{rss_mb() - before:.0f}MB (index pages mapped in)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# Benchmark and regression gate for the rule-based routing functions in intent_router.
+#
+# Runs every fast-path function over a generated corpus of realistic and adversarial
+# messages (long pastes, unicode, inputs that stress the regexes) and reports ns/op,
+# the worst single call and bytes allocated per call. Results can be saved per
+# version; later runs fail when a function got slower than the saved version by more
+# than the threshold, or when any single call exceeds an absolute ceiling. Run from the
+# repository root:
+#
+#   python benchmarks/bench_routing.py --save              # record the current version
+#   python benchmarks/bench_routing.py                     # compare against the last saved
+#   python benchmarks/bench_routing.py --against 1a2b3c4 --threshold 0.2
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import intent_router  # noqa: E402
+
+FUNCTIONS = {
+    "validate_user_input": intent_router.validate_user_input,
+    "get_short_response": intent_router.get_short_response,
+    "handle_general_health_query": intent_router.handle_general_health_query,
+    "handle_specific_health_query": intent_router.handle_specific_health_query,
+    "process_symptoms": intent_router.process_symptoms,
+    "is_image_query": intent_router.is_image_query,
+    "is_healthcare_query": intent_router.is_healthcare_query,
+    "classify": intent_router.classify,
+}
+
+TEMPLATES = [
+    "I have had a headache for the past {n} days and it is {kind}.",
+    "I have an upset stomach with {kind} pain after meals.",
+    "What can I do about a dry cough at night?",
+    "Can you show me a diagram of the {organ}?",
+    "Is it safe to take {drug} with high blood pressure?",
+    "I'm not feeling good today, my {organ} hurts.",
+    "What are the early symptoms of diabetes?",
+    "I can't sleep, I think I have insomnia.",
+    "hi",
+    "hello",
+    "how are you",
+]
+FILLERS = {
+    "kind": ["dull", "sharp", "throbbing", "cramping"],
+    "organ": ["heart", "liver", "stomach", "lungs", "kidney"],
+    "drug": ["ibuprofen", "paracetamol", "aspirin"],
+}
+WORDS = (
+    "patient reports mild fever and fatigue blood test results normal range glucose "
+    "cholesterol follow up in two weeks prescribed rest fluids monitor symptoms"
+).split()
+UNICODE_SNIPPETS = [
+    "头痛三天了", "Kopfschmerzen seit 3 Tagen", "İstanbul'da baş ağrısı", "ÉCHOGRAPHIE",
+    "صداع منذ ثلاثة أيام", "🤒🤕💊", "héadache", "ﬁ ligature", "ß" * 50, "İ" * 200,
+]
+
+
+# Function to build the benchmark corpus: a few hundred messages per category
+def build_corpus(seed):
+    rng = random.Random(seed)
+
+    def template():
+        return rng.choice(TEMPLATES).format(
+            n=rng.randint(1, 30), **{key: rng.choice(values) for key, values in FILLERS.items()}
+        )
+
+    def paste(words):
+        return " ".join(rng.choice(WORDS) for _ in range(words))
+
+    corpus = {
+        "realistic": [template() for _ in range(400)],
+        "long_paste": [paste(rng.randint(2000, 8000)) + " " + template() for _ in range(20)],
+        "unicode": [
+            " ".join(rng.choice(UNICODE_SNIPPETS) for _ in range(rng.randint(1, 20))) + " " + template()
+            for _ in range(200)
+        ],
+        # Inputs aimed at backtracking and prefix matching: long digit or whitespace
+        # runs with no "days" after them, near-miss keyword prefixes, rejected characters
+        "pathological": [
+            "headache past days " + "1" * 20000,
+            "headache past days " + "1" * 5000 + " " * 5000 + "day",
+            "upset stomach " + " " * 20000 + "pain",
+            "insomni" * 3000,
+            "headach" * 3000 + "e",
+            "cough" * 4000,
+            "<" * 10000,
+            "x" * 50000 + "&",
+            "9 " * 10000 + "days",
+            "past" * 5000 + "days" * 5000,
+        ],
+    }
+    return corpus
+
+
+# Function to time one function over one corpus category; returns (ns/op, worst call ms)
+def measure_time(fn, inputs, min_time, repeat):
+    worst = 0.0
+    start = time.perf_counter()
+    for text in inputs:
+        call_start = time.perf_counter()
+        fn(text)
+        worst = max(worst, time.perf_counter() - call_start)
+    one_pass = max(time.perf_counter() - start, 1e-9)
+
+    number = max(1, math.ceil(min_time / one_pass))
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            for text in inputs:
+                fn(text)
+        best = min(best, time.perf_counter_ns() - start)
+    return best / (number * len(inputs)), worst * 1000
+
+
+# Function to measure the mean peak bytes allocated while handling one input
+def measure_allocations(fn, inputs):
+    total = 0
+    tracemalloc.start()
+    try:
+        for text in inputs:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn(text)
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return total / len(inputs)
+
+
+def run(args):
+    corpus = build_corpus(args.seed)
+    results = {}
+    for name, fn in FUNCTIONS.items():
+        if args.only and name not in args.only:
+            continue
+        for category, inputs in corpus.items():
+            ns_op, worst_ms = measure_time(fn, inputs, args.min_time, args.repeat)
+            results[f"{name}/{category}"] = {
+                "ns_op": round(ns_op, 1),
+                "worst_ms": round(worst_ms, 3),
+                "bytes_op": round(measure_allocations(fn, inputs), 1),
+            }
+    return results
+
+
+# Function to name the version being measured (the git commit, if available)
+def current_version():
+    try:
+        version = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return version + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "local"
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return {"latest": None, "versions": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+# Function to compare results with a saved version; returns the list of failures
+def check(results, baseline, args):
+    failures = []
+    for key, result in sorted(results.items()):
+        old = baseline.get(key)
+        change = ""
+        if old:
+            ratio = result["ns_op"] / old["ns_op"] if old["ns_op"] else 1.0
+            change = f"{(ratio - 1) * 100:+6.1f}%"
+            if ratio > 1 + args.threshold and result["ns_op"] - old["ns_op"] > args.min_delta_ns:
+                failures.append(f"{key}: {old['ns_op']:.0f} -> {result['ns_op']:.0f} ns/op ({change})")
+        if result["worst_ms"] > args.max_call_ms:
+            failures.append(f"{key}: a single call took {result['worst_ms']:.1f}ms (limit {args.max_call_ms}ms)")
+        print(
+            f"{key:<44}{result['ns_op']:>12.0f} ns/op {change:>8}  worst {result['worst_ms']:>8.3f}ms"
+            f"  {result['bytes_op']:>10.0f} B/op"
+        )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and regression gate for the routing functions")
+    parser.add_argument("--history", default=os.path.join(ROOT, "benchmarks", "routing_history.json"),
+                        help="JSON file holding saved results per version")
+    parser.add_argument("--save", action="store_true", help="save these results as the current version")
+    parser.add_argument("--version", default=None, help="version name to save under (default: git commit)")
+    parser.add_argument("--against", default=None, help="saved version to compare with (default: latest)")
+    parser.add_argument("--threshold", type=float, default=0.30, help="allowed slowdown, e.g. 0.30 for 30%%")
+    parser.add_argument("--min-delta-ns", type=float, default=200.0,
+                        help="ignore slowdowns smaller than this many ns/op (timer noise)")
+    parser.add_argument("--max-call-ms", type=float, default=50.0, help="ceiling for any single call")
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--only", nargs="+", choices=sorted(FUNCTIONS), help="benchmark only these functions")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    against = args.against or history["latest"]
+    if args.against and args.against not in history["versions"]:
+        raise SystemExit(f"no saved results for version {args.against}")
+    baseline = history["versions"].get(against, {}).get("results", {}) if against else {}
+
+    results = run(args)
+    print(f"comparing against {against}" if baseline else "no saved version to compare against")
+    failures = check(results, baseline, args)
+
+    if args.save:
+        version = args.version or current_version()
+        history["versions"][version] = {
+            "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }
+        history["latest"] = version
+        with open(args.history, "w") as f:
+            json.dump(history, f, indent=1, sort_keys=True)
+        print(f"saved results as {version}")
+
+    if failures:
+        print("\nrouting performance regressed:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# Benchmark: state shared between app processes (shared_state.py).
+#
+# Starts benchmarks/mock_llm.py and --workers processes, each standing in for one app
+# replica behind a load balancer. Runs twice: with state kept inside each process (the
+# default) and with SHARED_STATE pointing at one SQLite file.
+#
+# Cache: every worker answers --turns questions drawn from --prompts popular ones
+# (Zipf-like), through the completion cache and Gemini on a miss. Reports the overall
+# hit rate, the upstream calls and the cost of a cache lookup.
+#
+# Quota: with QUOTA_PER_KEY=--quota, every worker sends --burst requests with the same
+# API key at once. Reports how many reached upstream against the quota.
+#
+# Run from the repository root:
+#
+#   python benchmarks/bench_shared_state.py --workers 8 --turns 200 --prompts 100
+#   python benchmarks/bench_shared_state.py --quota 50 --burst 40
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from load_test import percentile, start_mock  # noqa: E402
+
+
+# Function to answer `turns` questions in one worker process and report cache counts
+def cache_worker(env, url, prompts, turns, seed, barrier, results):
+    os.environ.update(env)
+    from gemini_stream import generate_content
+    from response_cache import completion_cache, make_key
+
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(prompts))]
+    session = requests.Session()
+    lookups = []
+    barrier.wait()
+    for prompt in rng.choices(prompts, weights, k=turns):
+        key = make_key(prompt, "gemini-1.5-flash")
+        start = time.perf_counter()
+        answer = completion_cache.get(key)
+        lookups.append(time.perf_counter() - start)
+        if answer is None:
+            payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+            generate_content(url, payload, session=session)
+            completion_cache.put(key, "answer to " + prompt)
+    stats = completion_cache.stats()
+    results.put((stats["hits"], stats["misses"], percentile(lookups, .5), percentile(lookups, .95)))
+
+
+# Function to send `burst` requests with one API key from one worker process
+def quota_worker(env, url, burst, barrier, results):
+    os.environ.update(env)
+    from gemini_stream import GeminiAPIError, generate_content
+
+    session = requests.Session()
+    sent = rejected = 0
+    barrier.wait()
+    for i in range(burst):
+        payload = {"contents": [{"role": "user", "parts": [{"text": f"quota probe {i}"}]}]}
+        try:
+            generate_content(url, payload, session=session)
+            sent += 1
+        except GeminiAPIError:
+            rejected += 1
+    results.put((sent, rejected))
+
+
+# Function to run one worker function in `workers` processes and collect their results
+def run_workers(target, workers, args_for):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=target, args=args_for(index) + (barrier, results)) for index in range(workers)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return collected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cache hit rate and quota accuracy across app processes")
+    parser.add_argument("--workers", type=int, default=8, help="app processes")
+    parser.add_argument("--turns", type=int, default=200, help="questions per worker")
+    parser.add_argument("--prompts", type=int, default=100, help="distinct questions")
+    parser.add_argument("--quota", type=int, default=50, help="requests per API key per window")
+    parser.add_argument("--burst", type=int, default=40, help="requests per worker in the quota test")
+    parser.add_argument("--mock-args", default="--latency fixed:0.02 --reply-tokens fixed:20 --tokens-per-sec 0",
+                        help="arguments for benchmarks/mock_llm.py")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_shared_state_")
+    mock, mock_url = start_mock(args.mock_args)
+    base_url = f"{mock_url}/v1beta/models"
+    prompts = [f"question {index} about symptoms" for index in range(args.prompts)]
+    modes = (("per process", ""), ("shared SQLite", os.path.join(directory, "state.db")))
+    try:
+        print(f"{args.workers} workers x {args.turns} turns over {args.prompts} prompts")
+        print(f"{'':<16}{'hit rate':>10}{'upstream calls':>16}{'lookup p50':>12}{'p95':>8}")
+        for name, spec in modes:
+            env = {"SHARED_STATE": spec, "QUOTA_PER_KEY": "0", "GEMINI_BASE_URL": base_url}
+            url = f"{base_url}/gemini-1.5-flash:generateContent?key=cache-{len(spec)}"
+            before = requests.get(f"{mock_url}/_mock/stats").json()["requests"]
+            counts = run_workers(cache_worker, args.workers,
+                                 lambda index: (env, url, prompts, args.turns, args.seed + index))
+            calls = requests.get(f"{mock_url}/_mock/stats").json()["requests"] - before
+            hits = sum(count[0] for count in counts)
+            lookups = hits + sum(count[1] for count in counts)
+            p50 = sorted(count[2] for count in counts)[len(counts) // 2]
+            p95 = sorted(count[3] for count in counts)[len(counts) // 2]
+            print(f"{name:<16}{hits / lookups:>10.1%}{calls:>16}{p50 * 1e6:>10.0f}us{p95 * 1e6:>6.0f}us")
+
+        print(f"\n{args.workers} workers x {args.burst} requests with one API key, quota {args.quota}")
+        print(f"{'':<16}{'reached upstream':>18}{'rejected':>10}{'over quota':>12}")
+        for name, spec in modes:
+            env = {"SHARED_STATE": spec, "QUOTA_PER_KEY": str(args.quota), "GEMINI_BASE_URL": base_url}
+            url = f"{base_url}/gemini-1.5-flash:generateContent?key=quota-{len(spec)}"
+            counts = run_workers(quota_worker, args.workers, lambda index: (env, url, args.burst))
+            sent = sum(count[0] for count in counts)
+            rejected = sum(count[1] for count in counts)
+            print(f"{name:<16}{sent:>18}{rejected:>10}{max(0, sent - args.quota):>12}")
+        print("\nquota windows are 60s; a run that crosses a window boundary may admit up to twice the quota")
+    finally:
+        mock.terminate()
+        mock.wait()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Benchmark: request coalescing in single_flight.py under a burst of identical questions.
+#
+# Starts benchmarks/mock_llm.py, then fires --clients threads at once, each streaming a
+# Gemini reply for one of --distinct prompts: first straight to the mock, then through
+# the process-wide Coalescer the apps use. Reports upstream requests made (from the
+# mock's own counters), time to first chunk and total time per client, and checks that
+# every coalesced client got the full reply. Run from the repository root:
+#
+#   python benchmarks/bench_single_flight.py --clients 64 --distinct 4
+#   python benchmarks/bench_single_flight.py --clients 200 --distinct 1 --mock-args "--latency fixed:1"
+import argparse
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_stream import stream_gemini, stream_url  # noqa: E402
+from load_test import percentile, start_mock  # noqa: E402
+from single_flight import Coalescer  # noqa: E402
+
+
+# Function to stream one reply, recording time to first chunk, total time and the text
+def client(open_stream, results, index, barrier):
+    barrier.wait()
+    start = time.perf_counter()
+    first = None
+    parts = []
+    for chunk in open_stream():
+        if first is None:
+            first = time.perf_counter() - start
+        parts.append(chunk)
+    results[index] = (first or 0.0, time.perf_counter() - start, "".join(parts))
+
+
+# Function to run one burst of clients and return (results, upstream requests made)
+def burst(args, url, session, coalescer, mock_url):
+    before = requests.get(f"{mock_url}/_mock/stats").json()["requests"]
+    results = [None] * args.clients
+    barrier = threading.Barrier(args.clients)
+    threads = []
+    for i in range(args.clients):
+        prompt = f"What helps with a sore throat? (variant {i % args.distinct})"
+        payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+
+        def open_call(payload=payload):
+            return stream_gemini(url, payload, session=session)
+
+        if coalescer is None:
+            open_stream = open_call
+        else:
+            open_stream = lambda prompt=prompt, open_call=open_call: coalescer.stream(prompt, open_call)
+        threads.append(threading.Thread(target=client, args=(open_stream, results, i, barrier)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, requests.get(f"{mock_url}/_mock/stats").json()["requests"] - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark coalescing identical in-flight upstream requests")
+    parser.add_argument("--clients", type=int, default=64, help="concurrent clients in the burst")
+    parser.add_argument("--distinct", type=int, default=4, help="distinct prompts among the clients")
+    parser.add_argument("--mock-args", default="--latency fixed:0.5 --tokens-per-sec 200 --seed 1",
+                        help="arguments for benchmarks/mock_llm.py")
+    args = parser.parse_args()
+
+    mock, mock_url = start_mock(args.mock_args)
+    url = stream_url("gemini-1.5-flash", "bench-single-flight", base_url=f"{mock_url}/v1beta/models")
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.clients))
+    try:
+        print(f"{args.clients} clients, {args.distinct} distinct prompts\n")
+        print(f"{'':<12}{'upstream':>10}{'first p50':>11}{'first p95':>11}{'total p50':>11}{'total p95':>11}")
+        for name, coalescer in (("direct", None), ("coalesced", Coalescer())):
+            results, upstream = burst(args, url, session, coalescer, mock_url)
+            first = [r[0] for r in results]
+            total = [r[1] for r in results]
+            print(f"{name:<12}{upstream:>10}{percentile(first, .5) * 1000:>9.0f}ms{percentile(first, .95) * 1000:>9.0f}ms"
+                  f"{percentile(total, .5) * 1000:>9.0f}ms{percentile(total, .95) * 1000:>9.0f}ms")
+            if coalescer is not None:
+                # The mock's replies are random, so matching text means a shared call
+                complete = sum(1 for i, r in enumerate(results) if r[2] and r[2] == results[i % args.distinct][2])
+                print(f"\n{complete}/{args.clients} coalesced clients got the same full reply as the first "
+                      f"client with their prompt; {coalescer.stats()}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+
+if __name__ == "__main__":
+    main()
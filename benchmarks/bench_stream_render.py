@@ -0,0 +1,146 @@
+# Benchmark: UI traffic and server CPU of streaming a reply (stream_render.py).
+#
+# Runs --sessions concurrent Streamlit sessions (via AppTest, no browser) that each
+# stream a synthetic markdown reply of --tokens chunks arriving every --chunk-ms, drawn
+# three ways: only the final text (baseline), `st.write_stream` (one update per chunk)
+# and stream_render.write_stream (frames). Counts the delta messages and bytes sent to
+# the browser per reply and CPU per reply (compare with the baseline), and checks the
+# returned text is identical to what was streamed. Run from the repository root:
+#
+#   python benchmarks/bench_stream_render.py --sessions 20 --tokens 400 --chunk-ms 10
+#   python benchmarks/bench_stream_render.py --interval 0.1 --max-chars 400
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = ("rest fluids fever doctor symptoms **warning** signs `dose` hydration sleep pain relief "
+         "antibiotics infection inflammation blood pressure diet exercise").split()
+
+SCRIPT = """
+import sys
+import time
+
+import streamlit as st
+
+sys.path.insert(0, {root!r})
+from stream_render import write_stream
+
+chunks = {chunks!r}
+
+
+def stream():
+    for chunk in chunks:
+        time.sleep({gap!r})
+        yield chunk
+
+
+with st.chat_message("assistant"):
+    if {mode!r} == "baseline":
+        text = "".join(stream())
+        st.markdown(text)
+    elif {mode!r} == "write_stream":
+        text = st.write_stream(stream())
+    else:
+        text = write_stream(stream(), interval={interval!r}, max_chars={max_chars!r})
+st.session_state.text = text
+"""
+
+
+# Function to build a markdown reply as chunks of a few characters: paragraphs, a
+# bulleted list and a fenced code block with a blank line inside
+def synthetic_reply(rng, tokens):
+    text = []
+    for i in range(tokens):
+        if i and i % 60 == 0:
+            text.append("\n\n")
+        if i == tokens // 3:
+            text.append("\n\n- first point\n- second point\n\n```\ndose = 2\n\nrepeat = 3\n```\n\n")
+        text.append(rng.choice(WORDS) + " ")
+    reply = "".join(text)
+    chunks, i = [], 0
+    while i < len(reply):
+        size = rng.randint(2, 8)
+        chunks.append(reply[i:i + size])
+        i += size
+    return chunks
+
+
+# Counts the delta messages and bytes every session sends to the browser
+class Traffic:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.bytes = 0
+        self.original = ScriptRunContext.enqueue
+        traffic = self
+
+        def enqueue(ctx, msg):
+            if msg.WhichOneof("type") == "delta":
+                with traffic.lock:
+                    traffic.messages += 1
+                    traffic.bytes += msg.ByteSize()
+            return traffic.original(ctx, msg)
+
+        ScriptRunContext.enqueue = enqueue
+
+    def take(self):
+        with self.lock:
+            result = (self.messages, self.bytes)
+            self.messages = self.bytes = 0
+        return result
+
+
+def run_mode(mode, args, chunks):
+    script = SCRIPT.format(root=ROOT, chunks=chunks, gap=args.chunk_ms / 1000, mode=mode,
+                           interval=args.interval, max_chars=args.max_chars)
+    results = []
+
+    def session():
+        at = AppTest.from_string(script, default_timeout=600)
+        at.run()
+        results.append(at.session_state.text if not at.exception else None)
+
+    threads = [threading.Thread(target=session) for _ in range(args.sessions)]
+    cpu, start = time.process_time(), time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.process_time() - cpu, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure UI messages and CPU per streamed reply, with and without frames")
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent sessions streaming at once")
+    parser.add_argument("--tokens", type=int, default=300, help="words in the reply")
+    parser.add_argument("--chunk-ms", type=float, default=5.0, help="gap between chunks")
+    parser.add_argument("--interval", type=float, default=0.04, help="frame interval in seconds")
+    parser.add_argument("--max-chars", type=int, default=200, help="characters that force an early frame")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    chunks = synthetic_reply(random.Random(args.seed), args.tokens)
+    expected = "".join(chunks)
+    traffic = Traffic()
+    print(f"{args.sessions} sessions, {len(chunks)} chunks, {len(expected)} characters per reply\n")
+    print(f"{'':<14}{'msgs/reply':>12}{'KB/reply':>10}{'CPU ms/reply':>14}{'wall s':>8}{'identical':>11}")
+    for mode in ("baseline", "write_stream", "frames"):
+        results, cpu, wall = run_mode(mode, args, chunks)
+        messages, size = traffic.take()
+        identical = sum(text == expected for text in results)
+        print(f"{mode:<14}{messages / args.sessions:>12.0f}{size / args.sessions / 1024:>10.1f}"
+              f"{cpu / args.sessions * 1000:>14.1f}{wall:>8.1f}{identical:>8}/{args.sessions}")
+    print("\nbaseline draws only the final text: the CPU above it is the cost of streaming")
+
+
+if __name__ == "__main__":
+    main()
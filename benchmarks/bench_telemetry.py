@@ -0,0 +1,91 @@
+# Benchmark: the cost of the tracing in telemetry.py.
+#
+# Times one span (Span block, @traced call, note) with and without an active trace,
+# then a turn's local routing (the intent_router calls the healthcare apps make) with
+# the tracing wrappers against the same functions unwrapped, and finally rendering
+# /metrics with many series registered. Run from the repository root:
+#
+#   python benchmarks/bench_telemetry.py --iterations 200000
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import intent_router  # noqa: E402
+import telemetry  # noqa: E402
+from telemetry import Span, note, start_trace, traced  # noqa: E402
+
+MESSAGE = "I have had a headache for 3 days and it is throbbing."
+ROUTING = ("validate_user_input", "get_short_response", "process_symptoms", "handle_specific_health_query",
+           "is_healthcare_query", "classify")
+
+
+def per_call(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def empty_span():
+    with Span("bench"):
+        pass
+
+
+@traced("bench")
+def traced_noop():
+    pass
+
+
+def noop():
+    pass
+
+
+def routing(functions):
+    def turn():
+        for fn in functions:
+            fn(MESSAGE)
+    return turn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the per-span and per-turn cost of tracing")
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--series", type=int, default=500, help="stage/variant pairs when timing /metrics")
+    args = parser.parse_args()
+    n = args.iterations
+
+    baseline = per_call(noop, n)
+    print(f"{'':<28}{'no trace':>12}{'in a trace':>12}")
+    rows = [("Span block", empty_span), ("@traced call", traced_noop), ("note()", lambda: note("bench"))]
+    for name, fn in rows:
+        outside = per_call(fn, n) - baseline
+        start_trace("bench")
+        inside = per_call(fn, n) - baseline
+        # Drop the spans piled up in the trace before the next row
+        telemetry.current_trace().spans.clear()
+        print(f"{name:<28}{outside * 1e9:>10.0f}ns{inside * 1e9:>10.0f}ns")
+
+    traced_functions = [getattr(intent_router, name) for name in ROUTING]
+    raw_functions = [fn.__wrapped__ for fn in traced_functions]
+    turns = n // 10
+    raw = per_call(routing(raw_functions), turns)
+    start_trace("bench")
+    wrapped = per_call(routing(traced_functions), turns)
+    print(f"\nlocal routing per turn ({len(ROUTING)} calls): {raw * 1e6:.1f}us raw, {wrapped * 1e6:.1f}us traced "
+          f"(+{(wrapped - raw) * 1e6:.1f}us)")
+
+    telemetry.metrics.reset()
+    for i in range(args.series):
+        telemetry.metrics.observe(f"variant{i % 10}", f"stage{i}", 0.01)
+        telemetry.metrics.add(f"variant{i % 10}", f"event{i}")
+    start = time.perf_counter()
+    text = telemetry.metrics.prometheus()
+    print(f"/metrics with {args.series} histograms: {(time.perf_counter() - start) * 1000:.1f}ms, "
+          f"{len(text) / 1024:.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# Load test: simulated concurrent chat sessions against each app variant.
+#
+# Starts benchmarks/mock_llm.py (or uses --mock-url), points the apps at it through
+# GEMINI_BASE_URL / OPENAI_BASE_URL, and drives N concurrent sessions per variant with
+# Streamlit's AppTest, each with its own API key so the mock can attribute requests.
+# Reports throughput, time to first upstream token, turn latency percentiles and the
+# CPU time / RSS of both the app process (this one) and the mock server. Run from the
+# repository root:
+#
+#   python benchmarks/load_test.py --sessions 8 --turns 3
+#   python benchmarks/load_test.py --variants geminiApp.py app.py --mock-args "--latency fixed:0.3 --error-rate 0.02"
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm import process_usage  # noqa: E402
+
+VARIANTS = [
+    "app.py", "streamlitApp", "geminiApp.py", "geminiAppV2.py", "geminiAppV3.py",
+    "geminiAppV4", "geminiAppV5", "geminiAppV6.py", "streamlit_app.py",
+]
+
+PROMPTS = [
+    "What are the early symptoms of diabetes?",
+    "I have had a headache for the past 3 days and it is dull.",
+    "How much water should I drink when I have a fever?",
+    "I have an upset stomach with sharp pain after meals.",
+    "What can I do about a dry cough at night?",
+    "Is it safe to exercise with high blood pressure?",
+]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+# Function to start the mock server as a subprocess and return (process, base url)
+def start_mock(mock_args):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "mock_llm.py"), "--port", "0", *shlex.split(mock_args)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = process.stdout.readline()
+    if "listening on" not in line:
+        process.kill()
+        raise SystemExit(f"mock server failed to start: {line!r}")
+    return process, line.rsplit(" ", 1)[-1].strip()
+
+
+# Function to run one simulated chat session; returns one record per turn
+def run_session(path, index, args):
+    from streamlit.testing.v1 import AppTest
+
+    key = f"load-{uuid.uuid4().hex[:12]}"
+    at = AppTest.from_file(path, default_timeout=args.timeout)
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"{os.path.basename(path)} failed to start: {at.exception[0].message}")
+    api_key = next(widget for widget in at.text_input if "Backup" not in widget.label)
+    api_key.input(key).run()
+    for box in at.checkbox:
+        if box.label == "Use cached answers" and box.value != args.use_cache:
+            box.set_value(args.use_cache).run()
+
+    turns = []
+    for turn in range(args.turns):
+        prompt = PROMPTS[(index + turn) % len(PROMPTS)]
+        start = time.time()
+        try:
+            at.chat_input[0].set_value(prompt).run()
+            failed = bool(at.exception) or bool(at.error)
+        except RuntimeError:
+            # AppTest raises when the script exceeds its timeout
+            failed = True
+        turns.append({"key": key, "start": start, "end": time.time(), "failed": failed})
+        if args.think_time:
+            time.sleep(args.think_time)
+    return turns
+
+
+# Function to attach the time to the first upstream byte to each turn
+def attach_ttft(mock_url, turns):
+    events_by_key = {}
+    for turn in turns:
+        if turn["key"] not in events_by_key:
+            response = requests.get(f"{mock_url}/_mock/events", params={"key": turn["key"]}, timeout=10)
+            events_by_key[turn["key"]] = response.json()
+        events = [
+            event for event in events_by_key[turn["key"]]
+            if turn["start"] <= event["received"] <= turn["end"] and event["first_byte"] is not None
+        ]
+        # Prefer the streamed answer over side requests (e.g. image generation)
+        streamed = [event for event in events if event["stream"]] or events
+        turn["ttft"] = min(e["first_byte"] for e in streamed) - turn["start"] if streamed else None
+
+
+def run_variant(path, args, mock_url):
+    mock_before = requests.get(f"{mock_url}/_mock/stats", timeout=10).json()
+    app_before = process_usage()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.sessions) as pool:
+        sessions = list(pool.map(lambda i: run_session(path, i, args), range(args.sessions)))
+    wall = time.perf_counter() - started
+    app_after = process_usage()
+    mock_after = requests.get(f"{mock_url}/_mock/stats", timeout=10).json()
+
+    turns = [turn for session in sessions for turn in session]
+    attach_ttft(mock_url, turns)
+    ok = [turn for turn in turns if not turn["failed"]]
+    latencies = [turn["end"] - turn["start"] for turn in ok]
+    ttfts = [turn["ttft"] for turn in ok if turn["ttft"] is not None]
+    return {
+        "variant": os.path.basename(path),
+        "turns": len(turns),
+        "errors": len(turns) - len(ok),
+        "throughput": len(ok) / wall if wall else 0.0,
+        "latency": {name: percentile(latencies, q) for name, q in (("p50", .5), ("p95", .95), ("p99", .99))},
+        "ttft": {name: percentile(ttfts, q) for name, q in (("p50", .5), ("p95", .95), ("p99", .99))},
+        "upstream_requests": mock_after["requests"] - mock_before["requests"],
+        "app_cpu_seconds": app_after["cpu_seconds"] - app_before["cpu_seconds"],
+        "app_rss_bytes": app_after["rss_bytes"],
+        "mock_cpu_seconds": mock_after["cpu_seconds"] - mock_before["cpu_seconds"],
+        "mock_rss_bytes": mock_after["rss_bytes"],
+    }
+
+
+def ms(value):
+    return "    n/a" if value is None else f"{value * 1000:7.0f}"
+
+
+def report(results):
+    print(
+        f"{'variant':<18}{'turns':>6}{'err':>5}{'turn/s':>8}  "
+        f"{'lat p50':>7} {'p95':>7} {'p99':>7}  {'ttft p50':>8} {'p95':>7} {'p99':>7}  "
+        f"{'upstr':>6}{'app cpu':>9}{'app MB':>8}{'mock cpu':>9}{'mock MB':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['variant']:<18}{r['turns']:>6}{r['errors']:>5}{r['throughput']:>8.2f}  "
+            f"{ms(r['latency']['p50'])} {ms(r['latency']['p95'])} {ms(r['latency']['p99'])}  "
+            f" {ms(r['ttft']['p50'])} {ms(r['ttft']['p95'])} {ms(r['ttft']['p99'])}  "
+            f"{r['upstream_requests']:>6}{r['app_cpu_seconds']:>9.2f}{r['app_rss_bytes'] / 2**20:>8.0f}"
+            f"{r['mock_cpu_seconds']:>9.2f}{r['mock_rss_bytes'] / 2**20:>8.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the app variants against a local mock LLM server")
+    parser.add_argument("--variants", nargs="+", default=VARIANTS)
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent chat sessions per variant")
+    parser.add_argument("--turns", type=int, default=3, help="messages sent per session")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between a session's turns")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-turn script timeout in seconds")
+    parser.add_argument("--use-cache", action="store_true", help="leave the shared answer cache on")
+    parser.add_argument("--mock-url", help="use an already running mock server instead of starting one")
+    parser.add_argument("--mock-args", default="", help="extra arguments for benchmarks/mock_llm.py")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    process = None
+    mock_url = args.mock_url
+    if mock_url is None:
+        process, mock_url = start_mock(args.mock_args)
+    # Must be set before the apps import gemini_stream or build OpenAI clients
+    os.environ["GEMINI_BASE_URL"] = f"{mock_url}/v1beta/models"
+    os.environ["OPENAI_BASE_URL"] = f"{mock_url}/v1"
+    # Keep load-test conversations out of the real conversation store
+    os.environ.setdefault("CONVERSATION_DB", os.path.join(tempfile.mkdtemp(prefix="load_test-"), "conversations.db"))
+
+    try:
+        results = [run_variant(os.path.join(ROOT, variant), args, mock_url) for variant in args.variants]
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
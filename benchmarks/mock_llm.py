@@ -0,0 +1,515 @@
+# Local stand-in for the Gemini and OpenAI chat APIs, for load tests that should not
+# spend real API quota.
+#
+# Speaks Gemini `generateContent` / `streamGenerateContent?alt=sse` and OpenAI
+# `/v1/chat/completions` (streaming and not). Replies are synthetic text shaped by
+# configurable first-token latency, token rate and reply length, or replayed from
+# transcripts recorded against the real APIs. Errors and dropped streams can be
+# injected. Run from the repository root:
+#
+#   python benchmarks/mock_llm.py --port 8765 --latency lognormal:-1.5,0.4 --tokens-per-sec 60
+#   python benchmarks/mock_llm.py --error-rate 0.02 --error-status 429,503 --drop-rate 0.01
+#   python benchmarks/mock_llm.py --record transcripts.jsonl     # proxy to the real APIs
+#   python benchmarks/mock_llm.py --replay transcripts.jsonl
+#
+# Then point the apps at it:
+#
+#   GEMINI_BASE_URL=http://127.0.0.1:8765/v1beta/models OPENAI_BASE_URL=http://127.0.0.1:8765/v1 \
+#       streamlit run geminiApp.py
+#
+# Gemini `generateContent` requests asking for an image ("Generate an image of ...")
+# get a synthetic PNG of --image-size pixels per side as an inline base64 part.
+#
+# Models can behave differently, to exercise routing between them:
+#
+#   python benchmarks/mock_llm.py --model-latency gemini-1.5-pro=lognormal:0,0.4 \
+#       --model-truncate gemini-1.5-flash-8b=0.1     # a tenth of its streams stop at MAX_TOKENS
+#
+# GET /_mock/stats reports request counts and the server's CPU time and RSS;
+# GET /_mock/events?key=... lists per-request timings for one API key.
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+GEMINI_UPSTREAM = "https://generativelanguage.googleapis.com"
+OPENAI_UPSTREAM = "https://api.openai.com"
+
+_GEMINI_PATH = re.compile(r"^/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)$")
+_OPENAI_PATH = "/v1/chat/completions"
+
+WORDS = (
+    "rest hydration symptoms doctor fever sleep diet pain treatment dose medicine blood "
+    "pressure exercise stress infection recovery days evening morning water common usually"
+).split()
+
+STATUS_NAMES = {
+    400: "INVALID_ARGUMENT", 429: "RESOURCE_EXHAUSTED", 500: "INTERNAL",
+    502: "UNAVAILABLE", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED",
+}
+
+MAX_EVENTS_PER_KEY = 10000
+
+IMAGE_PROMPT = "Generate an image of"
+
+
+# Function to turn a distribution spec ("fixed:0.2", "uniform:0.1,0.5",
+# "normal:0.3,0.05", "lognormal:-1.5,0.4", "exponential:0.3") into a sampler
+def parse_distribution(spec):
+    name, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    samplers = {
+        "fixed": (1, lambda rng: values[0]),
+        "uniform": (2, lambda rng: rng.uniform(values[0], values[1])),
+        "normal": (2, lambda rng: rng.gauss(values[0], values[1])),
+        "lognormal": (2, lambda rng: rng.lognormvariate(values[0], values[1])),
+        "exponential": (1, lambda rng: rng.expovariate(1 / values[0])),
+    }
+    if name not in samplers or len(values) != samplers[name][0]:
+        raise argparse.ArgumentTypeError(f"invalid distribution {spec!r}")
+    sample = samplers[name][1]
+    return lambda rng: max(0.0, sample(rng))
+
+
+# Function to parse repeated MODEL=VALUE options into a dict
+def parse_model_options(values):
+    options = {}
+    for value in values or ():
+        model, separator, setting = value.partition("=")
+        if not separator:
+            raise argparse.ArgumentTypeError(f"expected MODEL=VALUE, got {value!r}")
+        options[model] = setting
+    return options
+
+
+# Function to report this process's CPU time and resident memory
+def process_usage():
+    times = os.times()
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {"cpu_seconds": round(times.user + times.system, 3), "rss_bytes": rss}
+
+
+# Function to pull the latest user text out of a Gemini or OpenAI request body
+def request_prompt(protocol, body):
+    try:
+        if protocol == "gemini":
+            contents = [c for c in body.get("contents", []) if c.get("role", "user") == "user"]
+            return " ".join(p.get("text", "") for p in contents[-1]["parts"])
+        messages = [m for m in body.get("messages", []) if m.get("role") == "user"]
+        return messages[-1]["content"] if isinstance(messages[-1]["content"], str) else ""
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return ""
+
+
+# Function to build a noisy RGB PNG of `size` pixels per side, the same for the same seed
+def synthetic_png(size, seed):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rng = random.Random(seed)
+    rows = b"".join(b"\x00" + rng.randbytes(size * 3) for _ in range(size))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 1)) + chunk(b"IEND", b""))
+
+
+# Function to pull the reply text out of one decoded upstream chunk
+def reply_text(protocol, chunk):
+    try:
+        if protocol == "gemini":
+            return "".join(p.get("text", "") for p in chunk["candidates"][0]["content"]["parts"])
+        choice = chunk["choices"][0]
+        return (choice.get("delta") or choice.get("message") or {}).get("content") or ""
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return ""
+
+
+# Recorded conversations, replayed by prompt (falling back to round-robin)
+class TranscriptStore:
+    def __init__(self, path=None):
+        self.lock = threading.Lock()
+        self.by_prompt = {}
+        self.transcripts = []
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        self.add(json.loads(line))
+        self.cycle = itertools.cycle(self.transcripts) if self.transcripts else None
+
+    @staticmethod
+    def _key(prompt):
+        return " ".join(prompt.lower().split())
+
+    def add(self, transcript):
+        self.transcripts.append(transcript)
+        self.by_prompt.setdefault(self._key(transcript["prompt"]), transcript)
+
+    def find(self, prompt):
+        with self.lock:
+            transcript = self.by_prompt.get(self._key(prompt))
+            if transcript is None and self.cycle is not None:
+                transcript = next(self.cycle)
+            return transcript
+
+
+# Shared server state: configuration, counters and per-key request timings
+class MockState:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.latency = parse_distribution(args.latency)
+        self.model_latency = {model: parse_distribution(spec)
+                              for model, spec in parse_model_options(args.model_latency).items()}
+        self.model_truncate = {model: float(rate) for model, rate in parse_model_options(args.model_truncate).items()}
+        self.reply_tokens = parse_distribution(args.reply_tokens)
+        self.error_statuses = [int(s) for s in args.error_status.split(",") if s]
+        self.replay = TranscriptStore(args.replay) if args.replay else None
+        self.record_lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {"requests": 0, "errors_injected": 0, "streams_dropped": 0,
+                         "replayed": 0, "recorded": 0, "proxy_errors": 0, "truncated": 0}
+        self.events = {}
+
+    def incr(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def random(self):
+        with self.lock:
+            return self.rng.random()
+
+    def sample(self, sampler):
+        with self.lock:
+            return sampler(self.rng)
+
+    def new_event(self, key, path, stream):
+        event = {"path": path, "stream": stream, "received": time.time(),
+                 "first_byte": None, "done": None, "status": None}
+        with self.lock:
+            self.counters["requests"] += 1
+            self.events.setdefault(key, deque(maxlen=MAX_EVENTS_PER_KEY)).append(event)
+        return event
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "keys": len(self.events),
+                    "uptime": round(time.time() - self.started, 3), **process_usage()}
+
+    def record(self, transcript):
+        with self.record_lock, open(self.args.record, "a") as f:
+            f.write(json.dumps(transcript) + "\n")
+        self.incr("recorded")
+
+    # Function to plan a reply as (seconds to wait, text) steps
+    def plan(self, prompt, model=None):
+        if self.replay is not None:
+            transcript = self.replay.find(prompt)
+            if transcript is not None:
+                self.incr("replayed")
+                steps, previous = [], 0.0
+                for offset, text in transcript["chunks"]:
+                    steps.append((max(0.0, offset - previous) / self.args.replay_speed, text))
+                    previous = offset
+                return steps
+        tokens = max(1, int(self.sample(self.reply_tokens)))
+        per_chunk = self.args.tokens_per_chunk
+        gap = per_chunk / self.args.tokens_per_sec if self.args.tokens_per_sec > 0 else 0.0
+        words = [WORDS[int(self.random() * len(WORDS))] for _ in range(tokens)]
+        steps = []
+        for start in range(0, tokens, per_chunk):
+            text = " ".join(words[start:start + per_chunk]) + " "
+            steps.append((gap, text))
+        steps[0] = (self.sample(self.model_latency.get(model, self.latency)), steps[0][1])
+        return steps
+
+
+# Threading server that does not print tracebacks when clients drop keep-alive sockets
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for bursts of connections from the asyncio API load test
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, payload, headers=()):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def start_chunked(self, status=200, content_type="text/event-stream"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+        def write_chunk(self, data):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/_mock/stats":
+                self.send_json(200, state.stats())
+            elif url.path == "/_mock/events":
+                key = parse_qs(url.query).get("key", [""])[0]
+                with state.lock:
+                    events = list(state.events.get(key, ()))
+                self.send_json(200, events)
+            else:
+                self.send_json(404, {"error": {"message": f"unknown path {url.path}"}})
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            query = parse_qs(url.query)
+            match = _GEMINI_PATH.match(url.path)
+            if match:
+                protocol, model = "gemini", match.group(1)
+                stream = match.group(2) == "streamGenerateContent"
+                key = query.get("key", [""])[0]
+            elif url.path == _OPENAI_PATH:
+                protocol = "openai"
+                key = self.headers.get("Authorization", "").removeprefix("Bearer ")
+                model = stream = None
+            else:
+                self.send_json(404, {"error": {"message": f"unknown path {url.path}"}})
+                return
+            try:
+                payload = json.loads(body or b"{}")
+            except json.JSONDecodeError:
+                self.send_json(400, {"error": {"code": 400, "message": "invalid JSON body"}})
+                return
+            if protocol == "openai":
+                model = payload.get("model", "gpt-3.5-turbo")
+                stream = bool(payload.get("stream"))
+
+            event = state.new_event(key, url.path, stream)
+            try:
+                if state.args.record:
+                    self.proxy(protocol, body, payload, stream, event)
+                else:
+                    self.reply(protocol, model, payload, stream, event)
+            except OSError:
+                # The client went away (e.g. a hedged request that lost the race)
+                pass
+            finally:
+                event["done"] = time.time()
+
+        def inject_error(self, protocol, event):
+            status = state.error_statuses[int(state.random() * len(state.error_statuses))]
+            state.incr("errors_injected")
+            event["status"] = status
+            headers = [("Retry-After", str(state.args.retry_after))] if state.args.retry_after is not None else []
+            if protocol == "gemini":
+                error = {"code": status, "message": "injected by mock_llm", "status": STATUS_NAMES.get(status, "UNKNOWN")}
+            else:
+                error = {"message": "injected by mock_llm", "type": "server_error", "code": None}
+            self.send_json(status, {"error": error}, headers)
+
+        def reply(self, protocol, model, payload, stream, event):
+            if state.error_statuses and state.random() < state.args.error_rate:
+                self.inject_error(protocol, event)
+                return
+            prompt = request_prompt(protocol, payload)
+            steps = state.plan(prompt, model)
+            event["status"] = 200
+            if protocol == "gemini" and not stream and state.args.image_size and prompt.startswith(IMAGE_PROMPT):
+                time.sleep(steps[0][0] if steps else 0)
+                event["first_byte"] = time.time()
+                image = synthetic_png(state.args.image_size, hashlib.sha256(prompt.encode()).digest())
+                part = {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(image).decode("ascii")}}
+                self.send_json(200, {"candidates": [{"content": {"role": "model", "parts": [part]},
+                                                     "finishReason": "STOP", "index": 0}]})
+                return
+            if not stream:
+                time.sleep(sum(delay for delay, _ in steps))
+                event["first_byte"] = time.time()
+                self.send_json(200, self.full_body(protocol, model, "".join(text for _, text in steps)))
+                return
+
+            drop_after = None
+            if state.random() < state.args.drop_rate:
+                state.incr("streams_dropped")
+                drop_after = max(1, len(steps) // 2)
+            # A truncated reply ends normally, half way, with the max-tokens finish reason
+            finish_reason = ("STOP", "stop")
+            if model in state.model_truncate and state.random() < state.model_truncate[model]:
+                state.incr("truncated")
+                steps = steps[:max(1, len(steps) // 2)]
+                finish_reason = ("MAX_TOKENS", "length")
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            self.start_chunked()
+            for index, (delay, text) in enumerate(steps):
+                if index == drop_after:
+                    # Break off without the terminating chunk, like a reset connection
+                    self.close_connection = True
+                    return
+                time.sleep(delay)
+                if protocol == "gemini":
+                    chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}]}
+                    if index == len(steps) - 1:
+                        chunk["candidates"][0]["finishReason"] = finish_reason[0]
+                else:
+                    delta = {"content": text}
+                    if index == 0:
+                        delta["role"] = "assistant"
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                self.write_chunk(f"data: {json.dumps(chunk)}\r\n\r\n".encode())
+                if event["first_byte"] is None:
+                    event["first_byte"] = time.time()
+            if protocol == "openai":
+                final = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason[1]}]}
+                self.write_chunk(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+            self.write_chunk(b"")
+
+        @staticmethod
+        def full_body(protocol, model, text):
+            if protocol == "gemini":
+                return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                                        "finishReason": "STOP", "index": 0}]}
+            tokens = len(text.split())
+            return {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:24]}", "object": "chat.completion",
+                "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": tokens, "total_tokens": tokens},
+            }
+
+        # Forward to the real API, relay the reply unchanged and record its text and timing
+        def proxy(self, protocol, body, payload, stream, event):
+            upstream = state.args.upstream_gemini if protocol == "gemini" else state.args.upstream_openai
+            headers = {name: value for name, value in self.headers.items()
+                       if name.lower() in ("authorization", "content-type", "x-goog-api-key")}
+            try:
+                response = requests.post(upstream + self.path, data=body, headers=headers, stream=True, timeout=120)
+            except requests.RequestException as e:
+                state.incr("proxy_errors")
+                self.send_json(502, {"error": {"code": 502, "message": f"upstream unreachable: {e}"}})
+                return
+            event["status"] = response.status_code
+            started = event["received"]
+            chunks = []
+            with response:
+                if not stream or response.status_code != 200:
+                    data = response.content
+                    event["first_byte"] = time.time()
+                    self.send_response(response.status_code)
+                    self.send_header("Content-Type", response.headers.get("Content-Type", "application/json"))
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    if response.status_code == 200:
+                        try:
+                            chunks.append([round(time.time() - started, 4), reply_text(protocol, json.loads(data))])
+                        except ValueError:
+                            pass
+                else:
+                    self.start_chunked(content_type=response.headers.get("Content-Type", "text/event-stream"))
+                    for line in response.iter_lines():
+                        self.write_chunk(line + b"\n")
+                        if event["first_byte"] is None:
+                            event["first_byte"] = time.time()
+                        if line.startswith(b"data:"):
+                            try:
+                                text = reply_text(protocol, json.loads(line[5:]))
+                            except ValueError:
+                                continue
+                            if text:
+                                chunks.append([round(time.time() - started, 4), text])
+                    self.write_chunk(b"")
+            if chunks:
+                state.record({"protocol": protocol, "prompt": request_prompt(protocol, payload), "chunks": chunks})
+
+    return Handler
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini and OpenAI chat APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    parser.add_argument("--latency", default="lognormal:-1.5,0.4",
+                        help="time-to-first-token distribution in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0)
+    parser.add_argument("--tokens-per-chunk", type=int, default=4)
+    parser.add_argument("--reply-tokens", default="uniform:40,160", help="reply length distribution in tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--error-status", default="429,503", help="comma-separated statuses to inject")
+    parser.add_argument("--retry-after", type=int, default=None, help="Retry-After seconds sent with injected errors")
+    parser.add_argument("--image-size", type=int, default=512, help="pixels per side of generated images, 0 for text")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="share of streams cut off half way")
+    parser.add_argument("--model-latency", action="append", metavar="MODEL=DIST",
+                        help="first-token latency distribution for one model (repeatable)")
+    parser.add_argument("--model-truncate", action="append", metavar="MODEL=RATE",
+                        help="share of one model's streams that stop half way at max tokens (repeatable)")
+    parser.add_argument("--record", help="proxy to the real APIs and append transcripts to this JSONL file")
+    parser.add_argument("--replay", help="replay transcripts from this JSONL file")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="replay faster (>1) or slower (<1)")
+    parser.add_argument("--upstream-gemini", default=GEMINI_UPSTREAM)
+    parser.add_argument("--upstream-openai", default=OPENAI_UPSTREAM)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser
+
+
+# Function to start the server on a background thread and return it
+def start_server(args):
+    parse_distribution(args.latency)
+    parse_distribution(args.reply_tokens)
+    state = MockState(args)
+    server = MockServer((args.host, args.port), make_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    args = build_parser().parse_args()
+    server = start_server(args)
+    host, port = server.server_address[:2]
+    print(f"mock LLM listening on http://{host}:{port}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
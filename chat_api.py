@@ -0,0 +1,486 @@
+# Headless HTTP API for the healthcare chatbot, for services that want the chat
+# pipeline without the Streamlit UI. The pipeline is its VARIANTS entry in pipeline.py,
+# like the apps': validation, the local stages (greetings, symptom slots, known
+# conditions, the vetted FAQ), then, past the guardrails, a streamed Gemini or OpenAI
+# reply with the conversation's history. Everything runs on one
+# asyncio event loop, so an open stream holds a socket rather than a thread.
+#
+#   GEMINI_API_KEY=... python chat_api.py --port 8000
+#
+#   POST /v1/chat                        {"message": "...", "session_id": "...", "stream": true}
+#   GET  /v1/sessions/{id}/messages      ?start=0&limit=100
+#   GET  /v1/stats
+#   GET  /metrics                        Prometheus text format
+#   GET  /healthz
+#
+# Sessions are conversations in the conversation store: omit session_id to start one
+# and send back the id from the reply to continue it. With "stream": true the reply is
+# sent as Server-Sent Events: `data: {"text": ...}` per chunk, then `event: done`.
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+from collections import OrderedDict
+
+from async_providers import AsyncClientPool, AsyncGeminiProvider, AsyncOpenAIProvider
+from context_budget import ConversationContext
+from conversation_store import get_store
+from faq_index import get_index
+from guardrails import guardrails
+import pipeline
+from pipeline import VARIANTS, faq, validate
+from providers import ProviderError
+from resilience import CircuitOpenError, QuotaExceededError, quota, resilience_stats
+from response_cache import completion_cache, make_key
+from shared_state import off_loop
+from single_flight import AsyncCoalescer
+from telemetry import current_trace, metrics, start_trace
+
+# The HTTP server is optional; both packages come with Streamlit
+try:
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+    from starlette.routing import Route
+except ImportError:
+    Starlette = None
+
+# Concurrency defaults
+MAX_UPSTREAM = 256        # upstream streams open at once; further turns wait for a slot
+QUEUE_TIMEOUT = 5.0       # seconds a turn waits for a slot before the API answers 503
+MAX_SESSIONS = 10000      # sessions whose routing/context state is kept in memory
+TOKEN_BUDGET = 3000       # request token budget, as in the Streamlit app
+
+VARIANT = VARIANTS["chat_api.py"]
+
+
+# Raised when no upstream slot frees up within the queue timeout
+class Overloaded(Exception):
+    pass
+
+
+# Raised when a turn needs an upstream provider that is not configured
+class UnknownProvider(Exception):
+    pass
+
+
+# Per-session state kept between turns
+class ChatSession:
+    def __init__(self, conversation, token_budget=TOKEN_BUDGET):
+        self.id = conversation.id
+        self.conversation = conversation
+        self.context = ConversationContext(token_budget=token_budget)
+        self.symptoms = conversation.stored_dict("user_symptoms")
+        # Serializes history updates; replies themselves stream concurrently
+        self.lock = asyncio.Lock()
+
+
+# One reply. Local and cached answers are ready at once; upstream replies stream, and
+# are stored in the conversation and cache only once they finish. Closing the turn also
+# finishes the trace of the request that started it.
+class Turn:
+    def __init__(self, service, session, source, text=None, stream=None, cache_key=None):
+        self.service = service
+        self.session = session
+        self.source = source
+        self.text = text
+        self.stream = stream
+        self.cache_key = cache_key
+        self.closed = stream is None
+        self.trace = current_trace()
+
+    async def __aiter__(self):
+        if self.stream is None:
+            yield self.text
+            return
+        parts = []
+        try:
+            async for chunk in self.stream:
+                parts.append(chunk)
+                yield chunk
+            self.text = "".join(parts)
+            await self.service.finish(self)
+        finally:
+            await self.aclose()
+
+    async def collect(self):
+        return "".join([chunk async for chunk in self])
+
+    # Function to leave the upstream stream; the last turn reading it closes the
+    # connection and frees its slot. Safe to call more than once.
+    async def aclose(self):
+        try:
+            if not self.closed:
+                self.closed = True
+                await self.stream.aclose()
+        finally:
+            if self.trace is not None:
+                self.trace.finish()
+
+
+# The chat pipeline shared by every connection
+class ChatService:
+    def __init__(self, providers, clients, default_provider=None, store=None, max_upstream=MAX_UPSTREAM,
+                 queue_timeout=QUEUE_TIMEOUT, max_sessions=MAX_SESSIONS):
+        self.providers = providers
+        self.clients = clients
+        if default_provider is None and VARIANT["upstream"]["provider"] in providers:
+            default_provider = VARIANT["upstream"]["provider"]
+        self.default_provider = default_provider or next(iter(providers), None)
+        self.store = store or get_store()
+        self.max_upstream = max_upstream
+        self.queue_timeout = queue_timeout
+        self.max_sessions = max_sessions
+        self.slots = asyncio.Semaphore(max_upstream)
+        self.coalescer = AsyncCoalescer()
+        self.stages = VARIANT["stages"]
+        self.guardrails = guardrails if VARIANT.get("guardrails") else None
+        self.sessions = OrderedDict()
+        self.counters = {"turns": 0, "local": 0, "faq": 0, "cached": 0, "upstream": 0, "blocked": 0, "rejected": 0,
+                         "errors": 0}
+        self.in_flight = 0
+        self.waiting = 0
+
+    # Function to get a session by id, or start a new one when the id is missing or unknown
+    async def session(self, session_id=None):
+        session = self.sessions.get(session_id) if session_id else None
+        if session is None:
+            conversation = await asyncio.to_thread(self.store.open, session_id)
+            session = self.sessions.get(conversation.id) or ChatSession(conversation)
+            self.sessions[session.id] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        self.sessions.move_to_end(session.id)
+        return session
+
+    # Function to answer one user message: a local reply if a stage of the pipeline has
+    # one, then, unless a guardrail blocks the message, the cache or an upstream stream
+    # (already accepted by the upstream when returned)
+    async def start_turn(self, session, message, provider_name=None):
+        self.counters["turns"] += 1
+        async with session.lock:
+            await asyncio.to_thread(session.conversation.append, {"role": "user", "content": message})
+            # The stages store gathered symptoms and search the FAQ's memory-mapped index,
+            # so they run off the loop
+            source, reply = await asyncio.to_thread(self._local_reply, session, message)
+            if reply:
+                self.counters[source] += 1
+                await asyncio.to_thread(session.conversation.append, {"role": "assistant", "content": reply})
+                return Turn(self, session, source, text=reply)
+
+            provider = self.providers.get(provider_name or self.default_provider)
+            if provider is None:
+                raise UnknownProvider(provider_name or "no upstream provider is configured")
+            cache_key, request = await asyncio.to_thread(self._prepare, session, message, provider)
+
+        # Only the first of several identical turns in flight takes a slot and calls the
+        # upstream; the rest read the same stream, and the slot is freed when it ends
+        async def open_upstream():
+            await self.acquire()
+            try:
+                stream = await provider.stream(request)
+            except asyncio.CancelledError:
+                # Every turn waiting on the call went away, or a guardrail blocked it
+                self.release()
+                raise
+            except Exception:
+                self.counters["errors"] += 1
+                self.release()
+                raise
+            self.counters["upstream"] += 1
+            return stream
+
+        # Function returning the cached reply, or else the opened stream
+        async def open_reply():
+            cached = await off_loop(completion_cache.get, cache_key)
+            if cached:
+                return cached
+            return await self.coalescer.stream(cache_key, open_upstream, on_done=self.release)
+
+        # The guardrails check the message while the cache is read and the call is on its
+        # way, and a cached reply is held back like a streamed one; a blocked message gets
+        # the check's reply and its call is dropped unread
+        if self.guardrails is not None:
+            refusal, opened = await self.guardrails.arun(message, open_reply)
+        else:
+            refusal, opened = None, await open_reply()
+        if refusal:
+            self.counters["blocked"] += 1
+            await asyncio.to_thread(session.conversation.append, {"role": "assistant", "content": refusal})
+            return Turn(self, session, "guardrail", text=refusal)
+        if isinstance(opened, str):
+            self.counters["cached"] += 1
+            await asyncio.to_thread(session.conversation.append, {"role": "assistant", "content": opened})
+            return Turn(self, session, "cache", text=opened)
+        return Turn(self, session, provider.name, stream=opened, cache_key=cache_key)
+
+    # Function to run the pipeline's local stages, returning the answering stage's
+    # counter ("faq" or "local") and its reply
+    def _local_reply(self, session, message):
+        turn = pipeline.Turn(message, session.symptoms)
+        for stage in self.stages:
+            reply = stage(turn)
+            if reply:
+                return ("faq" if stage is faq else "local"), reply
+        return None, None
+
+    # Function to build the request with the pipeline's request builder, its user message
+    # replaced by the budgeted history (which ends with it), and its cache key. The key
+    # covers what is sent rather than the whole history, so it does not read older turns
+    # back from disk, and the guardrails the reply was checked by. Reads history, so it
+    # runs off the event loop.
+    def _prepare(self, session, message, provider):
+        request = VARIANT["upstream"]["request"](message)[:-1] + list(session.context.build(session.conversation))
+        context = list(request[:-1])
+        if self.guardrails is not None:
+            context.append({"guardrails": self.guardrails.names()})
+        return make_key(message, provider.name, context), request
+
+    # Function to store a finished upstream reply
+    async def finish(self, turn):
+        if not turn.text:
+            return
+        await asyncio.to_thread(turn.session.conversation.append, {"role": "assistant", "content": turn.text})
+        await off_loop(completion_cache.put, turn.cache_key, turn.text)
+
+    # Function to wait for a free upstream slot, giving up after the queue timeout
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counters["rejected"] += 1
+            raise Overloaded(f"no upstream slot free within {self.queue_timeout:g}s")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self.slots.release()
+
+    # Function to report the counters and current load, as exported to /metrics
+    def gauges(self):
+        return {
+            **self.counters,
+            "coalesced": self.coalescer.coalesced,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_upstream": self.max_upstream,
+            "sessions": len(self.sessions),
+        }
+
+    def stats(self):
+        return {
+            **self.gauges(),
+            "store": self.store.stats(),
+            "cache": completion_cache.stats(),
+            "breakers": resilience_stats(),
+            "quota": quota.stats(),
+        }
+
+
+# Function to encode one Server-Sent Event
+def sse(data, event=None):
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+# Function to turn an upstream failure into a JSON error response
+def error_response(error):
+    if isinstance(error, Overloaded):
+        return JSONResponse({"error": str(error)}, status_code=503, headers={"Retry-After": "1"})
+    if isinstance(error, CircuitOpenError):
+        retry_after = str(max(1, math.ceil(error.retry_in)))
+        status = 429 if isinstance(error, QuotaExceededError) else 503
+        return JSONResponse({"error": str(error)}, status_code=status, headers={"Retry-After": retry_after})
+    return JSONResponse({"error": str(error)}, status_code=502)
+
+
+if Starlette is not None:
+    # Streams a turn as SSE and always releases its upstream slot, even when the client
+    # disconnects before the body is sent (Starlette then skips background tasks)
+    class TurnResponse(StreamingResponse):
+        def __init__(self, turn):
+            self.turn = turn
+            super().__init__(
+                self.events(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Session-Id": turn.session.id},
+            )
+
+        async def events(self):
+            yield sse({"session_id": self.turn.session.id}, "session")
+            try:
+                async for chunk in self.turn:
+                    yield sse({"text": chunk})
+            except ProviderError as e:
+                self.turn.service.counters["errors"] += 1
+                yield sse({"error": str(e)}, "error")
+                return
+            yield sse({"session_id": self.turn.session.id, "source": self.turn.source}, "done")
+
+        async def __call__(self, scope, receive, send):
+            try:
+                await super().__call__(scope, receive, send)
+            finally:
+                await self.turn.aclose()
+
+
+# Function to build the ASGI app around a ChatService
+def create_app(service_factory):
+    if Starlette is None:
+        raise RuntimeError("chat_api needs starlette and uvicorn (pip install starlette uvicorn)")
+    state = {}
+
+    # Every request is traced; streamed turns finish their trace when the stream closes
+    async def chat(request):
+        trace = start_trace("chat_api.py")
+        response = await respond(request)
+        if not isinstance(response, TurnResponse):
+            trace.finish()
+        return response
+
+    async def respond(request):
+        try:
+            body = await request.json()
+        except ValueError:
+            return JSONResponse({"error": "request body must be JSON"}, status_code=400)
+        message = body.get("message") if isinstance(body, dict) else None
+        if not isinstance(message, str):
+            return JSONResponse({"error": "message is required"}, status_code=400)
+        validation_error = VARIANT["validate"] and validate(pipeline.Turn(message))
+        if validation_error:
+            return JSONResponse({"error": validation_error}, status_code=422)
+
+        service = state["service"]
+        session = await service.session(body.get("session_id"))
+        try:
+            turn = await service.start_turn(session, message, body.get("provider"))
+        except UnknownProvider as e:
+            return JSONResponse({"error": f"unknown provider: {e}"}, status_code=400)
+        except (Overloaded, CircuitOpenError, ProviderError) as e:
+            return error_response(e)
+
+        if body.get("stream"):
+            return TurnResponse(turn)
+        try:
+            reply = await turn.collect()
+        except ProviderError as e:
+            service.counters["errors"] += 1
+            return error_response(e)
+        finally:
+            await turn.aclose()
+        return JSONResponse({"session_id": session.id, "reply": reply, "source": turn.source})
+
+    async def messages(request):
+        service = state["service"]
+        session_id = request.path_params["session_id"]
+        if not await asyncio.to_thread(service.store.backend.exists, session_id):
+            return JSONResponse({"error": "unknown session"}, status_code=404)
+        try:
+            start = max(0, int(request.query_params.get("start", 0)))
+            limit = min(1000, max(1, int(request.query_params.get("limit", 100))))
+        except ValueError:
+            return JSONResponse({"error": "start and limit must be integers"}, status_code=400)
+        session = await service.session(session_id)
+        page = await asyncio.to_thread(session.conversation.__getitem__, slice(start, start + limit))
+        return JSONResponse({
+            "session_id": session.id,
+            "start": start,
+            "total": len(session.conversation),
+            "messages": [message.as_dict() for message in page],
+        })
+
+    # Both read breaker, quota and cache state, which may be in the shared store
+    async def stats(request):
+        return JSONResponse(await off_loop(state["service"].stats))
+
+    async def prometheus(request):
+        return PlainTextResponse(await off_loop(metrics.prometheus), media_type="text/plain; version=0.0.4")
+
+    async def health(request):
+        return JSONResponse({"ok": True})
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        # The FAQ index is opened (or built) before the first request rather than by it
+        await asyncio.to_thread(get_index)
+        # Created inside the running loop so the semaphore and client bind to it
+        service = state["service"] = service_factory()
+        metrics.register("api", lambda: {**service.gauges(), "store": service.store.stats()})
+        try:
+            yield
+        finally:
+            await state["service"].clients.aclose()
+
+    return Starlette(
+        routes=[
+            Route("/v1/chat", chat, methods=["POST"]),
+            Route("/v1/sessions/{session_id}/messages", messages, methods=["GET"]),
+            Route("/v1/stats", stats, methods=["GET"]),
+            Route("/metrics", prometheus, methods=["GET"]),
+            Route("/healthz", health, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+# Function to configure the upstream providers from API keys in the environment
+def providers_from_env(clients, gemini_model, openai_model):
+    providers = {}
+    if os.environ.get("GEMINI_API_KEY"):
+        providers["gemini"] = AsyncGeminiProvider(clients, os.environ["GEMINI_API_KEY"], gemini_model)
+    if os.environ.get("OPENAI_API_KEY"):
+        providers["openai"] = AsyncOpenAIProvider(clients, os.environ["OPENAI_API_KEY"], openai_model)
+    return providers
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve the chat pipeline as a JSON/SSE HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--provider", choices=["gemini", "openai"],
+                        help="default upstream (default: the pipeline's, else the first configured)")
+    parser.add_argument("--gemini-model", default=VARIANT["upstream"]["model"])
+    parser.add_argument("--openai-model", default="gpt-3.5-turbo")
+    parser.add_argument("--max-upstream", type=int, default=MAX_UPSTREAM, help="upstream streams open at once")
+    parser.add_argument("--queue-timeout", type=float, default=QUEUE_TIMEOUT,
+                        help="seconds a turn waits for an upstream slot before a 503")
+    parser.add_argument("--max-connections", type=int, default=4096,
+                        help="client connections served at once; more get a 503")
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--keep-alive", type=float, default=30.0,
+                        help="seconds an idle client connection is kept open")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if Starlette is None:
+        raise SystemExit("chat_api needs starlette and uvicorn (pip install starlette uvicorn)")
+
+    def service_factory():
+        clients = AsyncClientPool(args.max_upstream)
+        providers = providers_from_env(clients, args.gemini_model, args.openai_model)
+        if not providers:
+            print("warning: neither GEMINI_API_KEY nor OPENAI_API_KEY is set; only local replies will work")
+        return ChatService(providers, clients, args.provider, max_upstream=args.max_upstream,
+                           queue_timeout=args.queue_timeout, max_sessions=args.max_sessions)
+
+    uvicorn.run(
+        create_app(service_factory),
+        host=args.host,
+        port=args.port,
+        limit_concurrency=args.max_connections,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
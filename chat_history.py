@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict, deque
+
+import streamlit as st
+
+from images import render_image_message
+from telemetry import record_span
+
+RECENT_MESSAGES = 20     # most recent messages drawn in full on every rerun
+PAGE_SIZE = 50           # older messages are grouped into collapsed pages of this size
+CACHED_MESSAGES = 200    # finished messages whose text is kept ready to draw
+TIMING_WINDOW = 50       # reruns kept for the render timing stats
+
+
+# Draws a conversation's history without touching every message on every rerun.
+# The last `recent` messages are drawn in full; older ones sit in collapsed pages
+# whose contents are only read and sent when the page is opened. Finished messages
+# never change, so their text is cached and steady-state reruns do not go back to the
+# conversation store (or decode the stored content) at all.
+class HistoryRenderer:
+    def __init__(self, recent=RECENT_MESSAGES, page_size=PAGE_SIZE, cached=CACHED_MESSAGES):
+        self.recent = recent
+        self.page_size = page_size
+        self.cached = cached
+        self.messages = None
+        # Message index -> (role, text), least recently drawn first
+        self.cache = OrderedDict()
+        self.timings = deque(maxlen=TIMING_WINDOW)
+        self.drawn = 0
+
+    # Function to get (role, text) for messages [start, stop), reading the history only
+    # for messages that are not cached yet
+    def _entries(self, messages, start, stop):
+        missing = [index for index in range(start, stop) if index not in self.cache]
+        if missing:
+            for index, message in enumerate(messages[missing[0]:missing[-1] + 1], missing[0]):
+                self.cache[index] = (message["role"], message["content"])
+        entries = []
+        for index in range(start, stop):
+            self.cache.move_to_end(index)
+            entries.append(self.cache[index])
+        while len(self.cache) > max(self.cached, stop - start):
+            self.cache.popitem(last=False)
+        return entries
+
+    # Function to draw entries starting at message index `start`. Generated images are
+    # drawn as thumbnails; the full size loads only when its expander is opened.
+    def _draw(self, entries, start):
+        for index, (role, text) in enumerate(entries, start):
+            with st.chat_message(role):
+                if not render_image_message(text, key=f"history_image_{index}"):
+                    st.markdown(text)
+        self.drawn += len(entries)
+
+    def render(self, messages):
+        started = time.perf_counter()
+        if messages is not self.messages:
+            # A different conversation was attached to the session
+            self.messages = messages
+            self.cache.clear()
+        self.drawn = 0
+
+        length = len(messages)
+        recent_start = max(0, length - self.recent)
+        for start in range(0, recent_start, self.page_size):
+            stop = min(start + self.page_size, recent_start)
+            # With on_change="rerun" the page body only runs (and is only sent) while open
+            page = st.expander(f"Messages {start + 1}–{stop}", key=f"history_page_{start}", on_change="rerun")
+            if page.open:
+                with page:
+                    self._draw(self._entries(messages, start, stop), start)
+        self._draw(self._entries(messages, recent_start, length), recent_start)
+        self.timings.append(time.perf_counter() - started)
+        record_span("history_render", started, self.timings[-1])
+
+    def stats(self):
+        timings = sorted(self.timings)
+        return {
+            "messages_drawn": self.drawn,
+            "cached_messages": len(self.cache),
+            "last_ms": self.timings[-1] * 1000 if self.timings else 0.0,
+            "p50_ms": timings[len(timings) // 2] * 1000 if timings else 0.0,
+            "max_ms": timings[-1] * 1000 if timings else 0.0,
+        }
+
+
+# Function to draw a session's history with the renderer kept in its session state
+def render_history(session_state, messages):
+    if "history_renderer" not in session_state:
+        session_state.history_renderer = HistoryRenderer()
+    session_state.history_renderer.render(messages)
+    return session_state.history_renderer
@@ -0,0 +1,106 @@
+import json
+import sys
+
+# Roles are interned so every message in every session shares the same few strings
+ROLES = {role: sys.intern(role) for role in ("system", "user", "assistant")}
+_ROLE_JSON = {role: json.dumps(role).encode("utf-8") for role in ROLES}
+
+
+# Function to JSON-encode message text once, as UTF-8 bytes
+def encode_content(text):
+    return json.dumps(text, ensure_ascii=False).encode("utf-8")
+
+
+# A chat message stored compactly: a slotted record holding an interned role and the
+# content as JSON-encoded UTF-8 bytes. The bytes are usually smaller than a str (one
+# emoji makes CPython store a whole str at 4 bytes per character) and they drop
+# straight into a request body, so history is never re-escaped per request. Reads like
+# the {"role": ..., "content": ...} dict it replaces.
+class Message:
+    __slots__ = ("role", "encoded")
+
+    def __init__(self, role, content):
+        self.role = ROLES.get(role) or sys.intern(role)
+        self.encoded = encode_content(content)
+
+    # Function to build a message from content that is already JSON-encoded
+    @classmethod
+    def from_encoded(cls, role, encoded):
+        message = cls.__new__(cls)
+        message.role = ROLES.get(role) or sys.intern(role)
+        message.encoded = encoded
+        return message
+
+    # Function to accept either a Message or a {"role", "content"} dict
+    @classmethod
+    def coerce(cls, message):
+        if isinstance(message, cls):
+            return message
+        return cls(message["role"], message["content"])
+
+    @property
+    def content(self):
+        return json.loads(self.encoded)
+
+    def __getitem__(self, key):
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return ("role", "content")
+
+    def as_dict(self):
+        return {"role": self.role, "content": self.content}
+
+    # Function to serialize as a JSON object without decoding the content
+    def to_json(self):
+        role = _ROLE_JSON.get(self.role) or json.dumps(self.role).encode("utf-8")
+        return b'{"role":' + role + b',"content":' + self.encoded + b"}"
+
+    def __eq__(self, other):
+        if isinstance(other, Message):
+            return self.role == other.role and self.encoded == other.encoded
+        if isinstance(other, dict):
+            return self.as_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Message(role={self.role!r}, content={self.content!r})"
+
+
+# Function to build an OpenAI chat-completions request body from the encoded messages
+def openai_body(model, messages, stream=False):
+    return b"".join((
+        b'{"model":', json.dumps(model).encode("utf-8"),
+        b',"messages":[', b",".join(Message.coerce(m).to_json() for m in messages),
+        b'],"stream":', b"true" if stream else b"false", b"}",
+    ))
+
+
+# Function to build a Gemini generateContent request body from the encoded messages.
+# System messages become the systemInstruction; assistant turns use the "model" role.
+def gemini_body(messages):
+    contents = []
+    system = []
+    for message in map(Message.coerce, messages):
+        part = b'{"text":' + message.encoded + b"}"
+        if message.role == "system":
+            system.append(part)
+        else:
+            role = b"model" if message.role == "assistant" else b"user"
+            contents.append(b'{"role":"' + role + b'","parts":[' + part + b"]}")
+    body = b'{"contents":[' + b",".join(contents) + b"]"
+    if system:
+        body += b',"systemInstruction":{"parts":[' + b",".join(system) + b"]}"
+    return body + b"}"
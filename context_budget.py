@@ -0,0 +1,137 @@
+import re
+
+from chat_messages import Message
+from telemetry import note, traced
+
+# Use the real tokenizer when tiktoken is installed, otherwise estimate ~4 chars per token
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+# Tokens the chat format adds around every message (role, separators)
+MESSAGE_OVERHEAD = 4
+
+DEFAULT_TOKEN_BUDGET = 3000
+DEFAULT_SUMMARY_BUDGET = 600
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+# Function to count the tokens in a piece of text
+def count_tokens(text):
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+# Function to cut text down to at most `max_tokens` tokens
+def truncate_tokens(text, max_tokens):
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _ENCODING is not None:
+        return _ENCODING.decode(_ENCODING.encode(text)[:max_tokens])
+    return text[: max_tokens * 4]
+
+
+# Default summarizer: keep the first sentence of each folded turn as a bullet and drop
+# the oldest bullets once the summary outgrows its budget. It is cheap and
+# deterministic, so folding turns adds no upstream call.
+def extractive_summary(previous_summary, folded_messages, max_tokens):
+    lines = previous_summary.splitlines() if previous_summary else []
+    for message in folded_messages:
+        content = " ".join(message["content"].split())
+        first_sentence = _SENTENCE_END.split(content, maxsplit=1)[0]
+        lines.append(f"- {message['role']}: {truncate_tokens(first_sentence, 60)}")
+    while lines and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+# Keeps the request sent upstream within a fixed token budget.
+# The most recent turns are sent verbatim. Older turns are folded once into a rolling
+# summary and never re-read, so each turn only pays for the newly folded messages.
+class ConversationContext:
+    def __init__(
+        self,
+        token_budget=DEFAULT_TOKEN_BUDGET,
+        summary_budget=DEFAULT_SUMMARY_BUDGET,
+        summarizer=extractive_summary,
+        fold_target=0.75,
+    ):
+        if summary_budget >= token_budget:
+            raise ValueError("summary_budget must be smaller than token_budget")
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.summarizer = summarizer
+        # When the verbatim window overflows, fold until it is this fraction of its budget
+        # so summarization runs in batches rather than on every turn
+        self.fold_target = fold_target
+        self.summary = ""
+        self.summary_message = None
+        self.summary_tokens = 0
+        self.summarized_upto = 0
+        self.token_counts = []
+
+    # Tokens available for verbatim turns once the summary has taken its share
+    @property
+    def window_budget(self):
+        return self.token_budget - self.summary_budget
+
+    def reset(self):
+        self.summary = ""
+        self.summary_message = None
+        self.summary_tokens = 0
+        self.summarized_upto = 0
+        self.token_counts = []
+
+    # Function to count tokens for messages appended since the last call
+    def _update_counts(self, messages):
+        if len(messages) < len(self.token_counts):
+            self.reset()
+        for message in messages[len(self.token_counts):]:
+            self.token_counts.append(count_tokens(message["content"]) + MESSAGE_OVERHEAD)
+
+    @traced("context_build")
+    def build(self, messages):
+        self._update_counts(messages)
+        if not messages:
+            return []
+
+        # Fold the oldest unsummarized turns while the verbatim window is over budget,
+        # always keeping the latest message
+        window_tokens = sum(self.token_counts[self.summarized_upto:])
+        if window_tokens > self.window_budget:
+            target = self.window_budget * self.fold_target
+            fold_end = self.summarized_upto
+            while fold_end < len(messages) - 1 and window_tokens > target:
+                window_tokens -= self.token_counts[fold_end]
+                fold_end += 1
+            folded = messages[self.summarized_upto:fold_end]
+            max_summary_tokens = self.summary_budget - MESSAGE_OVERHEAD - count_tokens(SUMMARY_PREFIX)
+            self.summary = self.summarizer(self.summary, folded, max_summary_tokens)
+            self.summary_message = Message("system", SUMMARY_PREFIX + self.summary) if self.summary else None
+            self.summary_tokens = count_tokens(self.summary_message.content) + MESSAGE_OVERHEAD if self.summary else 0
+            self.summarized_upto = fold_end
+
+        # The request reuses the stored (already encoded) messages rather than copying them
+        request = [self.summary_message] if self.summary_message else []
+        request.extend(Message.coerce(m) for m in messages[self.summarized_upto:])
+
+        # A single oversized message can still exceed the window; trim it so the
+        # request never goes over the limit
+        if window_tokens > self.window_budget:
+            latest = request[-1]
+            request[-1] = Message(latest.role, truncate_tokens(latest.content, self.window_budget - MESSAGE_OVERHEAD))
+        note("request_tokens", min(window_tokens, self.window_budget) + self.summary_tokens)
+        return request
+
+    # Function to report the token size of a built request
+    @staticmethod
+    def request_tokens(request):
+        return sum(count_tokens(m.content) + MESSAGE_OVERHEAD for m in request)
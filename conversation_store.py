@@ -0,0 +1,367 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+from chat_messages import Message
+
+# Where conversations are kept; override with CONVERSATION_DB (":memory:" for no file)
+DEFAULT_DB_PATH = os.environ.get("CONVERSATION_DB", "conversations.db")
+
+HOT_WINDOW = 20          # most recent messages kept in memory per conversation
+PAGE_SIZE = 100          # messages read from disk at a time when paging older turns in
+IDLE_TIMEOUT = 900       # seconds before an unused conversation drops its in-memory window
+EVICT_INTERVAL = 30      # seconds between idle sweeps
+
+_CONVERSATION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+# SQLite backend: messages are only ever appended, keyed by (conversation, position)
+class SQLiteBackend:
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                conversation_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content BLOB NOT NULL,
+                PRIMARY KEY (conversation_id, seq)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                conversation_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (conversation_id, name)
+            ) WITHOUT ROWID;
+            """
+        )
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(messages)")]
+        if "message" in columns:
+            self._migrate_json_messages()
+
+    # Function to convert a store written with whole messages as JSON text into
+    # role + encoded content columns
+    def _migrate_json_messages(self):
+        self.db.execute("BEGIN")
+        self.db.execute("ALTER TABLE messages RENAME TO messages_json")
+        self.db.execute(
+            "CREATE TABLE messages (conversation_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+            "content BLOB NOT NULL, PRIMARY KEY (conversation_id, seq)) WITHOUT ROWID"
+        )
+        for conversation_id, seq, raw in self.db.execute("SELECT conversation_id, seq, message FROM messages_json"):
+            message = Message.coerce(json.loads(raw))
+            self.db.execute(
+                "INSERT INTO messages (conversation_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                (conversation_id, seq, message.role, message.encoded),
+            )
+        self.db.execute("DROP TABLE messages_json")
+        self.db.execute("COMMIT")
+
+    def exists(self, conversation_id):
+        with self.lock:
+            row = self.db.execute("SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        return row is not None
+
+    def create(self, conversation_id):
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR IGNORE INTO conversations (id, created, updated) VALUES (?, ?, ?)",
+                (conversation_id, now, now),
+            )
+
+    def count(self, conversation_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()
+        return row[0]
+
+    def append(self, conversation_id, seq, message):
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                self.db.execute(
+                    "INSERT INTO messages (conversation_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                    (conversation_id, seq, message.role, message.encoded),
+                )
+                self.db.execute("UPDATE conversations SET updated = ? WHERE id = ?", (time.time(), conversation_id))
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    # Function to read messages [start, stop) of a conversation
+    def load(self, conversation_id, start, stop):
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT role, content FROM messages WHERE conversation_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (conversation_id, start, stop),
+            ).fetchall()
+        return [Message.from_encoded(role, content) for role, content in rows]
+
+    def get_meta(self, conversation_id, name):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT value FROM meta WHERE conversation_id = ? AND name = ?", (conversation_id, name)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_meta(self, conversation_id, name, value):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO meta (conversation_id, name, value) VALUES (?, ?, ?)",
+                (conversation_id, name, json.dumps(value, ensure_ascii=False)),
+            )
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+# A small dict stored alongside a conversation (e.g. extracted symptoms); every
+# change is written through to the backend
+class StoredDict:
+    def __init__(self, conversation, name):
+        self.conversation = conversation
+        self.name = name
+        self.data = None
+
+    def _load(self):
+        if self.data is None:
+            self.data = self.conversation.store.backend.get_meta(self.conversation.id, self.name) or {}
+        return self.data
+
+    def _save(self):
+        self.conversation.store.backend.put_meta(self.conversation.id, self.name, self.data)
+
+    def update(self, *args, **kwargs):
+        self._load().update(*args, **kwargs)
+        self._save()
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self._save()
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self._save()
+
+    def clear(self):
+        self.data = {}
+        self._save()
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def get(self, key, default=None):
+        return self._load().get(key, default)
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    def __iter__(self):
+        return iter(list(self._load()))
+
+    def __len__(self):
+        return len(self._load())
+
+    def items(self):
+        return list(self._load().items())
+
+    # Drop the cached copy; the next access reads it back from the backend
+    def evict(self):
+        self.data = None
+
+
+# One conversation's message history. Behaves like the list it replaces
+# (append, len, iteration, indexing, slicing) but only the last `hot_window`
+# messages stay in memory; older ones are read from the backend on demand.
+# Messages are held as compact `Message` records; appended dicts are converted.
+class Conversation:
+    def __init__(self, store, conversation_id):
+        self.store = store
+        self.id = conversation_id
+        self.lock = threading.RLock()
+        self.hot = None
+        self.length = 0
+        self.dicts = {}
+        self.last_used = time.monotonic()
+
+    # Function to load the in-memory window if it was evicted (or never loaded)
+    def _window(self):
+        self.last_used = time.monotonic()
+        if self.hot is None:
+            backend = self.store.backend
+            self.length = backend.count(self.id)
+            start = max(0, self.length - self.store.hot_window)
+            self.hot = deque(backend.load(self.id, start, self.length), maxlen=self.store.hot_window)
+            self.store.track(self)
+        return self.hot
+
+    def __len__(self):
+        with self.lock:
+            self._window()
+            return self.length
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def append(self, message):
+        message = Message.coerce(message)
+        with self.lock:
+            hot = self._window()
+            try:
+                self.store.backend.append(self.id, self.length, message)
+            except sqlite3.IntegrityError:
+                # Another tab appended to the same conversation; reload and go after it
+                self.hot = None
+                hot = self._window()
+                self.store.backend.append(self.id, self.length, message)
+            hot.append(message)
+            self.length += 1
+
+    # Function to read messages [start, stop), from memory where possible
+    def _range(self, start, stop):
+        with self.lock:
+            hot = self._window()
+            hot_start = self.length - len(hot)
+            messages = []
+            if start < hot_start:
+                messages = self.store.backend.load(self.id, start, min(stop, hot_start))
+            if stop > hot_start:
+                messages.extend(list(hot)[max(start, hot_start) - hot_start:stop - hot_start])
+            return messages
+
+    def __getitem__(self, index):
+        length = len(self)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(length)
+            if step != 1:
+                return self._range(0, length)[index]
+            return self._range(start, stop) if start < stop else []
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("conversation index out of range")
+        return self._range(index, index + 1)[0]
+
+    # Older messages are paged in PAGE_SIZE at a time rather than loaded all at once
+    def __iter__(self):
+        length = len(self)
+        for start in range(0, length, PAGE_SIZE):
+            yield from self._range(start, min(start + PAGE_SIZE, length))
+
+    # Function to get a named dict stored with this conversation
+    def stored_dict(self, name):
+        with self.lock:
+            if name not in self.dicts:
+                self.dicts[name] = StoredDict(self, name)
+            return self.dicts[name]
+
+    # Function to drop everything held in memory; it is reloaded on next use
+    def evict(self):
+        with self.lock:
+            self.hot = None
+            for stored in self.dicts.values():
+                stored.evict()
+
+
+# Process-wide registry of conversations over one backend, evicting idle ones from memory
+class ConversationStore:
+    def __init__(self, backend=None, hot_window=HOT_WINDOW, idle_timeout=IDLE_TIMEOUT):
+        self.backend = backend if backend is not None else SQLiteBackend()
+        self.hot_window = hot_window
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        # Open conversations by id, shared by sessions that resume the same one
+        self.conversations = {}
+        # Conversations currently holding messages in memory
+        self.loaded = set()
+        self.last_sweep = time.monotonic()
+        self.evicted = 0
+
+    # Function to open a conversation by id, or start a new one if the id is unknown
+    def open(self, conversation_id=None):
+        self.evict_idle()
+        if not conversation_id or not _CONVERSATION_ID.match(conversation_id) or not self.backend.exists(conversation_id):
+            conversation_id = uuid.uuid4().hex
+            self.backend.create(conversation_id)
+        with self.lock:
+            conversation = self.conversations.get(conversation_id)
+            if conversation is None:
+                conversation = self.conversations[conversation_id] = Conversation(self, conversation_id)
+        return conversation
+
+    # Function to note that a conversation has loaded messages into memory
+    def track(self, conversation):
+        with self.lock:
+            self.loaded.add(conversation)
+
+    # Function to drop the in-memory window of conversations that have been idle too long.
+    # Their data is already on disk, so nothing is lost.
+    def evict_idle(self, force=False):
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self.last_sweep < EVICT_INTERVAL:
+                return
+            self.last_sweep = now
+            idle = [c for c in self.loaded if now - c.last_used > self.idle_timeout]
+            for conversation in idle:
+                self.loaded.discard(conversation)
+                if self.conversations.get(conversation.id) is conversation:
+                    del self.conversations[conversation.id]
+            self.evicted += len(idle)
+        for conversation in idle:
+            conversation.evict()
+
+    def stats(self):
+        with self.lock:
+            loaded = list(self.loaded)
+            open_count = len(self.conversations)
+        return {
+            "open": open_count,
+            "loaded": len(loaded),
+            "hot_messages": sum(len(c.hot) for c in loaded if c.hot is not None),
+            "evicted": self.evicted,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+# Function to get the process-wide store (created on first use)
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore()
+        return _store
+
+
+# Function to attach a stored conversation to a Streamlit session as
+# `session_state.messages`. The id is kept in the URL (?conversation=...) so a
+# reconnecting user resumes the same history.
+def open_conversation(session_state, query_params, store=None):
+    if "messages" not in session_state:
+        conversation = (store or get_store()).open(query_params.get("conversation"))
+        query_params["conversation"] = conversation.id
+        session_state.messages = conversation
+    return session_state.messages
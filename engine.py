@@ -0,0 +1,384 @@
+import streamlit as st
+
+from chat_history import render_history
+from conversation_store import open_conversation
+from faq_index import get_index
+from pipeline import VARIANTS, Turn, answer_key, validate
+from stats_panel import render_stats_panel
+from telemetry import Span, end_trace, start_trace
+
+# Shared Streamlit driver of the chatbot apps. Each app script is a thin configuration
+# (see pipeline.VARIANTS) that calls run_app with its variant name, so the pipeline, the
+# prompt templates and the clients are set up once per process on import instead of
+# being rebuilt by the script body on every rerun. Feature modules (the OpenAI SDK,
+# images, guardrails, prefetching) are imported on first use, so a variant that does not
+# use them never pays for their import.
+
+IMAGE_TIMEOUT = 60                      # seconds allowed for a generated image
+IMAGE_CAPTION = "Generated Medical Image"
+
+# Open the FAQ index (building it if the corpus is new) once per process, at startup,
+# rather than in the first request that searches it
+get_index()
+
+
+# Function to show an assistant reply and add it to the history
+def reply(text):
+    with st.chat_message("assistant"):
+        st.markdown(text)
+    st.session_state.messages.append({"role": "assistant", "content": text})
+
+
+# Function to start the image for an image question in the background, or to find it
+# in the image cache; returns (image call or None, image cache key or None)
+def start_image(prompt, model, api_key, session, use_cache, on_done):
+    from gemini_stream import generate_url
+    from images import fetch_image, image_cache, image_key
+    from intent_router import is_image_query
+    from parallel_calls import BackgroundCall
+
+    if not is_image_query(prompt):
+        return None, None
+    image_prompt = f"Generate an image of {prompt}"
+    key = image_key(image_prompt, model)
+    if use_cache and key in image_cache:
+        return None, key
+    payload = {"contents": [{"parts": [{"text": image_prompt}]}]}
+    call = BackgroundCall(fetch_image, generate_url(model, api_key), payload, key,
+                          session=session, timeout=IMAGE_TIMEOUT, on_done=on_done)
+    return call, key
+
+
+# Function to draw a cached image at full size
+def show_cached_image(key):
+    from images import image_cache
+
+    image_data = image_cache.get(key)
+    if image_data is None:
+        st.error("Generated image is no longer cached.")
+    else:
+        st.image(image_data, caption=IMAGE_CAPTION)
+
+
+# Function returning the callback that renders a finished image call into `area`
+def image_renderer(area):
+    from gemini_stream import GeminiAPIError
+    from parallel_calls import CallCancelled
+
+    def show_image(image_call):
+        with area.container():
+            try:
+                key = image_call.result()
+            except CallCancelled as e:
+                st.error(f"Image generation failed: {e}")
+            except GeminiAPIError as e:
+                st.error(f"Image generation failed: {e.status_code}")
+            except Exception as e:
+                st.error(f"Image generation failed: {e}")
+            else:
+                show_cached_image(key)
+    return show_image
+
+
+# Function to answer a turn no local stage answered from Gemini: from the shared cache
+# if possible, otherwise streamed, optionally behind the guardrails and alongside an
+# image call. With `cascade` (see model_router.py) the model is picked per question, and
+# an answer that comes back truncated or unsure is replaced by one from the next model.
+def ask_gemini(prompt, upstream, api_key, session, use_cache, guarded, image_call, cascade=None):
+    from requests import RequestException
+
+    from gemini_stream import GeminiAPIError, stream_gemini, stream_url
+    from parallel_calls import poll
+    from resilience import CircuitOpenError, quota_key
+    from response_cache import completion_cache
+    from single_flight import coalescer
+    from stream_render import write_stream
+
+    if guarded:
+        from guardrails import guardrails
+
+    # Routed answers are cached apart from the variant's fixed model, and guarded ones
+    # apart from unguarded variants with the same model and context
+    cache_model = "cascade" if cascade else upstream["model"]
+    cache_key = answer_key(prompt, cache_model, upstream, guardrails.names() if guarded else ())
+    payload = upstream["request"](prompt)
+    depth = len(st.session_state.messages) // 2
+    decision = None
+    model = upstream["model"]
+
+    # Sessions asking the same question of the same model with the same API key at the
+    # same time share one call; another key's session makes its own, billed to its key
+    def call():
+        url = stream_url(model, api_key)
+        return coalescer.stream(f"{cache_key}:{model}:{quota_key(api_key)}",
+                                lambda: stream_gemini(url, payload, session=session))
+
+    # Function returning the cached reply, or else the opened stream
+    def open_reply():
+        nonlocal decision, model
+        cached_response = completion_cache.get(cache_key) if use_cache else None
+        if cached_response:
+            return cached_response
+        if cascade:
+            decision = cascade.route(prompt, depth)
+            model = decision["model"]
+        return call()
+
+    refusal = None
+    try:
+        if guarded:
+            # The guardrails check the message while the cache is read and the request
+            # is on its way, and a cached reply is held back like a streamed one; if a
+            # check blocks the message, its reply is shown instead and the Gemini call is
+            # dropped unread
+            refusal, opened = guardrails.run(prompt, open_reply)
+        else:
+            opened = open_reply()
+    except GeminiAPIError as e:
+        st.error(f"Error with Gemini API: {e.status_code} - {e.text}")
+        return
+    except CircuitOpenError as e:
+        # Upstream is failing for everyone right now; fail fast instead of retrying
+        st.error(f"The model is temporarily unavailable: {e}")
+        return
+    except RequestException as e:
+        st.error(f"Could not reach the Gemini API: {e}")
+        return
+    if refusal:
+        reply(refusal)
+        return
+    if isinstance(opened, str):
+        reply(opened)
+        return
+
+    stream = opened
+    answer = st.empty()
+    while True:
+        chunks = cascade.watch(decision, stream) if cascade else stream
+        # Show the image as soon as it is ready while the reply streams
+        with Span("render"), answer.container(), st.chat_message("assistant"):
+            write_stream(poll(chunks, image_call) if image_call else chunks)
+        if not cascade:
+            break
+        model = cascade.attempt(decision, payload, stream.text, stream.finish_reason, stream.error)
+        if model is None:
+            cascade.finish(decision, upstream["model"])
+            break
+        try:
+            stream = call()
+        except (GeminiAPIError, CircuitOpenError, RequestException):
+            # Keep the answer already shown
+            cascade.finish(decision, upstream["model"])
+            break
+
+    # Store the assembled reply, even if the stream broke off part way
+    if stream.text:
+        st.session_state.messages.append({"role": "assistant", "content": stream.text})
+    if stream.error:
+        st.error(f"Gemini stream interrupted: {stream.error}")
+    elif stream.text:
+        completion_cache.put(cache_key, stream.text)
+    else:
+        st.error("No response text found in Gemini API output.")
+
+
+# Function to answer from OpenAI through `router` (see connect). The request keeps to a
+# fixed token budget, and its earlier turns (the rolling summary and the recent ones it
+# sends verbatim) are part of the cache key, so the same question in a different
+# conversation is not reused and the key costs the same however long the history is.
+def ask_openai(prompt, upstream, api_key, router, use_cache):
+    from openai import APIConnectionError, APIStatusError
+    from requests import RequestException
+
+    from context_budget import ConversationContext
+    from gemini_stream import GeminiAPIError
+    from providers import ProviderError
+    from resilience import CircuitOpenError, quota_key
+    from response_cache import completion_cache, make_key
+    from single_flight import coalescer
+    from stream_render import write_stream
+
+    if "context" not in st.session_state:
+        st.session_state.context = ConversationContext(token_budget=upstream["token_budget"])
+
+    request = st.session_state.context.build(st.session_state.messages)
+    cache_key = make_key(prompt, upstream["model"], request[:-1])
+    cached_response = completion_cache.get(cache_key) if use_cache else None
+    if cached_response:
+        reply(cached_response)
+        return
+    try:
+        stream = coalescer.stream(f"{cache_key}:{quota_key(api_key)}", lambda: router.stream(request))
+        with Span("render"), st.chat_message("assistant"):
+            response = write_stream(stream)
+    except CircuitOpenError as e:
+        # Upstream is failing for everyone right now; fail fast instead of retrying
+        st.error(f"The model is temporarily unavailable: {e}")
+    except (APIStatusError, APIConnectionError, ProviderError, GeminiAPIError, RequestException) as e:
+        # OpenAI failed, or the stream broke off, and no backup answered in its place
+        st.error(f"Error from the model: {e}")
+    else:
+        st.session_state.messages.append({"role": "assistant", "content": response})
+        if isinstance(response, str) and response:
+            completion_cache.put(cache_key, response)
+
+
+# Function returning this session's prefetcher if the sidebar switch is on, creating or
+# cancelling it as the switch changes
+def session_prefetcher(api_key):
+    if st.sidebar.checkbox("Prefetch answers to follow-up questions", value=False):
+        if "prefetcher" not in st.session_state:
+            from gemini_stream import generate_url
+            from http_pool import get_session
+            from prefetch import Prefetcher
+
+            st.session_state.prefetcher = Prefetcher(
+                generate_url("gemini-1.5-flash", api_key), get_session("gemini", api_key)
+            )
+        return st.session_state.prefetcher
+    if "prefetcher" in st.session_state:
+        st.session_state.pop("prefetcher").cancel()
+    return None
+
+
+# Function to offer the predicted answers to the bot's follow-up questions as buttons;
+# only these are answered from a prediction
+def render_quick_replies(prefetcher):
+    suggestions = prefetcher.suggestions()
+    if not suggestions:
+        return
+    for column, answer in zip(st.columns(len(suggestions)), suggestions):
+        column.button(answer, key=f"quick_reply_{answer}", on_click=send_quick_reply, args=(answer,))
+
+
+def send_quick_reply(answer):
+    st.session_state.quick_reply = answer
+
+
+# Function returning what a variant calls upstream with: a keep-alive Gemini session, or
+# for OpenAI a router that races a backup Gemini request (if a backup key is set in the
+# sidebar) when OpenAI is slow to start answering. Both are built once per process and
+# API key and shared across reruns and sessions.
+def connect(upstream, api_key):
+    from http_pool import get_openai_client, get_session
+
+    if upstream["provider"] == "gemini":
+        return get_session("gemini", api_key)
+    from providers import GeminiProvider, HedgedRouter, OpenAIProvider
+
+    backup_api_key = st.sidebar.text_input("Backup Gemini API Key (optional)", type="password")
+    return HedgedRouter(
+        OpenAIProvider(get_openai_client(api_key), upstream["model"]),
+        GeminiProvider(backup_api_key, upstream["backup_model"], session=get_session("gemini", backup_api_key))
+        if backup_api_key else None,
+    )
+
+
+# Function to run one rerun of the named variant's app
+def run_app(name):
+    variant = VARIANTS[name]
+    page = variant["page"]
+    upstream = variant["upstream"]
+
+    if "page_config" in page:
+        st.set_page_config(**page["page_config"])
+    st.title(page["title"])
+    st.write(page["description"])
+
+    api_key = st.text_input(page["key_label"], type="password")
+    if not api_key:
+        if page["key_icon"]:
+            st.info(page["key_missing"], icon=page["key_icon"])
+        else:
+            st.warning(page["key_missing"])
+        return
+
+    client = connect(upstream, api_key) if upstream else None
+    use_cache = bool(upstream) and st.sidebar.checkbox("Use cached answers", value=True)
+    cascade = None
+    if variant.get("cascade") and st.sidebar.checkbox("Route each question to the cheapest adequate model", value=False):
+        from model_router import cascade
+
+    # History is kept in the conversation store: recent turns in memory, the rest on
+    # disk. The URL carries the conversation id so a reconnect resumes it.
+    open_conversation(st.session_state, st.query_params)
+    prefetcher = None
+    if variant.get("prefetch"):
+        if "user_symptoms" not in st.session_state:
+            st.session_state.user_symptoms = st.session_state.messages.stored_dict("user_symptoms")
+        prefetcher = session_prefetcher(api_key)
+
+    # Only the latest turns are drawn in full; older ones are grouped into pages that
+    # load when expanded
+    render_history(st.session_state, st.session_state.messages)
+
+    # A clicked quick reply is sent as if typed
+    prompt = st.chat_input(page["input"]) or st.session_state.pop("quick_reply", None)
+    if prompt:
+        # Trace this turn's stages for the stats panel and the metrics export, even if
+        # the turn fails part way
+        trace = start_trace(name)
+        try:
+            run_turn(variant, prompt, api_key, client, use_cache, prefetcher, cascade)
+        finally:
+            end_trace(trace)
+            st.session_state.last_trace = trace.as_dict()
+    if prefetcher is not None:
+        render_quick_replies(prefetcher)
+
+    # Live latency, cache and token stats for this app
+    render_stats_panel(name, st.session_state)
+
+
+# Function to answer one message: validation, the local stages in order, then upstream
+def run_turn(variant, prompt, api_key, client, use_cache, prefetcher, cascade):
+    upstream = variant["upstream"]
+    if variant["validate"]:
+        validation_error = validate(Turn(prompt))
+        if validation_error:
+            reply(validation_error)
+            return
+
+    # Image questions start their image right away so it is generated alongside the
+    # text answer, which renders above it; each fills its own slot when ready
+    image_call = image_cache_key = None
+    text_area = st.container()
+    if variant.get("images"):
+        image_area = st.empty()
+        image_call, image_cache_key = start_image(prompt, upstream["model"], api_key, client, use_cache,
+                                                  image_renderer(image_area))
+        if image_call:
+            image_area.write("Generating relevant medical image...")
+        elif image_cache_key:
+            with image_area.container():
+                show_cached_image(image_cache_key)
+
+    with text_area:
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        turn = Turn(prompt, st.session_state.get("user_symptoms"), prefetcher)
+        for stage in variant["stages"]:
+            text = stage(turn)
+            if text:
+                reply(text)
+                if prefetcher is not None and turn.topic:
+                    prefetcher.schedule(turn.topic, text, st.session_state.user_symptoms)
+                break
+        else:
+            if upstream["provider"] == "gemini":
+                ask_gemini(prompt, upstream, api_key, client, use_cache, variant.get("guardrails"), image_call,
+                           cascade)
+            else:
+                ask_openai(prompt, upstream, api_key, client, use_cache)
+
+    if image_call:
+        # Wait for the image (up to its own timeout) if it is still running
+        image_call.deliver()
+    if image_cache_key:
+        from images import image_cache, image_message
+
+        # Later reruns draw the image from the history as a thumbnail
+        if image_cache_key in image_cache:
+            st.session_state.messages.append({"role": "assistant", "content": image_message(image_cache_key, IMAGE_CAPTION)})
@@ -0,0 +1,323 @@
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+
+from telemetry import note, traced
+
+# NumPy is optional; without it the apps simply skip the FAQ lookup
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Vetted question/answer pairs shipped with the repo; point FAQ_CORPUS at a larger one
+FAQ_CORPUS = os.environ.get("FAQ_CORPUS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "health_faq.jsonl"))
+# Where the built index is kept (rebuilt when the corpus changes)
+FAQ_INDEX_DIR = os.environ.get("FAQ_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "faq_index"))
+
+DIMENSIONS = 256          # hashed feature dimensions per vector
+ANSWER_THRESHOLD = 0.75   # cosine similarity needed to answer without calling upstream
+CONTEXT_THRESHOLD = 0.4   # similarity needed for an answer to be sent upstream as grounding
+IVF_MIN_ROWS = 20000      # below this a brute-force scan is faster than probing lists
+NPROBE = 16               # IVF lists scanned per query
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE = 20000     # rows used to train the IVF centroids
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "an and are can do does for from have how in is it me my of on or should the to what when "
+    "which who why will with you your".split()
+)
+
+
+# Function to split text into the features that get hashed: stemmed words and word pairs
+def features(text):
+    words = [w[:-1] if len(w) > 3 and w.endswith("s") else w
+             for w in _TOKEN.findall(text.lower()) if len(w) > 1 and w not in _STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+# Turns text into fixed-size vectors without a model: each feature is hashed to a
+# signed bucket (stable across processes, unlike hash()), weighted by the bucket's IDF
+# from the corpus, and the vector is L2-normalised so dot products are cosines.
+class HashingEmbedder:
+    def __init__(self, dimensions=DIMENSIONS, idf=None):
+        self.dimensions = dimensions
+        self.idf = idf
+        self.buckets = {}
+
+    def _bucket(self, feature):
+        bucket = self.buckets.get(feature)
+        if bucket is None:
+            h = zlib.crc32(feature.encode("utf-8"))
+            bucket = self.buckets[feature] = (h % self.dimensions, 1.0 if h & 0x80000000 else -1.0)
+            if len(self.buckets) > 500000:
+                self.buckets.clear()
+        return bucket
+
+    # Function to embed many texts into one float32 matrix
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in features(text):
+                bucket, sign = self._bucket(feature)
+                matrix[row, bucket] += sign
+        if self.idf is not None:
+            matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    # Function to compute per-bucket IDF weights from a corpus
+    def fit(self, texts, batch=10000):
+        document_frequency = np.zeros(self.dimensions, dtype=np.float64)
+        self.idf = None
+        for start in range(0, len(texts), batch):
+            document_frequency += (self.embed(texts[start:start + batch]) != 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self
+
+
+# Function to train spherical k-means centroids for the IVF lists
+def train_centroids(vectors, lists, iterations=KMEANS_ITERATIONS, sample=KMEANS_SAMPLE, seed=0):
+    rng = np.random.default_rng(seed)
+    training = vectors[rng.choice(len(vectors), min(sample, len(vectors)), replace=False)]
+    centroids = training[rng.choice(len(training), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(training @ centroids.T, axis=1)
+        for list_id in range(lists):
+            members = training[assignment == list_id]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[list_id] = centroid / (np.linalg.norm(centroid) or 1.0)
+    return centroids
+
+
+# Function to assign every row to its nearest centroid, in chunks to bound memory
+def assign_lists(vectors, centroids, chunk=20000):
+    return np.concatenate([
+        np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), chunk)
+    ])
+
+
+# Nearest-neighbour index over vetted FAQ answers. Every phrasing of a question is one
+# row pointing at its answer. All arrays live in .npy files opened with mmap_mode="r",
+# so opening the index is instant and processes share the pages. Large indexes are
+# IVF-partitioned: rows are stored grouped by their nearest centroid and a query scans
+# only the `nprobe` closest groups.
+class FAQIndex:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(directory, name), mmap_mode="r")
+
+        self.vectors = load("vectors.npy")
+        self.rows = load("rows.npy")
+        self.answer_offsets = load("answer_offsets.npy")
+        self.answers = np.memmap(os.path.join(directory, "answers.bin"), dtype=np.uint8, mode="r")
+        self.embedder = HashingEmbedder(self.meta["dimensions"], np.array(load("idf.npy")))
+        self.centroids = load("centroids.npy") if self.meta["lists"] else None
+        self.list_offsets = load("list_offsets.npy") if self.meta["lists"] else None
+
+    # Function to build an index from FAQ entries ({"questions": [...], "answer": ...})
+    # and write it to `directory`. It is written to a temporary directory beside it and
+    # moved into place once complete, so readers never see a partial index.
+    @classmethod
+    def build(cls, entries, directory, dimensions=DIMENSIONS, lists=None, source=None):
+        questions, rows, answers = [], [], []
+        for entry in entries:
+            for question in entry["questions"]:
+                questions.append(question)
+                rows.append(len(answers))
+            answers.append(entry["answer"].encode("utf-8"))
+
+        embedder = HashingEmbedder(dimensions).fit(questions)
+        vectors = embedder.embed(questions)
+        rows = np.array(rows, dtype=np.int32)
+        if lists is None:
+            lists = int(4 * math.sqrt(len(vectors))) if len(vectors) >= IVF_MIN_ROWS else 0
+
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".faq_index-", dir=parent)
+        try:
+            if lists:
+                centroids = train_centroids(vectors, lists)
+                assignment = assign_lists(vectors, centroids)
+                order = np.argsort(assignment, kind="stable")
+                vectors, rows = vectors[order], rows[order]
+                offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=lists))])
+                np.save(os.path.join(staging, "centroids.npy"), centroids)
+                np.save(os.path.join(staging, "list_offsets.npy"), offsets.astype(np.int64))
+
+            np.save(os.path.join(staging, "vectors.npy"), vectors)
+            np.save(os.path.join(staging, "rows.npy"), rows)
+            np.save(os.path.join(staging, "idf.npy"), embedder.idf)
+            np.save(os.path.join(staging, "answer_offsets.npy"),
+                    np.concatenate([[0], np.cumsum([len(a) for a in answers])]).astype(np.int64))
+            with open(os.path.join(staging, "answers.bin"), "wb") as f:
+                f.write(b"".join(answers))
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump({"dimensions": dimensions, "rows": len(vectors), "answers": len(answers),
+                           "lists": lists, "source": source, "built": time.time()}, f)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        _publish(staging, directory)
+        return cls(directory)
+
+    def answer_text(self, answer_id):
+        start, stop = self.answer_offsets[answer_id], self.answer_offsets[answer_id + 1]
+        return self.answers[start:stop].tobytes().decode("utf-8")
+
+    # Function to find the best matching answers; returns [(score, answer_id)] with one
+    # entry per answer, best first. `exact` scans every row even on an IVF index.
+    def search(self, text, k=3, nprobe=NPROBE, exact=False):
+        query = self.embedder.embed([text])[0]
+        if not query.any():
+            return []
+        if self.centroids is None or exact:
+            candidates = None
+            scores = self.vectors @ query
+        else:
+            probe = np.argpartition(self.centroids @ query, -nprobe)[-nprobe:] if nprobe < len(self.centroids) \
+                else np.arange(len(self.centroids))
+            candidates = np.concatenate([
+                np.arange(self.list_offsets[p], self.list_offsets[p + 1]) for p in probe
+            ])
+            scores = self.vectors[candidates] @ query
+
+        # Several phrasings can point at one answer; over-fetch, then keep the best of each
+        fetch = min(len(scores), k * 4)
+        if not fetch:
+            return []
+        top = np.argpartition(scores, -fetch)[-fetch:]
+        top = top[np.argsort(scores[top])[::-1]]
+        results, seen = [], set()
+        for position in top:
+            row = position if candidates is None else candidates[position]
+            answer_id = int(self.rows[row])
+            if answer_id not in seen and scores[position] > 0:
+                seen.add(answer_id)
+                results.append((float(scores[position]), answer_id))
+                if len(results) == k:
+                    break
+        return results
+
+    # Function to return the vetted answer when the best match is close enough
+    def answer(self, text, threshold=ANSWER_THRESHOLD):
+        results = self.search(text, k=1)
+        if results and results[0][0] >= threshold:
+            return self.answer_text(results[0][1])
+        return None
+
+    # Function to return related vetted answers to send upstream as grounding
+    def passages(self, text, k=3, threshold=CONTEXT_THRESHOLD):
+        return [self.answer_text(answer_id) for score, answer_id in self.search(text, k) if score >= threshold]
+
+
+# Function to move a built index into place with renames. An index already there is
+# moved aside first and deleted; readers that have it open keep its mapped files.
+def _publish(staging, directory):
+    aside = f"{staging}.old"
+    if os.path.exists(directory):
+        os.replace(directory, aside)
+    try:
+        os.replace(staging, directory)
+    except OSError:
+        # Another process put its build in place first; use that one
+        shutil.rmtree(staging, ignore_errors=True)
+    shutil.rmtree(aside, ignore_errors=True)
+
+
+# Function to read FAQ entries from a JSONL file
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_index = None
+_index_lock = threading.Lock()
+_index_failed = False
+
+
+# Function to get the process-wide FAQ index, building it from the corpus the first
+# time (or when the corpus changed). Returns None when NumPy or the corpus is missing.
+# The apps, chat_api.py and batch_eval.py call it at startup, and `python faq_index.py`
+# builds it ahead of time, so no request waits for a build.
+def get_index(corpus=FAQ_CORPUS, directory=FAQ_INDEX_DIR):
+    global _index, _index_failed
+    if _index is not None or _index_failed:
+        return _index
+    with _index_lock:
+        if _index is None and not _index_failed:
+            if np is None or not os.path.exists(corpus):
+                _index_failed = True
+                return None
+            stat = os.stat(corpus)
+            source = f"{os.path.abspath(corpus)}:{stat.st_size}:{stat.st_mtime_ns}"
+            try:
+                index = FAQIndex(directory)
+                if index.meta.get("source") != source:
+                    index = None
+            except (OSError, ValueError, KeyError):
+                index = None
+            _index = index or FAQIndex.build(load_corpus(corpus), directory, source=source)
+    return _index
+
+
+# Function to answer a question from the vetted FAQ, or None to go on as before
+@traced("faq")
+def faq_answer(question):
+    index = get_index()
+    answer = index.answer(question) if index is not None else None
+    if answer:
+        note("faq_hits")
+    return answer
+
+
+# Function to build Gemini text parts carrying related vetted answers (empty if none)
+@traced("grounding")
+def grounding_parts(question):
+    index = get_index()
+    passages = index.passages(question) if index is not None else []
+    if not passages:
+        return []
+    return [{"text": "Vetted reference information:\n" + "\n".join(f"- {p}" for p in passages)}]
+
+
+# Function to build a system message carrying related vetted answers, or None
+def grounding_message(question):
+    parts = grounding_parts(question)
+    return {"role": "system", "content": parts[0]["text"]} if parts else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the FAQ retrieval index, or check it is up to date")
+    parser.add_argument("--corpus", default=FAQ_CORPUS, help="JSONL file of vetted FAQ entries")
+    parser.add_argument("--directory", default=FAQ_INDEX_DIR, help="where the index is kept")
+    args = parser.parse_args()
+
+    if np is None:
+        raise SystemExit("the FAQ index needs NumPy (pip install numpy)")
+    start = time.perf_counter()
+    index = get_index(args.corpus, args.directory)
+    if index is None:
+        raise SystemExit(f"no FAQ corpus at {args.corpus}")
+    print(f"{index.directory}: {index.meta['rows']} questions, {index.meta['answers']} answers "
+          f"({time.perf_counter() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
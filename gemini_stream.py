@@ -0,0 +1,200 @@
+import json
+import os
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from resilience import CircuitOpenError, QuotaExceededError, call_with_retry
+from telemetry import StreamTimer
+
+# Base URL shared by every Gemini model endpoint. Set GEMINI_BASE_URL to point the apps
+# at another server, e.g. the local stand-in in benchmarks/mock_llm.py.
+GEMINI_BASE_URL = os.environ.get(
+    "GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/models"
+)
+
+
+# Raised when the Gemini API rejects a request before any text is streamed
+class GeminiAPIError(Exception):
+    def __init__(self, status_code, text):
+        super().__init__(f"{status_code} - {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+# Function to build the SSE streaming endpoint for a model
+def stream_url(model, api_key, base_url=GEMINI_BASE_URL):
+    return f"{base_url}/{model}:streamGenerateContent?alt=sse&key={api_key}"
+
+
+# Function to build the non-streaming endpoint for a model
+def generate_url(model, api_key, base_url=GEMINI_BASE_URL):
+    return f"{base_url}/{model}:generateContent?key={api_key}"
+
+
+# Function to get the API key an endpoint URL carries, for per-key quotas
+def url_api_key(url):
+    return parse_qs(urlsplit(url).query).get("key", [None])[0]
+
+
+# Function to pull the text out of a single Gemini response chunk
+def chunk_text(chunk):
+    try:
+        parts = chunk["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+    return "".join(part.get("text", "") for part in parts if isinstance(part, dict))
+
+
+# Function to decode the data lines of one SSE event, skipping malformed payloads
+def _decode_event(data_lines):
+    data = "\n".join(data_lines).strip()
+    if not data or data == "[DONE]":
+        return
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        return
+    # Gemini sends a list when the stream is not in SSE mode; accept both shapes
+    if isinstance(chunk, list):
+        for item in chunk:
+            if isinstance(item, dict):
+                yield item
+    elif isinstance(chunk, dict):
+        yield chunk
+
+
+# Incremental SSE parser: feed it one line at a time and get back the JSON chunks of
+# every event that line completed. Lines may be bytes or str; events end on a blank
+# line, and flush() returns a trailing event that never got its blank line.
+class SSEDecoder:
+    def __init__(self):
+        self.data_lines = []
+
+    def feed(self, raw):
+        line = raw.decode("utf-8", errors="replace") if isinstance(raw, bytes) else raw
+        line = line.rstrip("\r")
+        if not line:
+            return self.flush()
+        if line.startswith(":"):
+            return []
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            self.data_lines.append(value)
+        return []
+
+    def flush(self):
+        if not self.data_lines:
+            return []
+        chunks = list(_decode_event(self.data_lines))
+        self.data_lines = []
+        return chunks
+
+
+# Function to turn raw SSE lines into parsed JSON chunks
+def iter_sse_chunks(lines):
+    decoder = SSEDecoder()
+    for raw in lines:
+        yield from decoder.feed(raw)
+    yield from decoder.flush()
+
+
+# Iterable over the text of a streaming Gemini response.
+# Pass it to `st.write_stream`; afterwards `text` holds the assembled reply,
+# `finish_reason` why Gemini stopped (e.g. "STOP", "MAX_TOKENS") and `error` is set if
+# the stream broke off or Gemini reported an error mid-stream.
+class GeminiStream:
+    def __init__(self, response):
+        self.response = response
+        self.parts = []
+        self.error = None
+        self.usage = None
+        self.finish_reason = None
+        self.timer = StreamTimer()
+
+    def __iter__(self):
+        try:
+            for chunks in self._decoded():
+                for chunk in chunks:
+                    if "error" in chunk:
+                        error = chunk["error"]
+                        self.error = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+                        return
+                    self.usage = chunk.get("usageMetadata", self.usage)
+                    candidates = chunk.get("candidates") or [{}]
+                    self.finish_reason = candidates[0].get("finishReason", self.finish_reason)
+                    text = chunk_text(chunk)
+                    if text:
+                        self.timer.chunk()
+                        self.parts.append(text)
+                        yield text
+        except requests.RequestException as e:
+            self.error = str(e)
+        finally:
+            self.response.close()
+            self.timer.finish(self.text, self.usage, self.error)
+
+    # Function to decode the response line by line, timing the decoding apart from the
+    # wait for the network
+    def _decoded(self):
+        decoder = SSEDecoder()
+        for raw in self.response.iter_lines():
+            started = time.perf_counter()
+            chunks = decoder.feed(raw)
+            self.timer.parse += time.perf_counter() - started
+            if chunks:
+                yield chunks
+        yield decoder.flush()
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    # Abort the underlying HTTP response (e.g. when a hedged request loses the race)
+    def close(self):
+        self.response.close()
+
+
+# Function to POST to Gemini with retries on 429/5xx and connect errors, sharing a
+# circuit breaker per endpoint (the URL without its query string, so no API key)
+def _post(url, payload, session, timeout, stream=False):
+    # Bodies built by chat_messages.gemini_body arrive already encoded
+    body = payload if isinstance(payload, bytes) else json.dumps(payload)
+    try:
+        return call_with_retry(
+            url.split("?", 1)[0],
+            lambda: session.post(
+                url,
+                headers={"Content-Type": "application/json"},
+                data=body,
+                stream=stream,
+                timeout=timeout,
+            ),
+            api_key=url_api_key(url),
+        )
+    except QuotaExceededError as e:
+        raise GeminiAPIError(429, str(e))
+    except CircuitOpenError as e:
+        raise GeminiAPIError(503, str(e))
+
+
+# Function to start a streaming Gemini request.
+# The request is sent eagerly so HTTP errors surface before anything is rendered.
+def stream_gemini(url, payload, session=requests, timeout=60):
+    response = _post(url, payload, session, timeout, stream=True)
+    if response.status_code != 200:
+        text = response.text
+        response.close()
+        raise GeminiAPIError(response.status_code, text)
+    return GeminiStream(response)
+
+
+# Function to send a non-streaming Gemini request and return the parsed JSON body
+def generate_content(url, payload, session=requests, timeout=60):
+    response = _post(url, payload, session, timeout)
+    if response.status_code != 200:
+        raise GeminiAPIError(response.status_code, response.text)
+    return response.json()
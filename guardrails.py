@@ -0,0 +1,287 @@
+import asyncio
+import contextvars
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from intent_router import validate_user_input
+from telemetry import metrics, note, record_span
+
+# Pipeline defaults
+CHECK_TIMEOUT = 2.0      # seconds to wait for every check; a check still running then blocks the message
+CHECK_WORKERS = 8        # threads running parallel checks for the Streamlit apps
+
+# Replies shown instead of the model's when a check cannot be completed
+CHECK_FAILED = "Sorry, I couldn't check your message just now. Please try again."
+CHECK_TIMED_OUT = "Sorry, checking your message took too long. Please try again."
+
+# Personal details that should not be sent to the model provider
+PII_PATTERNS = {
+    "email addresses": re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b"),
+    "phone numbers": re.compile(r"(?<!\w)(?:\+\d{1,3}[ .-]?)?(?:\(\d{3}\)|\d{3})[ .-]?\d{3}[ .-]?\d{4}(?!\w)"),
+    "social security numbers": re.compile(r"\b\d{3}-\d{2}-\d{4}\b"),
+    "card numbers": re.compile(r"\b(?:\d[ -]?){13,19}\b"),
+}
+PII_REPLY = ("For your privacy, please don't share {kinds} here. "
+             "Could you ask your question again without them?")
+
+# Messages that need a person rather than a model: self-harm and overdose intent
+CRISIS_PATTERN = re.compile(
+    r"\b(?:kill(?:ing)? myself|suicid\w*|end(?:ing)? my life|self[- ]harm\w*|hurt(?:ing)? myself|"
+    r"want to die|overdos(?:e|ing) on purpose)\b",
+    re.IGNORECASE,
+)
+CRISIS_REPLY = ("It sounds like you may be going through something really difficult. If you are in danger "
+                "or thinking about harming yourself, please call your local emergency number now, or reach a "
+                "crisis line (in the US, call or text 988). You don't have to face this alone.")
+
+
+# Function to check a message for personal details (see PII_PATTERNS)
+def detect_pii(user_input):
+    kinds = [kind for kind, pattern in PII_PATTERNS.items()
+             if kind != "card numbers" and pattern.search(user_input)]
+    if any(_luhn_valid(match.group()) for match in PII_PATTERNS["card numbers"].finditer(user_input)):
+        kinds.append("card numbers")
+    if kinds:
+        return PII_REPLY.format(kinds=" or ".join(kinds))
+    return None
+
+
+# Function to check a card-number candidate's Luhn checksum, so long numbers like
+# lab values or dates are not mistaken for cards
+def _luhn_valid(candidate):
+    digits = [int(c) for c in candidate if c.isdigit()]
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        if i % 2:
+            digit = digit * 2 - 9 if digit > 4 else digit * 2
+        total += digit
+    return len(digits) >= 13 and total % 10 == 0
+
+
+# Function to flag messages about self-harm, which get crisis resources instead of a
+# model reply
+def check_medical_safety(user_input):
+    if CRISIS_PATTERN.search(user_input):
+        return CRISIS_REPLY
+    return None
+
+
+# The checks every upstream-bound message goes through, in order. A check takes the
+# message and returns None to let it through or a reply to show instead. Inline checks
+# run before the upstream call is made: use them for checks cheaper than a wasted call,
+# and for any check whose point is that the message must not leave the process (PII).
+# The others run in parallel with a speculative upstream call, whose output is held
+# back until they all pass.
+DEFAULT_CHECKS = [
+    {"name": "input", "check": validate_user_input, "parallel": False},
+    {"name": "pii", "check": detect_pii, "parallel": False},
+    {"name": "medical_safety", "check": check_medical_safety, "parallel": True},
+]
+
+
+# Per-check counts across every pipeline in the process, exported to /metrics
+class GuardrailStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checks = {}
+        self.speculative_calls = 0
+        self.cancelled_calls = 0
+
+    # Function to count one check's outcome: passed, blocked, errors or timeouts. A check
+    # that timed out still finishes later and is counted as a run then.
+    def record(self, name, outcome):
+        with self.lock:
+            counts = self.checks.setdefault(name, {"runs": 0, "blocked": 0, "errors": 0, "timeouts": 0})
+            if outcome != "timeouts":
+                counts["runs"] += 1
+            if outcome != "passed":
+                counts[outcome] += 1
+
+    def speculated(self, cancelled):
+        with self.lock:
+            self.speculative_calls += 1
+            self.cancelled_calls += cancelled
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "speculative_calls": self.speculative_calls,
+                "cancelled_calls": self.cancelled_calls,
+                "checks": [{"check": name, **counts} for name, counts in sorted(self.checks.items())],
+            }
+
+
+guardrail_stats = GuardrailStats()
+metrics.register("guardrails", guardrail_stats.snapshot)
+
+_executor = ThreadPoolExecutor(max_workers=CHECK_WORKERS, thread_name_prefix="guardrail")
+
+
+# Runs a message's guardrails and its upstream call together. `run` (threads, for the
+# Streamlit apps) and `arun` (asyncio, for chat_api.py) return (refusal, stream):
+# the reply of the first check that blocked the message and no stream, or no refusal
+# and whatever `open_stream` returned (the opened stream, or a cached reply). A blocked
+# message's speculative call is closed unread.
+class GuardrailPipeline:
+    def __init__(self, checks=None, timeout=CHECK_TIMEOUT):
+        self.checks = list(DEFAULT_CHECKS if checks is None else checks)
+        self.timeout = timeout
+
+    # Function to add a check, e.g. a moderation API call, to this pipeline
+    def add(self, name, check, parallel=True):
+        self.checks.append({"name": name, "check": check, "parallel": parallel})
+
+    # Function to list the checks by name, e.g. to keep replies cached behind this
+    # pipeline apart from unchecked ones
+    def names(self):
+        return [guard["name"] for guard in self.checks]
+
+    # Function to run one check, timing it as its own stage. A check that raises blocks
+    # the message: a guardrail that cannot answer is not a pass.
+    def _check(self, guard, user_input):
+        start = time.perf_counter()
+        try:
+            refusal = guard["check"](user_input)
+        except Exception:
+            refusal, outcome = CHECK_FAILED, "errors"
+        else:
+            outcome = "blocked" if refusal else "passed"
+        record_span(f"guardrail_{guard['name']}", start, time.perf_counter() - start)
+        guardrail_stats.record(guard["name"], outcome)
+        if refusal:
+            note("guardrail_blocks")
+        return refusal
+
+    def _inline(self, user_input):
+        for guard in self.checks:
+            if not guard["parallel"]:
+                refusal = self._check(guard, user_input)
+                if refusal:
+                    return refusal
+        return None
+
+    # Function to run the checks and open the upstream stream with `open_stream()`.
+    # With speculate=False the call is only made once every check has passed.
+    def run(self, user_input, open_stream, speculate=True):
+        refusal = self._inline(user_input)
+        if refusal:
+            return refusal, None
+        parallel = [guard for guard in self.checks if guard["parallel"]]
+        if not parallel:
+            return None, open_stream()
+
+        pending = {
+            _executor.submit(contextvars.copy_context().run, self._check, guard, user_input): guard
+            for guard in parallel
+        }
+        if not speculate:
+            refusal = self._verdict(pending)
+            return (refusal, None) if refusal else (None, open_stream())
+
+        upstream = _start(open_stream)
+        refusal = self._verdict(pending)
+        guardrail_stats.speculated(bool(refusal))
+        if refusal:
+            note("guardrail_cancelled")
+            upstream.add_done_callback(_discard)
+            return refusal, None
+        return None, upstream.result()
+
+    # Function to wait for the parallel checks, returning the first refusal as soon as it
+    # arrives without waiting for the rest
+    def _verdict(self, pending):
+        deadline = time.monotonic() + self.timeout
+        while pending:
+            done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                for guard in pending.values():
+                    guardrail_stats.record(guard["name"], "timeouts")
+                note("guardrail_blocks")
+                return CHECK_TIMED_OUT
+            for future in done:
+                pending.pop(future)
+                refusal = future.result()
+                if refusal:
+                    return refusal
+        return None
+
+    # Function to do the same as `run` on the event loop; `open_stream` is a coroutine
+    # function. The checks run in worker threads, so blocking checks are fine.
+    async def arun(self, user_input, open_stream):
+        refusal = self._inline(user_input)
+        if refusal:
+            return refusal, None
+        parallel = [guard for guard in self.checks if guard["parallel"]]
+        if not parallel:
+            return None, await open_stream()
+
+        pending = {
+            asyncio.ensure_future(asyncio.to_thread(self._check, guard, user_input)): guard
+            for guard in parallel
+        }
+        upstream = asyncio.ensure_future(open_stream())
+        try:
+            refusal = await self._averdict(pending)
+        except BaseException:
+            upstream.cancel()
+            raise
+        guardrail_stats.speculated(bool(refusal))
+        if refusal:
+            note("guardrail_cancelled")
+            upstream.cancel()
+            upstream.add_done_callback(_adiscard)
+            return refusal, None
+        return None, await upstream
+
+    async def _averdict(self, pending):
+        deadline = time.monotonic() + self.timeout
+        while pending:
+            done, _ = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                for guard in pending.values():
+                    guardrail_stats.record(guard["name"], "timeouts")
+                note("guardrail_blocks")
+                return CHECK_TIMED_OUT
+            for task in done:
+                pending.pop(task)
+                refusal = task.result()
+                if refusal:
+                    return refusal
+        return None
+
+
+# Function to call `fn` on its own thread (in a copy of the caller's context, so its
+# spans join the turn's trace) and return a Future for the result
+def _start(fn):
+    future = Future()
+
+    def target():
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=contextvars.copy_context().run, args=(target,), name="speculative", daemon=True).start()
+    return future
+
+
+# Function to close a speculative stream whose message was blocked, once it has opened
+def _discard(future):
+    if future.exception() is None:
+        close = getattr(future.result(), "close", None)
+        if close is not None:
+            close()
+
+
+def _adiscard(task):
+    if not task.cancelled() and task.exception() is None:
+        aclose = getattr(task.result(), "aclose", None)
+        if aclose is not None:
+            asyncio.ensure_future(aclose())
+
+
+# Pipeline with the default checks, shared by the apps
+guardrails = GuardrailPipeline()
@@ -0,0 +1,19 @@
+import argparse
+import os
+
+from engine import run_app
+from pipeline import VARIANTS, resolve_variant
+
+# Launcher for any app variant, chosen at launch instead of by script name:
+#
+#   streamlit run healthbot.py -- --variant geminiAppV4
+#   HEALTHBOT_VARIANT=geminiAppV6 streamlit run healthbot.py
+APPS = [name for name, variant in VARIANTS.items() if variant["page"]]
+
+parser = argparse.ArgumentParser(description="Run one of the chatbot app variants")
+parser.add_argument("--variant", default=os.environ.get("HEALTHBOT_VARIANT", "streamlit_app.py"),
+                    help=f"one of: {', '.join(APPS)}")
+variant = resolve_variant(parser.parse_known_args()[0].variant)
+if variant not in APPS:
+    raise SystemExit(f"{variant} is not a Streamlit app; choose from {', '.join(APPS)}")
+run_app(variant)
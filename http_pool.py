@@ -0,0 +1,246 @@
+import hashlib
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager
+
+from telemetry import metrics
+
+# httpx (used by the OpenAI SDK, shipped as httpx2 with newer SDKs) speaks HTTP/2 when
+# the optional `h2` package is installed
+try:
+    import httpx2 as httpx
+except ImportError:
+    try:
+        import httpx
+    except ImportError:
+        httpx = None
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = httpx is not None
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Pool sizing shared by every provider
+POOL_CONNECTIONS = 4      # distinct hosts kept per client
+POOL_MAXSIZE = 16         # keep-alive connections kept per host
+KEEPALIVE_EXPIRY = 60     # seconds an idle socket stays open (httpx)
+IDLE_TIMEOUT = 300        # seconds before an unused client is closed and evicted
+MAX_CLIENTS = 64          # hard cap on cached clients (one per provider + API key)
+
+
+# Counters for one pooled client; totals roll up into the process-wide stats
+class PoolStats:
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.last_request = 0.0
+
+    def record_request(self):
+        with self.lock:
+            self.requests += 1
+            self.last_request = time.monotonic()
+        if self.parent:
+            self.parent.record_request()
+
+    def record_connection(self):
+        with self.lock:
+            self.connections += 1
+        if self.parent:
+            self.parent.record_connection()
+
+    # Share of requests that went out on an already open connection
+    @property
+    def reuse_rate(self):
+        if not self.requests:
+            return 0.0
+        return max(0.0, 1 - self.connections / self.requests)
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "reuse_rate": round(self.reuse_rate, 4),
+        }
+
+    # Trace hook for httpcore; a completed TCP connect means a fresh connection
+    def trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            self.record_connection()
+
+
+# urllib3 pool manager that counts every new connection it opens
+class _CountingPoolManager(PoolManager):
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def _new_pool(self, *args, **kwargs):
+        pool = super()._new_pool(*args, **kwargs)
+        new_conn = pool._new_conn
+        stats = self.stats
+
+        def counting_new_conn():
+            stats.record_connection()
+            return new_conn()
+
+        pool._new_conn = counting_new_conn
+        return pool
+
+
+# requests adapter with bounded pools and request/connection counters
+class _CountingAdapter(HTTPAdapter):
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = _CountingPoolManager(
+            self.stats, num_pools=connections, maxsize=maxsize, block=block, **pool_kwargs
+        )
+
+    def send(self, request, **kwargs):
+        self.stats.record_request()
+        return super().send(request, **kwargs)
+
+
+# A cached client together with its bookkeeping
+class _PooledClient:
+    def __init__(self, provider, key_id, client, stats):
+        self.provider = provider
+        self.key_id = key_id
+        self.client = client
+        self.stats = stats
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+    # Seconds since the client was last handed out or sent a request; callers may keep
+    # a client and use it without fetching it again
+    def idle_for(self, now):
+        return now - max(self.last_used, self.stats.last_request)
+
+    def close(self):
+        # requests.Session and OpenAI both expose close()
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+_lock = threading.Lock()
+_clients = {}
+_totals = PoolStats()
+_evicted = 0
+
+
+# Function to derive a stable, non-reversible id for an API key
+def _key_id(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+# Function to close clients that have been idle too long, and to make room under the
+# cap. Only idle clients are closed: a client still in use when the cap is reached is
+# dropped from the cache but left open for whoever holds it; its sockets close when it
+# is garbage collected. Must be called with `_lock` held.
+def _evict_idle(now):
+    global _evicted
+    for key, entry in list(_clients.items()):
+        if entry.idle_for(now) > IDLE_TIMEOUT:
+            del _clients[key]
+            entry.close()
+            _evicted += 1
+    while len(_clients) >= MAX_CLIENTS:
+        key = max(_clients, key=lambda k: _clients[k].idle_for(now))
+        del _clients[key]
+        _evicted += 1
+
+
+# Function to fetch (or build once) the pooled client for a provider and API key
+def _get_client(provider, api_key, factory):
+    key = (provider, _key_id(api_key))
+    now = time.monotonic()
+    with _lock:
+        entry = _clients.get(key)
+        if entry is None:
+            _evict_idle(now)
+            stats = PoolStats(parent=_totals)
+            entry = _PooledClient(provider, key[1], factory(stats), stats)
+            _clients[key] = entry
+        entry.last_used = now
+        return entry.client
+
+
+# Function to build a keep-alive requests session for the Gemini REST API
+def _build_session(stats):
+    session = requests.Session()
+    adapter = _CountingAdapter(stats, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Function to build an OpenAI client on a shared httpx pool (HTTP/2 if available)
+def _build_openai_client(api_key, stats):
+    from openai import DefaultHttpxClient, OpenAI
+
+    # Retries are handled by resilience.call_with_retry, not the SDK
+    if httpx is None:
+        return OpenAI(api_key=api_key, max_retries=0)
+
+    def on_request(request):
+        stats.record_request()
+        request.extensions["trace"] = stats.trace
+
+    http_client = DefaultHttpxClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=POOL_MAXSIZE,
+            max_keepalive_connections=POOL_MAXSIZE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        event_hooks={"request": [on_request]},
+    )
+    return OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+
+
+# Function to get the process-wide requests session for a provider and API key
+def get_session(provider, api_key):
+    return _get_client(provider, api_key, _build_session)
+
+
+# Function to get the process-wide OpenAI client for an API key
+def get_openai_client(api_key):
+    return _get_client("openai", api_key, lambda stats: _build_openai_client(api_key, stats))
+
+
+# Function to report connection reuse across all pooled clients
+def pool_stats():
+    with _lock:
+        clients = [
+            {"provider": entry.provider, "key_id": entry.key_id, **entry.stats.as_dict()}
+            for entry in _clients.values()
+        ]
+        return {
+            **_totals.as_dict(),
+            "clients": clients,
+            "evicted": _evicted,
+            "http2": HTTP2_AVAILABLE,
+        }
+
+
+metrics.register("pool", pool_stats)
+
+
+# Function to close every pooled client (e.g. on shutdown)
+def close_all():
+    with _lock:
+        for entry in _clients.values():
+            entry.close()
+        _clients.clear()
@@ -0,0 +1,293 @@
+import binascii
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from gemini_stream import generate_content
+from response_cache import make_key
+from telemetry import Span, metrics, note
+
+try:
+    from PIL import Image
+except ImportError:  # without Pillow, history shows the full image instead of a thumbnail
+    Image = None
+
+# On-disk image cache defaults
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", "image_cache")
+IMAGE_CACHE_BYTES = 256 * 1024 * 1024   # full images and thumbnails kept on disk
+THUMBNAIL_SIZE = (256, 256)             # bounding box of the thumbnails drawn in the history
+THUMBNAIL_QUALITY = 80                  # JPEG quality of thumbnails without transparency
+
+# A history message standing for a cached image: ![caption](image:<key>)
+_IMAGE_MESSAGE = re.compile(r"!\[([^\]]*)\]\(image:([0-9a-f]{64})\)")
+
+
+class ImageError(Exception):
+    pass
+
+
+# Function to build the cache key of a generated image from its prompt and model
+def image_key(prompt, model):
+    return make_key(prompt, model)
+
+
+# Function to get the image bytes out of a Gemini `generateContent` response. Inline
+# parts carry base64 text; binascii decodes an ASCII str in place, so the only new
+# buffer is the decoded image itself.
+def decode_image(response):
+    try:
+        parts = response["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+        raise ImageError("No image found in response.")
+    for part in parts:
+        inline = part.get("inlineData") or part.get("inline_data")
+        if not inline:
+            continue
+        mime_type = inline.get("mimeType") or inline.get("mime_type") or ""
+        if mime_type.startswith("image/"):
+            try:
+                return binascii.a2b_base64(inline["data"])
+            except (KeyError, ValueError) as e:
+                raise ImageError(f"Bad inline image data: {e}")
+    raise ImageError("No image found in response.")
+
+
+# Function to scale an image down to a thumbnail, or None when Pillow is missing, the
+# image cannot be read or the thumbnail would not be smaller
+def make_thumbnail(data, size=THUMBNAIL_SIZE):
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail(size)
+            output = io.BytesIO()
+            if image.mode in ("RGBA", "LA", "P"):
+                image.save(output, "PNG", optimize=True)
+            else:
+                image.convert("RGB").save(output, "JPEG", quality=THUMBNAIL_QUALITY)
+    except Exception:
+        return None
+    thumbnail = output.getvalue()
+    return thumbnail if len(thumbnail) < len(data) else None
+
+
+# Content-addressed image store on disk, shared by every session and process using the
+# same directory. Each image is a file named by its key, with an optional
+# "<key>.thumb" beside it. When the files grow past `max_bytes` the least recently used
+# images are deleted; reads touch the file so the order survives restarts.
+class ImageCache:
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Key -> bytes on disk (image plus thumbnail), least recently used first
+        self.entries = None
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.thumbnails_served = 0
+        self.full_loads = 0
+
+    def _path(self, key, suffix=""):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    # Function to build the index from the files on disk, oldest first
+    def _load(self):
+        if self.entries is not None:
+            return
+        found = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        continue
+                    key = name.split(".", 1)[0]
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except FileNotFoundError:
+                        continue
+                    found.append((stat.st_mtime, key, stat.st_size))
+        self.entries = OrderedDict()
+        for _, key, size in sorted(found):
+            self.entries[key] = self.entries.get(key, 0) + size
+        self.total = sum(self.entries.values())
+
+    def __contains__(self, key):
+        with self.lock:
+            self._load()
+            return key in self.entries
+
+    def _read(self, key, suffix):
+        try:
+            with open(self._path(key, suffix), "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            pass
+        return data
+
+    # Function to get an image's full bytes, or None if it is not cached (or another
+    # process evicted it)
+    def get(self, key):
+        with self.lock:
+            self._load()
+            known = key in self.entries
+        data = self._read(key, "") if known else None
+        with self.lock:
+            if data is None:
+                self.misses += 1
+                self._forget(key)
+            else:
+                self.hits += 1
+        note("image_cache_misses" if data is None else "image_cache_hits")
+        return data
+
+    # Function to get what the history draws for an image: its thumbnail, or the full
+    # image when it has none. None if the image is no longer cached.
+    def thumbnail(self, key):
+        with self.lock:
+            self._load()
+            if key not in self.entries:
+                return None
+        data = self._read(key, ".thumb")
+        if data is None:
+            data = self._read(key, "")
+        with self.lock:
+            if data is None:
+                self._forget(key)
+            else:
+                self.thumbnails_served += 1
+        return data
+
+    # Function to count a full-size load requested from the history
+    def load_full(self, key):
+        data = self.get(key)
+        if data is not None:
+            with self.lock:
+                self.full_loads += 1
+        return data
+
+    # Function to store an image (and its thumbnail) under `key`, then evict the least
+    # recently used images until the cache fits its budget
+    def put(self, key, data):
+        thumbnail = make_thumbnail(data)
+        os.makedirs(os.path.dirname(self._path(key)), exist_ok=True)
+        size = self._write(self._path(key), data)
+        if thumbnail is not None:
+            size += self._write(self._path(key, ".thumb"), thumbnail)
+        with self.lock:
+            self._load()
+            self.total += size - self.entries.pop(key, 0)
+            self.entries[key] = size
+            self.writes += 1
+            evicted = []
+            while self.total > self.max_bytes and len(self.entries) > 1:
+                old_key, old_size = self.entries.popitem(last=False)
+                self.total -= old_size
+                self.evictions += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._remove(old_key)
+        return key
+
+    # Write to a temporary file first so readers never see a partial image
+    def _write(self, path, data):
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+        return len(data)
+
+    def _remove(self, key):
+        for suffix in ("", ".thumb"):
+            try:
+                os.remove(self._path(key, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, key):
+        if self.entries is not None and key in self.entries:
+            self.total -= self.entries.pop(key)
+
+    def clear(self):
+        with self.lock:
+            self._load()
+            keys = list(self.entries)
+            self.entries.clear()
+            self.total = 0
+        for key in keys:
+            self._remove(key)
+
+    def stats(self):
+        with self.lock:
+            self._load()
+            lookups = self.hits + self.misses
+            return {
+                "images": len(self.entries),
+                "bytes": self.total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "thumbnails_served": self.thumbnails_served,
+                "full_loads": self.full_loads,
+            }
+
+
+image_cache = ImageCache()
+metrics.register("images", image_cache.stats)
+
+
+# Function to generate an image with Gemini and store it under `key`. Runs on the
+# background pool; returns the key.
+def fetch_image(url, payload, key, session, timeout=60, cache=image_cache):
+    response = generate_content(url, payload, session=session, timeout=timeout)
+    with Span("image_decode"):
+        data = decode_image(response)
+        cache.put(key, data)
+    note("images_generated")
+    return key
+
+
+# Function to build the history message that stands for a cached image
+def image_message(key, caption):
+    return f"![{caption.replace(']', '')}](image:{key})"
+
+
+# Function to draw a history message if it stands for a cached image: the thumbnail,
+# with the full-size image in an expander that only loads it when opened. Returns False
+# for ordinary messages.
+def render_image_message(text, key, cache=image_cache):
+    match = _IMAGE_MESSAGE.fullmatch(text) if isinstance(text, str) and text.startswith("![") else None
+    if match is None:
+        return False
+    caption, digest = match.groups()
+    thumbnail = cache.thumbnail(digest)
+    if thumbnail is None:
+        st.caption(f"{caption} (image no longer cached)")
+        return True
+    st.image(thumbnail, caption=caption)
+    # With on_change="rerun" the body only runs (and the image is only sent) while open
+    full_size = st.expander("Full size", key=key, on_change="rerun")
+    if full_size.open:
+        with full_size:
+            data = cache.load_full(digest)
+            if data is None:
+                st.caption("Image no longer cached.")
+            else:
+                st.image(data)
+    return True
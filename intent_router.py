@@ -0,0 +1,283 @@
+import re
+
+from telemetry import traced
+
+# Canned replies for simple greetings (matched against the whole message)
+GREETINGS = {
+    "hi": "Hello! How can I assist you today?",
+    "hello": "Hi there! How can I help you with your healthcare query?",
+    "how are you": "I'm here to assist you! How can I help today?",
+}
+
+# Conditions with a canned follow-up question, in priority order.
+# Terms are matched case-insensitively anywhere in the message.
+CONDITIONS = [
+    {
+        "name": "insomnia",
+        "terms": ("insomniac", "insomnia"),
+        "reply": ("It seems like you're dealing with insomnia. Could you tell me more about your sleep patterns?\n"
+                  "- Do you have trouble falling asleep, staying asleep, or waking up too early?\n"
+                  "- How many hours of sleep are you getting on average per night?\n"
+                  "- Are you experiencing any stress, anxiety, or other factors that might be affecting your sleep?\n"
+                  "This information will help me understand your condition better."),
+    },
+    {
+        "name": "cough",
+        "terms": ("cough",),
+        "reply": ("I understand you're experiencing a cough. Could you please provide more details?\n"
+                  "- How long have you had the cough?\n"
+                  "- Is it dry or with mucus?\n"
+                  "- Do you have other symptoms like fever or shortness of breath?\n"
+                  "This will help narrow down potential causes."),
+    },
+    {
+        "name": "headache",
+        "terms": ("headache",),
+        "reply": ("Can you tell me more about your headache?\n"
+                  "- How long have you had the headache?\n"
+                  "- Is it throbbing, sharp, or dull?\n"
+                  "- Any other symptoms like nausea, vomiting, or dizziness?\n"
+                  "Please share as much detail as possible."),
+    },
+    {
+        "name": "upset stomach",
+        "terms": ("upset stomach",),
+        "reply": ("Sorry to hear you're feeling unwell. Could you clarify:\n"
+                  "- Are you experiencing nausea, vomiting, diarrhea, or pain?\n"
+                  "- Where is the pain located? Is it sharp or cramping?\n"
+                  "This information will help me understand better."),
+    },
+]
+
+# Conditions handled by the variants that predate the insomnia follow-up
+BASIC_CONDITIONS = [condition for condition in CONDITIONS if condition["name"] != "insomnia"]
+
+# Symptom slots to extract, per condition, in priority order. Slot terms are matched
+# case-sensitively; a slot is filled when all of its terms appear. Later rules for the
+# same slot override earlier ones. A value of DURATION takes the number of days.
+DURATION = object()
+SYMPTOM_SLOTS = {
+    "headache": [
+        {"slot": "duration", "value": DURATION, "requires": ("past", "days")},
+        {"slot": "type", "value": "dull", "requires": ("dull",)},
+        {"slot": "symptoms", "value": "vomiting", "requires": ("vomiting",)},
+    ],
+    "upset stomach": [
+        {"slot": "pain", "value": "pain", "requires": ("pain",)},
+        {"slot": "pain_type", "value": "sharp", "requires": ("sharp",)},
+        {"slot": "pain_type", "value": "cramping", "requires": ("cramping",)},
+    ],
+}
+
+# Reply for "not feeling good" messages
+GENERAL_HEALTH_REPLY = ("I'm sorry to hear you're not feeling well. Can you describe your symptoms in more detail? "
+                        "For example, are you feeling dizzy, nauseous, or experiencing pain?")
+
+# Keywords (matched case-insensitively) that send a message down the image or healthcare path
+IMAGE_KEYWORDS = ("image", "show me", "diagram", "picture")
+HEALTHCARE_KEYWORDS = ("health", "symptom", "treatment", "disease", "medicine", "pain", "diagnosis", "doctor",
+                       "doctor's advice", "sick")
+
+# Characters rejected by `validate_user_input`
+_INVALID_CHARACTERS = re.compile(r'[\<>;|&]')
+# Only start a duration at the beginning of a run of digits; otherwise a long run of
+# digits without "days" after it is rescanned from every position (quadratic time)
+_DURATION = r"(?<!\d)\d+\s*days"
+_DURATION_MATCH = re.compile(r"(?<!\d)(\d+)\s*days")
+
+
+# Function to turn a list of terms into a trie-shaped regex, so each position in the
+# message is checked in time proportional to the longest term, not the number of terms
+def _trie_pattern(terms):
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A term ends here as well, so the longer continuations are optional
+        return "(?:" + body + ")?" if "" in node else body
+
+    return emit(trie)
+
+
+# The result of routing one message
+class Route:
+    __slots__ = ("greeting", "condition", "symptom", "slots")
+
+    def __init__(self, greeting, condition, symptom, slots):
+        self.greeting = greeting
+        self.condition = condition
+        self.symptom = symptom
+        self.slots = slots
+
+    @property
+    def reply(self):
+        return self.condition["reply"] if self.condition else None
+
+
+# Routes a message against an intent table compiled once into a single matcher.
+# One scan of the lowercased message finds every condition term, slot term and
+# duration, so adding conditions does not add passes over the input.
+class IntentRouter:
+    def __init__(self, conditions=CONDITIONS, symptom_slots=SYMPTOM_SLOTS, greetings=GREETINGS):
+        self.conditions = list(conditions)
+        self.greetings = dict(greetings)
+        names = {condition["name"] for condition in self.conditions}
+        self.symptom_slots = {name: rules for name, rules in symptom_slots.items() if name in names}
+
+        self.term_conditions = {}
+        for index, condition in enumerate(self.conditions):
+            for term in condition["terms"]:
+                self.term_conditions.setdefault(term, []).append(index)
+
+        terms = set(self.term_conditions)
+        terms.update(term for rules in self.symptom_slots.values() for rule in rules for term in rule["requires"])
+        # The matcher reports the longest term at each position; also credit any
+        # shorter terms that are a prefix of it (e.g. "insomnia" inside "insomniac")
+        self.prefixes = {term: [other for other in terms if term.startswith(other)] for term in terms}
+        # Matching runs on the lowercased message; the leading character class lets the
+        # scan skip positions that cannot start any term
+        first_chars = "".join(sorted({re.escape(term[0]) for term in terms}))
+        self.matcher = re.compile(
+            "(?=[" + first_chars + r"\d])(?=(" + _trie_pattern(terms) + "|" + _DURATION + "))"
+        )
+
+    def classify(self, user_input):
+        lowered = user_input.lower()
+        greeting = self.greetings.get(lowered)
+        found = set()
+        has_duration = False
+        for token in set(self.matcher.findall(lowered)):
+            if token[0].isdigit():
+                has_duration = True
+            else:
+                found.update(self.prefixes.get(token, ()))
+
+        # Pick the highest-priority condition, and the highest-priority one with slots,
+        # from the terms that were seen rather than by walking the whole table
+        matched = sorted({index for term in found for index in self.term_conditions.get(term, ())})
+        condition = self.conditions[matched[0]] if matched else None
+        symptom = next((self.conditions[index]["name"] for index in matched
+                        if self.conditions[index]["name"] in self.symptom_slots), None)
+
+        # Slot terms are case-sensitive; confirm the few that were seen for the chosen
+        # symptom against the original text
+        slots = {}
+        if symptom is not None:
+            for rule in self.symptom_slots[symptom]:
+                if not all(term in found and term in user_input for term in rule["requires"]):
+                    continue
+                if rule["value"] is DURATION:
+                    days_match = _DURATION_MATCH.search(user_input) if has_duration else None
+                    if days_match:
+                        slots[rule["slot"]] = days_match.group(1)
+                else:
+                    slots[rule["slot"]] = rule["value"]
+        return Route(greeting, condition, symptom, slots)
+
+
+# Router built once per process from the default table
+router = IntentRouter()
+
+
+# Function to validate user input (to prevent malicious or unnecessary input)
+@traced()
+def validate_user_input(user_input):
+    if not user_input or len(user_input.strip()) == 0:
+        return "Please enter a valid query."
+    if _INVALID_CHARACTERS.search(user_input):
+        return "Your input contains invalid characters."
+    return None
+
+
+# Function to classify a message with the default router
+@traced()
+def classify(user_input):
+    return router.classify(user_input)
+
+
+# Function for short responses to greetings
+@traced()
+def get_short_response(user_input):
+    return GREETINGS.get(user_input.lower())
+
+
+# Function for handling general health-related queries (e.g., "I am not feeling good")
+@traced()
+def handle_general_health_query(user_input):
+    if "not feeling good" in user_input.lower():
+        return GENERAL_HEALTH_REPLY
+    return None
+
+
+# Function to handle specific health-related queries like cough, headache, upset stomach.
+# Plain substring checks beat the compiled router here: there are few terms and long
+# pastes are common, and `in` scans a string much faster than the regex engine.
+@traced()
+def handle_specific_health_query(user_input, conditions=BASIC_CONDITIONS):
+    lowered = user_input.lower()
+    for condition in conditions:
+        if any(term in lowered for term in condition["terms"]):
+            return condition["reply"]
+    return None
+
+
+# Function to parse detailed symptoms (duration, type, pain) for headache or upset stomach
+@traced()
+def process_symptoms(user_input, conditions=BASIC_CONDITIONS, symptom_slots=SYMPTOM_SLOTS):
+    lowered = user_input.lower()
+    for condition in conditions:
+        rules = symptom_slots.get(condition["name"])
+        if rules is None or not any(term in lowered for term in condition["terms"]):
+            continue
+        slots = {}
+        for rule in rules:
+            if not all(term in user_input for term in rule["requires"]):
+                continue
+            if rule["value"] is DURATION:
+                days_match = _DURATION_MATCH.search(user_input)
+                if days_match:
+                    slots[rule["slot"]] = days_match.group(1)
+            else:
+                slots[rule["slot"]] = rule["value"]
+        return slots
+    return {}
+
+
+# Function to check if the input is related to image generation
+@traced()
+def is_image_query(user_input):
+    lowered = user_input.lower()
+    return any(keyword in lowered for keyword in IMAGE_KEYWORDS)
+
+
+# Function to check if the query is related to healthcare
+@traced()
+def is_healthcare_query(user_input):
+    lowered = user_input.lower()
+    return any(keyword in lowered for keyword in HEALTHCARE_KEYWORDS)
+
+
+# Function to summarize extracted symptom details and ask the follow-up questions
+def describe_symptoms(symptoms_details):
+    response = "Thank you for sharing. Based on what you’ve mentioned, here’s what I understand:\n"
+    if 'duration' in symptoms_details:
+        response += f"- Headache duration: {symptoms_details['duration']} days\n"
+    if 'type' in symptoms_details:
+        response += f"- Headache type: {symptoms_details['type']}\n"
+    if 'symptoms' in symptoms_details:
+        response += f"- Other symptoms: {symptoms_details['symptoms']}\n"
+    if 'pain' in symptoms_details:
+        response += f"- Pain type: {symptoms_details.get('pain_type', 'unspecified')}\n"
+    response += "I’ll ask a few more questions to understand better:\n"
+    response += "- Have you experienced any sensitivity to light or sound?\n"
+    response += "- Are you feeling dehydrated or have you had a fever?\n"
+    response += "- Is there any pain in your neck or shoulders?"
+    return response
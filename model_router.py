@@ -0,0 +1,254 @@
+import os
+import random
+import re
+import threading
+import time
+
+from context_budget import count_tokens
+from intent_router import CONDITIONS, DURATION, HEALTHCARE_KEYWORDS, SYMPTOM_SLOTS, classify
+from providers import LatencyTracker
+from telemetry import current_trace, metrics, note
+
+# Models the cascade picks from, cheapest first. A request starts on the cheapest model
+# its score allows and moves one step up when an answer is truncated or unsure.
+CASCADE_MODELS = [model.strip() for model in os.environ.get(
+    "MODEL_CASCADE", "gemini-1.5-flash-8b,gemini-1.5-flash,gemini-1.5-pro").split(",") if model.strip()]
+LATENCY_BUDGET = float(os.environ.get("ROUTE_LATENCY_BUDGET", "2.5"))   # seconds to first token, p95
+PROBE_RATE = 0.02    # share of requests sent to a cheaper model over budget, to see if it recovered
+
+# List prices in USD per million (input, output) tokens, only used to estimate what the
+# routing saves against the variant's fixed model
+MODEL_PRICES = {
+    "gemini-1.5-flash-8b": (0.0375, 0.15),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+# Request scoring: points per feature, and the score from which each tier above the
+# cheapest is used
+LONG_PROMPT_WORDS = 40        # a described history rather than a question
+VERY_LONG_PROMPT_WORDS = 150
+DEEP_CONVERSATION_TURNS = 6
+TIER_SCORES = (2, 5)          # score >= 2 starts on the second model, >= 5 on the third
+MIN_ANSWER_WORDS = 8          # shorter answers to a long question count as unsure
+
+# Symptom words the bot already knows: condition terms, symptom slot terms and those
+# of the answers to its follow-up questions
+FOLLOW_UP_TERMS = ("light", "sound", "noise", "loud", "bright", "fever", "dehydrat", "thirst", "temperature",
+                   "neck", "shoulder", "dry", "mucus", "phlegm", "wet", "productive", "breath", "throbbing",
+                   "pulsing", "sharp", "stabbing", "nausea", "nauseous", "vomit", "dizz", "falling asleep",
+                   "fall asleep", "get to sleep", "staying asleep", "wake up", "waking", "stress", "anxi", "worr")
+SYMPTOM_TERMS = sorted(
+    {term.lower() for condition in CONDITIONS for term in condition["terms"]}
+    | {term.lower() for rules in SYMPTOM_SLOTS.values() for rule in rules if rule["value"] is not DURATION
+       for term in rule["requires"]}
+    | set(FOLLOW_UP_TERMS)
+)
+
+# Finish reasons meaning the model stopped before the answer was complete
+TRUNCATED = {"MAX_TOKENS", "length"}
+_UNSURE = re.compile(
+    r"\b(?:i'?m not (?:sure|certain)|i am not (?:sure|certain)|i don'?t know|i do not know|"
+    r"i(?:'m| am) unable to (?:answer|say|determine)|i cannot (?:answer|say|determine)|"
+    r"not enough information)\b"
+)
+
+
+# Function to score how much model a request needs, from its length, the conditions and
+# symptom details it mentions (with the intent router's keyword tables) and how deep
+# into the conversation it comes. Returns (score, features).
+def score_request(prompt, depth=0):
+    lowered = prompt.lower()
+    route = classify(prompt)
+    features = {
+        "words": len(prompt.split()),
+        "conditions": sum(1 for condition in CONDITIONS if any(term in lowered for term in condition["terms"])),
+        "symptoms": sum(1 for term in SYMPTOM_TERMS if term in lowered),
+        "symptom_details": len(route.slots),
+        "health_terms": sum(1 for keyword in HEALTHCARE_KEYWORDS if keyword in lowered),
+        "depth": depth,
+    }
+    score = 0
+    if features["words"] > LONG_PROMPT_WORDS:
+        score += 1
+    if features["words"] > VERY_LONG_PROMPT_WORDS:
+        score += 1
+    # Several symptoms or conditions, or one described in detail, need more than a
+    # canned fact
+    if features["symptoms"] >= 2:
+        score += 1
+    if features["symptoms"] >= 4:
+        score += 1
+    if features["conditions"] >= 2 or features["symptom_details"] >= 2 or features["health_terms"] >= 3:
+        score += 1
+    if depth >= DEEP_CONVERSATION_TURNS:
+        score += 1
+    return score, features
+
+
+# Function to tell why an answer should be asked of a stronger model, or None if it
+# will do
+def escalation_reason(prompt, text, finish_reason=None, error=None):
+    if error:
+        return "interrupted"
+    if finish_reason in TRUNCATED:
+        return "truncated"
+    if not text or not text.strip():
+        return "empty"
+    if _UNSURE.search(text.lower()):
+        return "unsure"
+    if len(text.split()) < MIN_ANSWER_WORDS and len(prompt.split()) > LONG_PROMPT_WORDS:
+        return "too_short"
+    return None
+
+
+# Function to estimate the USD cost of one call
+def call_cost(model, input_tokens, output_tokens):
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1e6
+
+
+# Function to count the tokens of the text in a Gemini request body
+def payload_tokens(payload):
+    return sum(count_tokens(part.get("text", ""))
+               for content in payload.get("contents", []) for part in content.get("parts", []))
+
+
+# Counters for routing decisions, escalations and their estimated cost, next to what
+# the same answers would have cost on each variant's fixed model
+class RoutingStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.turns = 0
+        self.escalations = 0
+        self.models = {}
+        self.reasons = {}
+        self.cost = 0.0
+        self.baseline_cost = 0.0
+
+    def record(self, decision):
+        with self.lock:
+            self.turns += 1
+            for attempt in decision["attempts"]:
+                counts = self.models.setdefault(attempt["model"], {"calls": 0, "answered": 0, "escalated": 0,
+                                                                    "output_tokens": 0, "cost_usd": 0.0})
+                counts["calls"] += 1
+                counts["output_tokens"] += attempt["output_tokens"]
+                counts["cost_usd"] += attempt["cost_usd"]
+                if attempt["escalated"]:
+                    counts["escalated"] += 1
+                    self.escalations += 1
+                    self.reasons[attempt["verdict"]] = self.reasons.get(attempt["verdict"], 0) + 1
+                else:
+                    counts["answered"] += 1
+            self.cost += decision["cost_usd"]
+            self.baseline_cost += decision["baseline_cost_usd"]
+
+    def snapshot(self):
+        with self.lock:
+            models = {model: dict(counts, cost_usd=round(counts["cost_usd"], 6),
+                                  first_token_p95_ms=round((latency.percentile(model, .95) or 0) * 1000, 1))
+                      for model, counts in self.models.items()}
+            return {
+                "turns": self.turns,
+                "escalations": self.escalations,
+                "escalation_rate": round(self.escalations / self.turns, 4) if self.turns else 0.0,
+                "reasons": dict(self.reasons),
+                "models": models,
+                "cost_usd": round(self.cost, 6),
+                "baseline_cost_usd": round(self.baseline_cost, 6),
+                "saved_usd": round(self.baseline_cost - self.cost, 6),
+            }
+
+
+# Rolling time to first token per model, shared across sessions
+latency = LatencyTracker()
+routing_stats = RoutingStats()
+metrics.register("routing", routing_stats.snapshot)
+
+
+# Picks a model per request from the cascade and decides when to escalate. A decision
+# is a plain dict carried through one turn: the score and features behind the choice,
+# then every attempt with its time to first token, verdict (why it should escalate, if
+# it should) and cost. Finished decisions are counted in `routing_stats` and attached to
+# the turn's trace.
+class ModelCascade:
+    def __init__(self, models=None, budget=LATENCY_BUDGET):
+        self.models = list(models or CASCADE_MODELS)
+        self.budget = budget
+
+    # Function to pick the cheapest model the request's score allows whose recent
+    # first-token p95 meets the latency budget (models without samples are assumed
+    # to); if none does, the fastest of them. Now and then the cheapest one is tried
+    # anyway, so a model that was slow for a while gets new samples.
+    def route(self, prompt, depth=0):
+        score, features = score_request(prompt, depth)
+        lowest = min(sum(1 for threshold in TIER_SCORES if score >= threshold), len(self.models) - 1)
+        candidates = self.models[lowest:]
+        p95 = {model: latency.percentile(model, .95) for model in candidates}
+        within = [model for model in candidates if p95[model] is None or p95[model] <= self.budget]
+        model = within[0] if within else min(candidates, key=lambda model: p95[model])
+        probe = model != candidates[0] and random.random() < PROBE_RATE
+        if probe:
+            model = candidates[0]
+        note("routed")
+        return {"prompt": prompt, "score": score, "features": features, "model": model, "probe": probe,
+                "attempts": [], "started": time.perf_counter()}
+
+    # Function to pass a reply stream through, noting when its first chunk arrives
+    def watch(self, decision, stream):
+        started = time.perf_counter()
+        first_token = None
+        try:
+            for chunk in stream:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                    latency.record(decision["model"], first_token)
+                yield chunk
+        finally:
+            decision["first_token"] = first_token
+
+    # Function to record the answer of the current model; returns the next model to ask
+    # if the answer needs escalating and there is a stronger one, else None
+    def attempt(self, decision, payload, text, finish_reason=None, error=None):
+        model = decision["model"]
+        reason = escalation_reason(decision["prompt"], text, finish_reason, error)
+        input_tokens = payload_tokens(payload)
+        output_tokens = count_tokens(text or "")
+        first_token = decision.pop("first_token", None)
+        decision["attempts"].append({
+            "model": model,
+            "first_token_ms": round(first_token * 1000, 1) if first_token is not None else None,
+            "finish_reason": finish_reason,
+            "verdict": reason,
+            "escalated": False,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": call_cost(model, input_tokens, output_tokens),
+        })
+        index = self.models.index(model) if model in self.models else len(self.models)
+        if reason is None or index + 1 >= len(self.models):
+            return None
+        decision["attempts"][-1]["escalated"] = True
+        note("escalations")
+        decision["model"] = self.models[index + 1]
+        return decision["model"]
+
+    # Function to close a decision: count it, price it against `baseline_model` (the
+    # model the variant would have used for every request) and log it with the trace
+    def finish(self, decision, baseline_model):
+        final = decision["attempts"][-1] if decision["attempts"] else None
+        decision["cost_usd"] = sum(attempt["cost_usd"] for attempt in decision["attempts"])
+        decision["baseline_cost_usd"] = (call_cost(baseline_model, final["input_tokens"], final["output_tokens"])
+                                         if final else 0.0)
+        decision["ms"] = round((time.perf_counter() - decision.pop("started")) * 1000, 1)
+        routing_stats.record(decision)
+        trace = current_trace()
+        if trace is not None:
+            trace.detail("route", {key: value for key, value in decision.items() if key != "prompt"})
+        return decision
+
+
+cascade = ModelCascade()
@@ -0,0 +1,66 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Worker threads shared by every session for upstream calls that run in the background
+MAX_WORKERS = 16
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="upstream")
+
+
+# Raised by `BackgroundCall.result` when the call misses its deadline or was cancelled
+class CallCancelled(Exception):
+    pass
+
+
+# An upstream call running on the shared pool, with its own deadline.
+# `on_done` is invoked exactly once, from the script thread, via `deliver`.
+class BackgroundCall:
+    def __init__(self, fn, *args, timeout=30, on_done=None, **kwargs):
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self.on_done = on_done
+        self.delivered = False
+        self.cancelled = threading.Event()
+        # Run in a copy of the caller's context so the call's spans join its trace
+        self.future = _executor.submit(contextvars.copy_context().run, self._run, fn, args, kwargs)
+
+    def _run(self, fn, args, kwargs):
+        if self.cancelled.is_set():
+            raise CallCancelled("cancelled before it started")
+        return fn(*args, **kwargs)
+
+    def done(self):
+        return self.future.done()
+
+    # Wait for the result until the call's own deadline; raises CallCancelled on timeout
+    def result(self):
+        if self.cancelled.is_set():
+            raise CallCancelled("cancelled")
+        remaining = max(0.0, self.deadline - time.monotonic())
+        try:
+            return self.future.result(timeout=remaining)
+        except FutureTimeoutError:
+            self.cancel()
+            raise CallCancelled(f"timed out after {self.timeout}s")
+
+    # A call already on the wire cannot be interrupted; its result is dropped instead
+    def cancel(self):
+        self.cancelled.set()
+        self.future.cancel()
+
+    def deliver(self):
+        if not self.delivered:
+            self.delivered = True
+            if self.on_done:
+                self.on_done(self)
+
+
+# Function to pass a stream through unchanged, delivering any background call that
+# finishes in the meantime so it can render without waiting for the stream to end
+def poll(stream, *calls):
+    for chunk in stream:
+        yield chunk
+        for call in calls:
+            if call.done():
+                call.deliver()
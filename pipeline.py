@@ -0,0 +1,260 @@
+from faq_index import faq_answer, grounding_message, grounding_parts
+from intent_router import (
+    classify, describe_symptoms, get_short_response, handle_general_health_query,
+    handle_specific_health_query, is_healthcare_query, process_symptoms, validate_user_input,
+)
+from prefetch import topic_for_reply
+from response_cache import make_key
+
+# Few-shot examples sent with every question by geminiAppV2-V4
+FEW_SHOT_EXAMPLES = [
+    {"role": "user", "content": "What are the symptoms of diabetes?"},
+    {"role": "assistant", "content": "Common symptoms include increased thirst, frequent urination, extreme hunger, and fatigue."},
+    {"role": "user", "content": "How can I reduce my cholesterol naturally?"},
+    {"role": "assistant", "content": "Reduce cholesterol by eating healthy fats, increasing fiber intake, and exercising regularly."},
+]
+
+NOT_MY_DOMAIN = "Not my domain. I'm here to assist with healthcare-related questions!"
+ASK_FOR_SYMPTOMS = "Can you tell me about your symptoms? I'll ask more specific questions to help you better."
+DIABETES_OR_CHOLESTEROL = ("I can help you with information about diabetes or cholesterol. "
+                           "Could you provide more details about your symptoms?")
+TELL_ME_MORE = "Can you tell me more about your symptoms? I'll ask more specific questions to help you better."
+
+
+# One user message on its way through a variant's pipeline. In the apps it carries the
+# session's gathered symptoms and prefetcher; stages set `topic` when their reply asks
+# follow-up questions whose answers can be prefetched.
+class Turn:
+    def __init__(self, prompt, symptoms=None, prefetcher=None):
+        self.prompt = prompt
+        self.symptoms = symptoms
+        self.prefetcher = prefetcher
+        self.topic = None
+
+    def add_symptoms(self, details):
+        if self.symptoms is not None:
+            self.symptoms.update(details)
+        self.topic = "symptoms"
+
+
+# Local routing stages: each returns a reply, or None to hand the turn on
+def validate(turn):
+    return validate_user_input(turn.prompt)
+
+
+def greeting(turn):
+    return get_short_response(turn.prompt)
+
+
+def general_health(turn):
+    return handle_general_health_query(turn.prompt)
+
+
+def healthcare_only(turn):
+    return None if is_healthcare_query(turn.prompt) else NOT_MY_DOMAIN
+
+
+def specific_condition(turn):
+    reply = handle_specific_health_query(turn.prompt)
+    if reply:
+        turn.topic = topic_for_reply(reply)
+    return reply
+
+
+def symptoms(turn):
+    details = process_symptoms(turn.prompt)
+    if not details:
+        return None
+    turn.add_symptoms(details)
+    return describe_symptoms(details)
+
+
+def routed(turn):
+    route = classify(turn.prompt)
+    if route.greeting:
+        return route.greeting
+    if route.slots:
+        turn.add_symptoms(route.slots)
+        return describe_symptoms(route.slots)
+    if route.condition:
+        turn.topic = route.condition["name"]
+    return route.reply
+
+
+def faq(turn):
+    return faq_answer(turn.prompt)
+
+
+# A quick reply to the bot's follow-up questions is answered from its prefetched answer
+# when there is one; any other message drops the predictions and goes on as usual
+def prefetched(turn):
+    return turn.prefetcher.lookup(turn.prompt) if turn.prefetcher is not None else None
+
+
+def ask_for_symptoms(turn):
+    return ASK_FOR_SYMPTOMS
+
+
+def diabetes_or_symptoms(turn):
+    lowered = turn.prompt.lower()
+    return DIABETES_OR_CHOLESTEROL if "diabetes" in lowered or "cholesterol" in lowered else TELL_ME_MORE
+
+
+# Upstream requests as each variant builds them
+def prompt_payload(prompt):
+    return {"contents": [{"parts": [{"text": prompt}]}]}
+
+
+def few_shot_payload(prompt):
+    return {"contents": [{"parts": [{"text": example["content"]} for example in FEW_SHOT_EXAMPLES]
+                          + grounding_parts(prompt) + [{"text": prompt}]}]}
+
+
+def chat_messages(prompt):
+    return [{"role": "user", "content": prompt}]
+
+
+def grounded_messages(prompt):
+    grounding = grounding_message(prompt)
+    return ([grounding] if grounding else []) + chat_messages(prompt)
+
+
+# Function to build the cache key of a variant's single-turn upstream answer: the
+# prompt, the model, the variant's fixed context and, for guarded variants, the checks
+# the answer passed, so guarded and unguarded answers are never mixed up
+def answer_key(prompt, model, upstream, checks=()):
+    context = list(upstream.get("context", ()))
+    if checks:
+        context.append({"guardrails": list(checks)})
+    return make_key(prompt, model, context)
+
+
+# Page text of the Streamlit apps
+OPENAI_CHATBOT_PAGE = {
+    "title": "💬 Chatbot",
+    "description": (
+        "This is a simple chatbot that uses OpenAI's GPT-3.5 model to generate responses. "
+        "To use this app, you need to provide an OpenAI API key, which you can get [here](https://platform.openai.com/account/api-keys). "
+        "You can also learn how to build this app step by step by [following our tutorial](https://docs.streamlit.io/develop/tutorials/llms/build-conversational-apps)."
+    ),
+    "key_label": "OpenAI API Key",
+    "key_missing": "Please add your OpenAI API key to continue.",
+    "key_icon": "🗝️",
+    "input": "What is up?",
+}
+GEMINI_CHATBOT_PAGE = {
+    "title": "💬 Chatbot",
+    "description": (
+        "This is a simple chatbot that uses Google's Gemini model to generate responses. "
+        "To use this app, you need to provide a Gemini API key, which you can get from Google Cloud."
+    ),
+    "key_label": "Gemini API Key",
+    "key_missing": "Please add your Gemini API key to continue.",
+    "key_icon": "🗝️",
+    "input": "What is up?",
+}
+HEALTHCARE_PAGE = {
+    "page_config": {"page_title": "Healthcare Assistant", "page_icon": "🏥"},
+    "title": "🏥 Healthcare Assistant Chatbot",
+    "description": (
+        "This chatbot provides healthcare-related information and can generate medical images using Google's Gemini API."
+    ),
+    "key_label": "Enter your Gemini API Key",
+    "key_missing": "Please enter your Gemini API Key to continue.",
+    "key_icon": None,
+    "input": "Ask a healthcare question...",
+}
+HEALTHCARE_TEXT_PAGE = dict(HEALTHCARE_PAGE, description="This chatbot provides healthcare-related information.")
+
+# Each variant's pipeline: whether a message must pass validate_user_input first, the
+# local stages tried in order, then the upstream call for turns no stage answered
+# (provider, model, request builder, and the few-shot context that is part of the cache
+# key). `page` and the feature flags configure its Streamlit app (see engine.py;
+# `cascade` offers routing each question across models, see model_router.py);
+# variants without a page are not Streamlit apps of the engine. Image generation in
+# V2/V3 runs beside the text answer and is not part of the pipeline.
+VARIANTS = {
+    "app.py": {
+        "page": OPENAI_CHATBOT_PAGE,
+        "validate": False,
+        "stages": [],
+        "upstream": {"provider": "openai", "model": "gpt-3.5-turbo", "request": chat_messages,
+                     "backup_model": "gemini-2.0-flash", "token_budget": 3000},
+    },
+    "streamlitApp": {
+        "page": OPENAI_CHATBOT_PAGE,
+        "validate": False,
+        "stages": [],
+        "upstream": {"provider": "openai", "model": "gpt-3.5-turbo", "request": chat_messages,
+                     "backup_model": "gemini-2.0-flash", "token_budget": 3000},
+    },
+    "geminiApp.py": {
+        "page": GEMINI_CHATBOT_PAGE,
+        "validate": False,
+        "stages": [],
+        "upstream": {"provider": "gemini", "model": "gemini-2.0-flash", "request": prompt_payload},
+        "cascade": True,
+    },
+    "geminiAppV2.py": {
+        "page": HEALTHCARE_PAGE,
+        "validate": False,
+        "stages": [greeting, faq],
+        "upstream": {"provider": "gemini", "model": "gemini-1.5-flash", "request": few_shot_payload,
+                     "context": FEW_SHOT_EXAMPLES},
+        "images": True,
+        "cascade": True,
+    },
+    "geminiAppV3.py": {
+        "page": HEALTHCARE_PAGE,
+        "validate": False,
+        "stages": [greeting, general_health, faq],
+        "upstream": {"provider": "gemini", "model": "gemini-1.5-flash", "request": few_shot_payload,
+                     "context": FEW_SHOT_EXAMPLES},
+        "images": True,
+        "cascade": True,
+    },
+    "geminiAppV4": {
+        "page": HEALTHCARE_TEXT_PAGE,
+        "validate": False,
+        "stages": [greeting, general_health, healthcare_only, faq],
+        "upstream": {"provider": "gemini", "model": "gemini-1.5-flash", "request": few_shot_payload,
+                     "context": FEW_SHOT_EXAMPLES},
+        "guardrails": True,
+        "cascade": True,
+    },
+    "geminiAppV5": {
+        "page": HEALTHCARE_PAGE,
+        "validate": True,
+        "stages": [greeting, specific_condition, faq, diabetes_or_symptoms],
+        "upstream": None,
+    },
+    "geminiAppV6.py": {
+        "page": HEALTHCARE_PAGE,
+        "validate": True,
+        "stages": [prefetched, routed, faq, ask_for_symptoms],
+        "upstream": None,
+        "prefetch": True,
+    },
+    "streamlit_app.py": {
+        "page": HEALTHCARE_PAGE,
+        "validate": True,
+        "stages": [prefetched, greeting, symptoms, specific_condition, faq, ask_for_symptoms],
+        "upstream": None,
+        "prefetch": True,
+    },
+    "chat_api.py": {
+        "page": None,
+        "validate": True,
+        "stages": [routed, faq],
+        "upstream": {"provider": "gemini", "model": "gemini-2.0-flash", "request": grounded_messages},
+        "guardrails": True,
+    },
+}
+
+
+# Function to accept a variant name with or without its .py extension
+def resolve_variant(name):
+    for variant in VARIANTS:
+        if name in (variant, variant.removesuffix(".py")):
+            return variant
+    raise ValueError(f"unknown variant {name!r}; choose from {', '.join(VARIANTS)}")
@@ -0,0 +1,187 @@
+import threading
+
+from gemini_stream import chunk_text, generate_content
+from intent_router import CONDITIONS
+from parallel_calls import BackgroundCall
+from response_cache import completion_cache, make_key, normalize_prompt
+from telemetry import metrics, note
+
+# Speculation defaults
+PREFETCH_BUDGET = 6            # upstream calls one session may spend on predicted turns
+PREFETCH_TIMEOUT = 30          # seconds a prediction may take before it is dropped
+PREFETCH_MODEL = "gemini-1.5-flash"
+
+# Likely answers to the follow-up questions the bot asks, per question set: the symptom
+# summary ("symptoms") and each condition's canned questions. They are offered as quick
+# replies; a user reply that is exactly one of them is answered with its prefetched
+# reply. Anything the user words themselves is answered as usual, never from a
+# prediction, so the bot does not answer symptoms the user did not report.
+FOLLOW_UPS = {
+    "symptoms": [
+        {"name": "light_sound", "answer": "Yes, I am sensitive to light and sound."},
+        {"name": "fever", "answer": "Yes, I feel dehydrated and I have had a fever."},
+        {"name": "neck", "answer": "Yes, I have pain in my neck and shoulders."},
+    ],
+    "cough": [
+        {"name": "dry", "answer": "It is a dry cough."},
+        {"name": "mucus", "answer": "It is a cough with mucus."},
+        {"name": "breath", "answer": "I also have a fever and shortness of breath."},
+    ],
+    "headache": [
+        {"name": "throbbing", "answer": "It is a throbbing headache."},
+        {"name": "sharp", "answer": "It is a sharp headache."},
+        {"name": "nausea", "answer": "I also feel nauseous and dizzy."},
+    ],
+    "insomnia": [
+        {"name": "falling_asleep", "answer": "I have trouble falling asleep."},
+        {"name": "staying_asleep", "answer": "I keep waking up during the night."},
+        {"name": "stress", "answer": "I have been stressed and anxious."},
+    ],
+}
+
+PROMPT = ("A patient is describing their symptoms to a healthcare assistant.\n"
+          "Details so far: {details}\n"
+          "The assistant asked:\n{question}\n"
+          "The patient replied: \"{answer}\"\n"
+          "Reply to the patient in a few sentences: what this could mean, what they can do now, "
+          "and when they should see a doctor.")
+
+
+# Function to find which condition's canned questions a reply is
+def topic_for_reply(reply):
+    for condition in CONDITIONS:
+        if condition["reply"] == reply:
+            return condition["name"]
+    return None
+
+
+# Function to pick the predicted turn a user reply is: the one whose answer it is, up to
+# case, spacing and trailing punctuation (i.e. a quick reply, or typed out exactly)
+def match_follow_up(user_input, predictions):
+    normalized = normalize_prompt(user_input)
+    for name, prediction in predictions.items():
+        if normalize_prompt(prediction["answer"]) == normalized:
+            return name
+    return None
+
+
+# Process-wide counts of speculative calls, for the hit rate against wasted calls
+class PrefetchStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.scheduled = 0
+        self.calls = 0       # predictions that reached the upstream
+        self.hits = 0        # predicted replies that were served
+        self.wasted = 0      # upstream calls whose reply was never served
+        self.failed = 0
+        self.skipped = 0     # predictions not made because the session's budget was spent
+
+    def add(self, name, amount=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self.lock:
+            settled = self.hits + self.wasted
+            return {
+                "scheduled": self.scheduled,
+                "calls": self.calls,
+                "hits": self.hits,
+                "wasted": self.wasted,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "hit_rate": round(self.hits / settled, 4) if settled else 0.0,
+            }
+
+
+prefetch_stats = PrefetchStats()
+metrics.register("prefetch", prefetch_stats.snapshot)
+
+
+# Warms the response cache with answers to the replies a session is likely to send
+# next, after the bot asks its fixed follow-up questions. One per session; predictions
+# run on the shared background pool and are dropped when the next turn does not use
+# them. Each session may spend at most `budget` upstream calls.
+class Prefetcher:
+    def __init__(self, url, session, budget=PREFETCH_BUDGET):
+        self.url = url
+        self.session = session
+        self.budget = budget
+        self.predictions = {}
+
+    # Function to start predicting the answers to the follow-up questions in `question`,
+    # a reply from the `topic` question set, with the symptoms gathered so far
+    def schedule(self, topic, question, symptoms):
+        self.cancel()
+        details = ", ".join(f"{slot}: {value}" for slot, value in sorted(symptoms.items())) or "none yet"
+        for follow_up in FOLLOW_UPS.get(topic, ()):
+            prompt = PROMPT.format(details=details, question=question, answer=follow_up["answer"])
+            key = make_key(prompt, PREFETCH_MODEL)
+            prediction = {"key": key, "answer": follow_up["answer"], "call": None}
+            self.predictions[follow_up["name"]] = prediction
+            if completion_cache.get(key) is not None:
+                continue
+            if self.budget <= 0:
+                prefetch_stats.add("skipped")
+                continue
+            self.budget -= 1
+            prefetch_stats.add("scheduled")
+            payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+            prediction["call"] = BackgroundCall(self._answer, payload, key, timeout=PREFETCH_TIMEOUT)
+
+    # Function to list the predicted answers, to offer as quick replies
+    def suggestions(self):
+        return [prediction["answer"] for prediction in self.predictions.values()]
+
+    def _answer(self, payload, key):
+        prefetch_stats.add("calls")
+        try:
+            text = chunk_text(generate_content(self.url, payload, session=self.session, timeout=PREFETCH_TIMEOUT))
+        except Exception:
+            prefetch_stats.add("failed")
+            raise
+        if text:
+            completion_cache.put(key, text)
+        return text
+
+    # Function to answer a user reply from a prediction, waiting for it if it is still
+    # on its way. Returns None when the reply was not predicted; the other predictions
+    # are dropped either way.
+    def lookup(self, user_input):
+        name = match_follow_up(user_input, self.predictions)
+        prediction = self.predictions.pop(name) if name else None
+        self.cancel()
+        if prediction is None:
+            return None
+        text = completion_cache.get(prediction["key"])
+        call = prediction["call"]
+        if text is None and call is not None:
+            try:
+                text = call.result()
+            except Exception:
+                # Timed out or failed: the turn goes on as if nothing was predicted
+                text = None
+        if text and call is not None:
+            prefetch_stats.add("hits")
+            note("prefetch_hits")
+        elif call is not None:
+            self._drop(call)
+        return text or None
+
+    # Function to drop every outstanding prediction. Calls that had not started cost
+    # nothing and go back into the budget; the rest count as wasted.
+    def cancel(self):
+        for prediction in self.predictions.values():
+            if prediction["call"] is not None:
+                self._drop(prediction["call"])
+        self.predictions = {}
+
+    def _drop(self, call):
+        started = not call.future.cancel()
+        call.cancel()
+        if started:
+            prefetch_stats.add("wasted")
+            note("prefetch_wasted")
+        else:
+            self.budget += 1
+            prefetch_stats.add("scheduled", -1)
@@ -0,0 +1,289 @@
+import contextvars
+import queue
+import threading
+import time
+from collections import deque
+
+from chat_messages import gemini_body, openai_body
+from gemini_stream import GEMINI_BASE_URL, stream_gemini, stream_url
+from resilience import call_with_retry
+from telemetry import StreamTimer, metrics
+
+# Hedging defaults: until enough first-token samples exist, hedge after this many seconds
+DEFAULT_HEDGE_DELAY = 2.0
+MIN_HEDGE_DELAY = 0.25
+MAX_HEDGE_DELAY = 10.0
+HEDGE_PERCENTILE = 0.95
+MIN_SAMPLES = 20
+WINDOW_SIZE = 500
+
+
+# Raised when an upstream stream fails after the request was accepted
+class ProviderError(Exception):
+    pass
+
+
+# A streaming reply: iterate for text chunks, close() to abort the HTTP response
+class TextStream:
+    def __init__(self, chunks, close):
+        self.chunks = chunks
+        self.close_response = close
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        try:
+            self.close_response()
+        except Exception:
+            pass
+
+
+# Gemini over the streamGenerateContent REST endpoint
+class GeminiProvider:
+    def __init__(self, api_key, model="gemini-2.0-flash", session=None, base_url=GEMINI_BASE_URL, timeout=60):
+        self.name = f"gemini/{model}"
+        self.url = stream_url(model, api_key, base_url=base_url)
+        self.session = session
+        self.timeout = timeout
+
+    # Function to convert chat messages into an encoded Gemini request body
+    @staticmethod
+    def payload(messages):
+        return gemini_body(messages)
+
+    def stream(self, messages):
+        kwargs = {"session": self.session} if self.session is not None else {}
+        stream = stream_gemini(self.url, self.payload(messages), timeout=self.timeout, **kwargs)
+
+        def chunks():
+            yield from stream
+            if stream.error:
+                raise ProviderError(stream.error)
+
+        return TextStream(chunks(), stream.close)
+
+
+# OpenAI chat completions through an (already pooled) OpenAI client
+class OpenAIProvider:
+    def __init__(self, client, model="gpt-3.5-turbo"):
+        self.name = f"openai/{model}"
+        self.client = client
+        self.model = model
+
+    def stream(self, messages):
+        from openai import Stream
+        from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+        # The body is assembled from the already encoded messages and posted as is,
+        # rather than handing the SDK a fresh list of dicts to serialize again
+        body = openai_body(self.model, messages, stream=True)
+        # Retries and the circuit breaker live in `call_with_retry`; the client itself is
+        # built with max_retries=0 so failures are not retried twice
+        stream = call_with_retry(
+            self.name,
+            lambda: self.client.post(
+                "/chat/completions",
+                body=body,
+                cast_to=ChatCompletion,
+                stream=True,
+                stream_cls=Stream[ChatCompletionChunk],
+            ),
+            api_key=self.client.api_key,
+        )
+
+        def chunks():
+            # The SDK decodes chunks as it reads them, so there is no separate parse time
+            timer = StreamTimer()
+            parts = []
+            error = None
+            try:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        timer.chunk()
+                        parts.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                timer.finish("".join(parts), error=error)
+
+        return TextStream(chunks(), stream.close)
+
+
+# Rolling time-to-first-token samples per provider, shared across sessions
+class LatencyTracker:
+    def __init__(self, window=WINDOW_SIZE):
+        self.lock = threading.Lock()
+        self.window = window
+        self.samples = {}
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, name, fraction):
+        with self.lock:
+            samples = sorted(self.samples.get(name, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    # How long to wait for the primary's first token before firing the hedge
+    def hedge_delay(self, name):
+        with self.lock:
+            count = len(self.samples.get(name, ()))
+        if count < MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        delay = self.percentile(name, HEDGE_PERCENTILE)
+        return min(MAX_HEDGE_DELAY, max(MIN_HEDGE_DELAY, delay))
+
+
+# Counters for how often hedges fire and win
+class HedgeStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def incr(self, field):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "failovers": self.failovers,
+                "extra_request_rate": round(self.hedges / self.requests, 4) if self.requests else 0.0,
+            }
+
+
+latency_tracker = LatencyTracker()
+hedge_stats = HedgeStats()
+metrics.register("hedge", hedge_stats.as_dict)
+
+_END = object()
+
+
+# One upstream attempt, read on its own thread. Chunks go to a private queue; the
+# first chunk (or a failure before it) is announced on the shared events queue.
+class _Attempt:
+    def __init__(self, provider, messages, events):
+        self.provider = provider
+        self.messages = messages
+        self.events = events
+        self.chunks = queue.Queue()
+        self.cancelled = threading.Event()
+        self.stream = None
+        self.started = time.monotonic()
+        # Run in a copy of the caller's context so the attempt's spans join its trace
+        self.thread = threading.Thread(target=contextvars.copy_context().run, args=(self._run,), daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        announced = False
+        try:
+            self.stream = self.provider.stream(self.messages)
+            if self.cancelled.is_set():
+                self.stream.close()
+                return
+            for chunk in self.stream:
+                if self.cancelled.is_set():
+                    return
+                self.chunks.put(chunk)
+                if not announced:
+                    announced = True
+                    self.events.put((self, "first", time.monotonic() - self.started))
+            if not announced:
+                announced = True
+                self.events.put((self, "first", time.monotonic() - self.started))
+        except Exception as e:
+            if announced:
+                self.chunks.put(e)
+            else:
+                announced = True
+                self.events.put((self, "error", e))
+        finally:
+            self.chunks.put(_END)
+
+    def cancel(self):
+        self.cancelled.set()
+        if self.stream is not None:
+            self.stream.close()
+
+    def __iter__(self):
+        while True:
+            item = self.chunks.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+# Streams from the primary provider and, if its first token is late (past the p95 of
+# recent first-token times) or it fails, races a backup request on the secondary.
+# The first to produce a token wins and the other is cancelled.
+class HedgedRouter:
+    def __init__(self, primary, secondary=None, tracker=latency_tracker, stats=hedge_stats):
+        self.primary = primary
+        self.secondary = secondary
+        self.tracker = tracker
+        self.stats = stats
+        self.winner = None
+
+    def stream(self, messages):
+        self.stats.incr("requests")
+        events = queue.Queue()
+        attempts = [_Attempt(self.primary, messages, events)]
+        hedge_at = time.monotonic() + self.tracker.hedge_delay(self.primary.name)
+        failures = []
+        winner = None
+        try:
+            while winner is None:
+                can_hedge = self.secondary is not None and len(attempts) == 1
+                timeout = max(0.0, hedge_at - time.monotonic()) if can_hedge else None
+                try:
+                    attempt, kind, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    self.stats.incr("hedges")
+                    attempts.append(_Attempt(self.secondary, messages, events))
+                    continue
+                if kind == "first":
+                    winner = attempt
+                    self.tracker.record(attempt.provider.name, value)
+                    continue
+                failures.append(value)
+                if can_hedge:
+                    # The primary failed outright: fail over immediately
+                    self.stats.incr("hedges")
+                    self.stats.incr("failovers")
+                    attempts.append(_Attempt(self.secondary, messages, events))
+                elif len(failures) == len(attempts):
+                    raise failures[0]
+        finally:
+            for attempt in attempts:
+                if attempt is not winner:
+                    attempt.cancel()
+
+        if winner is not attempts[0]:
+            self.stats.incr("hedge_wins")
+            # The primary never produced a token; record how long it had been waiting as
+            # a lower bound so slow periods still push the hedge delay up
+            self.tracker.record(self.primary.name, time.monotonic() - attempts[0].started)
+        self.winner = winner.provider.name
+
+        # Stop the winner too if the caller abandons the stream part way
+        finished = False
+        try:
+            yield from winner
+            finished = True
+        finally:
+            if not finished:
+                winner.cancel()
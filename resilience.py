@@ -0,0 +1,382 @@
+import asyncio
+import email.utils
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+
+import requests
+
+from shared_state import off_loop, shared_state
+from telemetry import metrics, note, record_span
+
+# The OpenAI SDK and httpx are optional here and only needed to recognise their
+# exceptions. Such an exception can only come from a module that is already imported,
+# so they are looked up in sys.modules when an error is classified instead of importing
+# the SDKs up front (the OpenAI one takes most of a second to import).
+def _sdk_errors():
+    timeout_errors, connect_errors = (), ()
+    openai = sys.modules.get("openai")
+    if openai is not None:
+        timeout_errors += (openai.APITimeoutError,)
+        connect_errors += (openai.APIConnectionError,)
+    # The asyncio API talks to upstream through httpx (shipped as httpx2 with newer OpenAI SDKs)
+    for name in ("httpx2", "httpx"):
+        httpx = sys.modules.get(name)
+        if httpx is not None:
+            timeout_errors += (httpx.ReadTimeout, httpx.WriteTimeout)
+            # Connect failures and pool timeouts happen before the request is sent
+            connect_errors += (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+    return timeout_errors, connect_errors
+
+
+# Statuses that mean the upstream did not process the request and it is safe to resend
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+# Retry defaults
+MAX_ATTEMPTS = 3
+BASE_DELAY = 0.5          # seconds, doubled per attempt before jitter
+MAX_DELAY = 8.0
+MAX_RETRY_AFTER = 20.0    # give up rather than block a session longer than this
+
+# Circuit breaker defaults
+FAILURE_THRESHOLD = 5     # consecutive failures before the circuit opens
+RESET_TIMEOUT = 30.0      # seconds the circuit stays open before a trial request
+
+# Quota defaults
+QUOTA_PER_KEY = int(os.environ.get("QUOTA_PER_KEY", "0"))  # upstream requests per API key per window, 0 for no limit
+QUOTA_WINDOW = 60         # seconds per quota window
+
+
+# Raised instead of calling upstream while an endpoint's circuit is open
+class CircuitOpenError(Exception):
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"{endpoint} is unavailable; retrying in {retry_in:.0f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+# Raised instead of calling upstream while an API key's quota is used up, either by the
+# configured limit or because upstream answered 429. A CircuitOpenError, so callers
+# that back off from an unavailable upstream handle it the same way.
+class QuotaExceededError(CircuitOpenError):
+    def __init__(self, endpoint, retry_in):
+        Exception.__init__(self, f"quota for {endpoint} is used up; retrying in {retry_in:.0f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+# Per-endpoint circuit breaker. Its state (closed/open/half open, consecutive failures,
+# when it opened) lives in the shared store, so with a shared backend every process
+# sees a tripped circuit; the counters are this process's own.
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, endpoint, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, store=None):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.store = store if store is not None else shared_state
+        self.key = "health:" + endpoint
+        self.lock = threading.Lock()
+        # Counters for monitoring
+        self.calls = 0
+        self.retries = 0
+        self.rejected = 0
+        self.trips = 0
+
+    def _closed(self):
+        return {"state": self.CLOSED, "failures": 0, "opened_at": 0.0, "trial_at": None}
+
+    def _state(self):
+        return self.store.get(self.key) or self._closed()
+
+    # Function to check whether a request may go out now
+    def allow(self):
+        if self._state()["state"] != self.CLOSED:
+            claimed = []
+            self.store.update(self.key, lambda health: self._claim_trial(health, claimed))
+            if not claimed:
+                with self.lock:
+                    self.rejected += 1
+                return False
+        with self.lock:
+            self.calls += 1
+        return True
+
+    # Function to let exactly one trial request through once the circuit has been open
+    # for `reset_timeout`. A trial that never reports back (its process died) is
+    # replaced after another `reset_timeout`.
+    def _claim_trial(self, health, claimed):
+        health = health or self._closed()
+        now = time.time()
+        if health["state"] == self.CLOSED:
+            claimed.append(True)
+            return health
+        if health["state"] == self.OPEN and now - health["opened_at"] >= self.reset_timeout:
+            health["state"] = self.HALF_OPEN
+            health["trial_at"] = None
+        if health["state"] == self.HALF_OPEN and (health["trial_at"] is None or now - health["trial_at"] >= self.reset_timeout):
+            health["trial_at"] = now
+            claimed.append(True)
+        return health
+
+    def retry_in(self):
+        return max(0.0, self.reset_timeout - (time.time() - self._state()["opened_at"]))
+
+    def record_success(self):
+        health = self._state()
+        if health["state"] != self.CLOSED or health["failures"]:
+            self.store.set(self.key, {"state": self.CLOSED, "failures": 0, "opened_at": 0.0, "trial_at": None})
+
+    def record_failure(self):
+        tripped = []
+
+        def fail(health):
+            health = health or self._closed()
+            health["failures"] += 1
+            if health["state"] == self.HALF_OPEN or health["failures"] >= self.failure_threshold:
+                if health["state"] != self.OPEN:
+                    tripped.append(True)
+                health["state"] = self.OPEN
+                health["opened_at"] = time.time()
+                health["trial_at"] = None
+            return health
+
+        self.store.update(self.key, fail)
+        if tripped:
+            with self.lock:
+                self.trips += 1
+
+    def as_dict(self):
+        health = self._state()
+        with self.lock:
+            return {
+                "endpoint": self.endpoint,
+                "state": health["state"],
+                "consecutive_failures": health["failures"],
+                "calls": self.calls,
+                "retries": self.retries,
+                "rejected": self.rejected,
+                "trips": self.trips,
+            }
+
+
+_lock = threading.Lock()
+_breakers = {}
+
+
+# Function to get the process-wide breaker for an endpoint
+def get_breaker(endpoint):
+    with _lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+        return breaker
+
+
+# Function to report breaker state and retry counts for monitoring
+def resilience_stats():
+    with _lock:
+        breakers = list(_breakers.values())
+    return [breaker.as_dict() for breaker in breakers]
+
+
+metrics.register("breaker", resilience_stats)
+
+
+# Function to get the id an API key is counted under: a short hash, never the key
+def quota_key(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+# Upstream requests per API key in fixed windows, and the keys upstream has answered
+# 429 for. Kept in the shared store, so with a shared backend every process draws from
+# the same quota and a rate-limited key is paused everywhere at once.
+class QuotaTracker:
+    def __init__(self, limit=QUOTA_PER_KEY, window=QUOTA_WINDOW, store=None):
+        self.limit = limit
+        self.window = window
+        self.store = store if store is not None else shared_state
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.rejected = 0
+        self.paused = 0      # 429s from upstream that paused a key
+
+    # Function to take one request from a key's quota, or raise QuotaExceededError
+    def acquire(self, endpoint, key_id):
+        now = time.time()
+        paused_until = self.store.get(f"quota:{key_id}:paused")
+        if paused_until is not None and paused_until > now:
+            self._reject()
+            raise QuotaExceededError(endpoint, paused_until - now)
+        if self.limit:
+            window = int(now // self.window)
+            if self.store.incr(f"quota:{key_id}:{window}", ttl=self.window * 2) > self.limit:
+                self._reject()
+                raise QuotaExceededError(endpoint, (window + 1) * self.window - now)
+        with self.lock:
+            self.sent += 1
+
+    def _reject(self):
+        with self.lock:
+            self.rejected += 1
+        note("quota_rejected")
+
+    # Function to stop every process sending with a key until upstream's Retry-After
+    def pause(self, key_id, seconds):
+        self.store.set(f"quota:{key_id}:paused", time.time() + seconds, ttl=seconds)
+        with self.lock:
+            self.paused += 1
+
+    # Function to get how many requests a key has sent in the current window
+    def used(self, key_id):
+        return self.store.get(f"quota:{key_id}:{int(time.time() // self.window)}") or 0
+
+    def stats(self):
+        with self.lock:
+            return {"limit": self.limit, "window": self.window, "sent": self.sent,
+                    "rejected": self.rejected, "paused": self.paused}
+
+
+quota = QuotaTracker()
+metrics.register("quota", quota.stats)
+
+
+# Function to parse a Retry-After header (delta-seconds or HTTP date) into seconds
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+# Function to compute a full-jitter exponential backoff delay for a retry attempt
+def backoff_delay(attempt, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+# Function to classify a response or exception the same way for every provider.
+# Returns (outcome, retryable, retry_after), where outcome is one of:
+# - "ok": upstream answered, including a 4xx for a bad request or key
+# - "unhealthy": a 5xx, timeout or connect failure, which counts toward the breaker
+# - "rate_limited": a 429, which pauses that API key rather than the endpoint
+# - "error": any other exception, handed back without touching the breaker
+def _classify(response=None, error=None):
+    if error is not None:
+        status = getattr(error, "status_code", None)
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        if status is None:
+            # A read timeout may mean the request was processed; only connect failures are safe
+            timeout_errors, connect_errors = _sdk_errors()
+            if isinstance(error, (requests.ReadTimeout,) + timeout_errors):
+                return "unhealthy", False, None
+            if isinstance(error, (requests.ConnectionError,) + connect_errors):
+                return "unhealthy", True, None
+            return "error", False, None
+    else:
+        # SDK calls return parsed objects rather than HTTP responses; those are successes
+        status = getattr(response, "status_code", None)
+        headers = getattr(response, "headers", None) or {}
+    if status is None or status < 429 or 429 < status < 500:
+        return "ok", False, None
+    retry_after = parse_retry_after(headers.get("Retry-After"))
+    if status == 429:
+        return "rate_limited", True, retry_after
+    return "unhealthy", status in RETRYABLE_STATUS, retry_after
+
+
+# Function to record the outcome of one attempt. Returns the delay before the next
+# attempt, or None when the result should go back to the caller as it is.
+def _next_delay(breaker, attempt, max_attempts, response, error, key_id=None):
+    outcome, retryable, retry_after = _classify(response, error)
+    if outcome == "ok":
+        breaker.record_success()
+        return None
+    if outcome == "unhealthy":
+        breaker.record_failure()
+        note("upstream_failures")
+    elif outcome == "rate_limited":
+        # One key's rate limit says nothing about the endpoint the other keys share
+        note("rate_limited")
+        if key_id is not None and retry_after:
+            quota.pause(key_id, retry_after)
+
+    last_attempt = attempt + 1 == max_attempts
+    if not retryable or last_attempt or (retry_after is not None and retry_after > MAX_RETRY_AFTER):
+        return None
+    with breaker.lock:
+        breaker.retries += 1
+    note("retries")
+    return retry_after if retry_after is not None else backoff_delay(attempt)
+
+
+# Function to call an upstream endpoint with retries, backoff and a circuit breaker.
+# `send` performs one attempt and returns a response (with status_code and headers) or
+# raises. Non-retryable results are returned or raised unchanged. With `api_key`, each
+# attempt is counted against that key's quota.
+def call_with_retry(endpoint, send, max_attempts=MAX_ATTEMPTS, sleep=time.sleep, api_key=None):
+    breaker = get_breaker(endpoint)
+    key_id = quota_key(api_key) if api_key else None
+    started = time.perf_counter()
+    for attempt in range(max_attempts):
+        if key_id is not None:
+            quota.acquire(endpoint, key_id)
+        if not breaker.allow():
+            note("circuit_open")
+            raise CircuitOpenError(endpoint, breaker.retry_in())
+        response = error = None
+        try:
+            response = send()
+        except Exception as e:
+            error = e
+        delay = _next_delay(breaker, attempt, max_attempts, response, error, key_id)
+        if delay is None:
+            # Time to the response headers, across every attempt and backoff
+            record_span("upstream_request", started, time.perf_counter() - started)
+            if error is not None:
+                raise error
+            return response
+        if response is not None:
+            response.close()
+        sleep(delay)
+
+
+# Function to do the same from asyncio code: `send` returns an awaitable, the response
+# is closed with aclose() and neither the backoff nor the quota and breaker state in a
+# shared store block the event loop. Breakers are shared with the blocking callers.
+async def async_call_with_retry(endpoint, send, max_attempts=MAX_ATTEMPTS, sleep=asyncio.sleep, api_key=None):
+    breaker = get_breaker(endpoint)
+    key_id = quota_key(api_key) if api_key else None
+    started = time.perf_counter()
+    for attempt in range(max_attempts):
+        if key_id is not None:
+            await off_loop(quota.acquire, endpoint, key_id)
+        if not await off_loop(breaker.allow):
+            note("circuit_open")
+            raise CircuitOpenError(endpoint, await off_loop(breaker.retry_in))
+        response = error = None
+        try:
+            response = await send()
+        except Exception as e:
+            error = e
+        delay = await off_loop(_next_delay, breaker, attempt, max_attempts, response, error, key_id)
+        if delay is None:
+            record_span("upstream_request", started, time.perf_counter() - started)
+            if error is not None:
+                raise error
+            return response
+        if response is not None:
+            await response.aclose()
+        await sleep(delay)
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from chat_messages import Message
+from shared_state import shared_state
+from telemetry import metrics, note
+
+# Default bounds for the shared completion cache
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL = 60 * 60  # seconds
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+# Function to normalize a prompt so near-identical questions share a cache entry
+def normalize_prompt(prompt):
+    prompt = _WHITESPACE.sub(" ", prompt.strip().lower())
+    return _TRAILING_PUNCTUATION.sub("", prompt)
+
+
+# Function to build a cache key from the prompt, the model and any few-shot/system context.
+# Compact messages are hashed from their encoded bytes, so long histories are not
+# serialized again for every lookup.
+def make_key(prompt, model, context=()):
+    digest = hashlib.sha256("\x1f".join((model, normalize_prompt(prompt))).encode("utf-8"))
+    for item in context:
+        # A plain {"role", "content"} dict keys the same as the Message it would become
+        if isinstance(item, dict) and item.keys() == {"role", "content"}:
+            item = Message.coerce(item)
+        if isinstance(item, Message):
+            digest.update(b"\x1e" + item.to_json())
+        else:
+            digest.update(b"\x1e" + json.dumps(item, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# Thread-safe LRU cache with per-entry TTL, shared by every session in the process.
+# With a shared `store` (see shared_state.py) it is the fast layer in front of a cache
+# shared by every process: local misses are looked up in the store, and answers are
+# written to both.
+class CompletionCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, store=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0   # hits answered by the store, i.e. another process's answer
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        value = self._lookup(key)
+        if value is None and self.store is not None:
+            value = self.store.get("cache:" + key)
+            if value is not None:
+                self._insert(key, value, self.ttl)
+                with self.lock:
+                    self.misses -= 1
+                    self.hits += 1
+                    self.shared_hits += 1
+        note("cache_misses" if value is None else "cache_hits")
+        return value
+
+    def _lookup(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._insert(key, value, ttl)
+        if self.store is not None:
+            self.store.set("cache:" + key, value, ttl)
+
+    def _insert(self, key, value, ttl):
+        expires_at = time.monotonic() + ttl
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.store is not None:
+            self.store.clear("cache:")
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "shared_hits": self.shared_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+# Process-wide cache used by the app variants, backed by the shared store when one is
+# configured
+completion_cache = CompletionCache(store=shared_state if shared_state.shared else None)
+metrics.register("cache", completion_cache.stats)
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from telemetry import metrics
+
+# Where state shared by every app process is kept: the completion cache, per-API-key
+# quota counters and upstream health. Unset keeps it inside each process; a file path
+# (or sqlite:///path) shares it between the processes on one host through SQLite.
+SHARED_STATE = os.environ.get("SHARED_STATE", "")
+
+SHARED_STATE_TIMEOUT = 5.0   # seconds to wait for another process's write lock
+PURGE_INTERVAL = 1000        # writes between sweeps of expired keys
+MAX_KEYS = 100000            # keys kept before the soonest to expire are dropped early
+
+# A backend stores JSON-serializable values under string keys, each with an optional
+# time to live, and implements:
+#
+#   get(key)                        value, or None if missing or expired
+#   set(key, value, ttl=None)
+#   incr(key, amount=1, ttl=None)   add to an integer and return it; the ttl is set
+#                                   when the key is created
+#   update(key, function, ttl=None) atomically store function(old value or None) and
+#                                   return it; None deletes the key
+#   delete(key)
+#   clear(prefix="")
+#   stats()
+#
+# `shared` tells callers whether other processes see the same values. A networked
+# store (e.g. Redis: GET/SET EX/INCR + EXPIRE NX/WATCH-MULTI) fits the same methods.
+
+
+# Process-local backend, used when no shared store is configured
+class MemoryBackend:
+    shared = False
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Key -> (expires_at or None, value)
+        self.data = {}
+        self.reads = 0
+        self.writes = 0
+
+    def _live(self, key, now):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= now:
+            del self.data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self.lock:
+            self.reads += 1
+            entry = self._live(key, time.time())
+        return None if entry is None else entry[1]
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self.lock:
+            self.writes += 1
+            self.data[key] = (now + ttl if ttl is not None else None, value)
+
+    def incr(self, key, amount=1, ttl=None):
+        now = time.time()
+        with self.lock:
+            self.writes += 1
+            entry = self._live(key, now)
+            if entry is None:
+                entry = (now + ttl if ttl is not None else None, 0)
+            value = entry[1] + amount
+            self.data[key] = (entry[0], value)
+        return value
+
+    def update(self, key, function, ttl=None):
+        now = time.time()
+        with self.lock:
+            self.writes += 1
+            entry = self._live(key, now)
+            value = function(None if entry is None else entry[1])
+            if value is None:
+                self.data.pop(key, None)
+            else:
+                self.data[key] = (now + ttl if ttl is not None else None, value)
+        return value
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self, prefix=""):
+        with self.lock:
+            for key in [key for key in self.data if key.startswith(prefix)]:
+                del self.data[key]
+
+    def stats(self):
+        with self.lock:
+            return {"backend": "memory", "shared": False, "keys": len(self.data),
+                    "reads": self.reads, "writes": self.writes}
+
+
+# SQLite backend in WAL mode, shared by every process that opens the same file. Reads
+# never wait for writers; writes from all processes are serialized by SQLite's lock.
+class SQLiteBackend:
+    shared = True
+
+    def __init__(self, path, timeout=SHARED_STATE_TIMEOUT, max_keys=MAX_KEYS):
+        self.path = path
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires REAL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS state_expires ON state (expires);
+            """
+        )
+        self.reads = 0
+        self.writes = 0
+        self.purged = 0
+
+    def get(self, key):
+        with self.lock:
+            self.reads += 1
+            row = self.db.execute(
+                "SELECT value FROM state WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl is not None else None),
+            )
+            self._wrote(now)
+
+    def incr(self, key, amount=1, ttl=None):
+        now = time.time()
+        with self.lock:
+            # One statement, so concurrent increments from other processes are never lost
+            row = self.db.execute(
+                """
+                INSERT INTO state (key, value, expires) VALUES (?1, ?2, ?3)
+                ON CONFLICT (key) DO UPDATE SET
+                    value = CASE WHEN expires IS NOT NULL AND expires <= ?4 THEN ?2
+                                 ELSE CAST(value AS INTEGER) + ?2 END,
+                    expires = CASE WHEN expires IS NOT NULL AND expires <= ?4 THEN ?3 ELSE expires END
+                RETURNING value
+                """,
+                (key, amount, now + ttl if ttl is not None else None, now),
+            ).fetchone()
+            self._wrote(now)
+        return int(row[0])
+
+    def update(self, key, function, ttl=None):
+        now = time.time()
+        with self.lock:
+            # BEGIN IMMEDIATE takes the write lock before reading, so no other process
+            # can change the value between the read and the write
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute(
+                    "SELECT value FROM state WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, now)
+                ).fetchone()
+                value = function(None if row is None else json.loads(row[0]))
+                if value is None:
+                    self.db.execute("DELETE FROM state WHERE key = ?", (key,))
+                else:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)",
+                        (key, json.dumps(value), now + ttl if ttl is not None else None),
+                    )
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+            self._wrote(now)
+        return value
+
+    def delete(self, key):
+        with self.lock:
+            self.db.execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def clear(self, prefix=""):
+        with self.lock:
+            self.db.execute("DELETE FROM state WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    # Function to drop expired keys, and the soonest to expire past `max_keys`, every
+    # PURGE_INTERVAL writes. Must be called with `lock` held.
+    def _wrote(self, now):
+        self.writes += 1
+        if self.writes % PURGE_INTERVAL:
+            return
+        self.purged += self.db.execute("DELETE FROM state WHERE expires <= ?", (now,)).rowcount
+        excess = self.db.execute("SELECT COUNT(*) FROM state").fetchone()[0] - self.max_keys
+        if excess > 0:
+            self.purged += self.db.execute(
+                "DELETE FROM state WHERE key IN "
+                "(SELECT key FROM state WHERE expires IS NOT NULL ORDER BY expires LIMIT ?)",
+                (excess,),
+            ).rowcount
+
+    def stats(self):
+        with self.lock:
+            keys = self.db.execute("SELECT COUNT(*) FROM state").fetchone()[0]
+            return {"backend": "sqlite", "shared": True, "keys": keys,
+                    "reads": self.reads, "writes": self.writes, "purged": self.purged}
+
+
+# Function to open the backend named by a SHARED_STATE value
+def open_backend(spec=SHARED_STATE):
+    if not spec or spec == "memory":
+        return MemoryBackend()
+    if spec.startswith("sqlite:///"):
+        return SQLiteBackend(spec[len("sqlite:///"):])
+    if "://" in spec:
+        raise ValueError(f"unsupported SHARED_STATE backend: {spec}")
+    return SQLiteBackend(spec)
+
+
+# Process-wide backend used by the completion cache, quotas and circuit breakers
+shared_state = open_backend()
+metrics.register("shared_state", shared_state.stats)
+
+
+# Function to make a call that reads or writes the shared store from asyncio code. A
+# shared backend can wait up to SHARED_STATE_TIMEOUT for another process's lock, which
+# would stall every connection on the event loop, so the call runs in a worker thread;
+# the in-memory backend is called inline.
+async def off_loop(fn, *args):
+    if shared_state.shared:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
@@ -0,0 +1,323 @@
+import asyncio
+import contextvars
+import threading
+
+from telemetry import metrics, note
+
+
+# One upstream call shared by every request that asked for it while it was running.
+# The reply is buffered as it arrives, so a request that joins late replays it from the
+# first chunk.
+class _Flight:
+    def __init__(self, key):
+        self.key = key
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.opened = False
+        self.done = False
+        self.cancelled = False
+        self.upstream = None
+        self.subscribers = 0
+        self.open_error = None     # raised by the call itself; re-raised to every subscriber
+        self.stream_error = None   # raised part way through the stream
+        self.error = None          # the upstream stream's own `error` (GeminiStream)
+        self.finish_reason = None  # and its `finish_reason`
+
+
+# One subscriber's view of a shared reply. Iterate it like the upstream stream; `text`,
+# `error` and `finish_reason` mirror GeminiStream so the apps treat both alike.
+class SharedStream:
+    def __init__(self, coalescer, flight):
+        self.coalescer = coalescer
+        self.flight = flight
+        self.parts = []
+        self.closed = False
+
+    def __iter__(self):
+        flight = self.flight
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    while index == len(flight.chunks) and not flight.done:
+                        flight.cond.wait()
+                    chunks = flight.chunks[index:]
+                    finished = flight.done
+                index += len(chunks)
+                for chunk in chunks:
+                    self.parts.append(chunk)
+                    yield chunk
+                if finished and index == len(flight.chunks):
+                    break
+            if flight.stream_error is not None:
+                raise flight.stream_error
+        finally:
+            self.close()
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    @property
+    def error(self):
+        return self.flight.error
+
+    @property
+    def finish_reason(self):
+        return self.flight.finish_reason
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.coalescer._leave(self.flight)
+
+
+# Process-wide single-flight for streaming upstream calls. Concurrent requests with the
+# same key (the response-cache key: normalized prompt, model and context) share one
+# upstream call; a pump thread reads it and every subscriber gets every chunk. Works
+# across Streamlit's script threads. The call is aborted once all subscribers leave.
+class Coalescer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    # Function to stream the reply for `key`, calling `open_stream()` only if no identical
+    # call is in flight. Errors from opening the call are raised to every subscriber.
+    def stream(self, key, open_stream):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight(key)
+                self.upstream_calls += 1
+            else:
+                self.coalesced += 1
+            flight.subscribers += 1
+        if leader:
+            # The pump runs in a copy of the leader's context so its spans join that trace
+            threading.Thread(
+                target=contextvars.copy_context().run, args=(self._pump, flight, open_stream),
+                name="single-flight", daemon=True,
+            ).start()
+        else:
+            note("coalesced")
+
+        try:
+            with flight.cond:
+                while not flight.opened and not flight.done:
+                    flight.cond.wait()
+        except BaseException:
+            self._leave(flight)
+            raise
+        if flight.open_error is not None:
+            self._leave(flight)
+            raise flight.open_error
+        return SharedStream(self, flight)
+
+    def _pump(self, flight, open_stream):
+        try:
+            upstream = open_stream()
+        except Exception as e:
+            self._forget(flight)
+            with flight.cond:
+                flight.open_error = e
+                flight.done = True
+                flight.cond.notify_all()
+            return
+
+        with flight.cond:
+            flight.upstream = upstream
+            flight.opened = True
+            flight.cond.notify_all()
+        try:
+            for chunk in upstream:
+                with flight.cond:
+                    if flight.cancelled:
+                        break
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except Exception as e:
+            flight.stream_error = e
+        finally:
+            if flight.cancelled:
+                _close(upstream)
+            self._forget(flight)
+            with flight.cond:
+                flight.error = getattr(upstream, "error", None)
+                flight.finish_reason = getattr(upstream, "finish_reason", None)
+                flight.done = True
+                flight.cond.notify_all()
+
+    # Function to stop new requests from joining a flight that finished or was abandoned
+    def _forget(self, flight):
+        with self.lock:
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+
+    def _leave(self, flight):
+        with self.lock:
+            flight.subscribers -= 1
+            abandoned = flight.subscribers == 0 and not flight.done
+            if abandoned and self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+        if abandoned:
+            with flight.cond:
+                flight.cancelled = True
+            # Unblocks a pump waiting on the network; generator streams are closed by the
+            # pump itself when their next chunk arrives
+            if flight.upstream is not None:
+                _close(flight.upstream)
+
+    def stats(self):
+        with self.lock:
+            return {"upstream_calls": self.upstream_calls, "coalesced": self.coalesced, "in_flight": len(self.flights)}
+
+
+def _close(stream):
+    close = getattr(stream, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
+
+
+# The asyncio counterpart for chat_api.py: the same sharing within one event loop, with
+# a pump task instead of a thread
+class _AsyncFlight:
+    def __init__(self, key):
+        self.key = key
+        self.changed = asyncio.Condition()
+        self.chunks = []
+        self.opened = False
+        self.done = False
+        self.upstream = None
+        self.subscribers = 0
+        self.open_error = None
+        self.stream_error = None
+        self.task = None
+
+
+class AsyncSharedStream:
+    def __init__(self, coalescer, flight):
+        self.coalescer = coalescer
+        self.flight = flight
+        self.closed = False
+
+    async def __aiter__(self):
+        flight = self.flight
+        index = 0
+        try:
+            while True:
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: index < len(flight.chunks) or flight.done)
+                    chunks = flight.chunks[index:]
+                    finished = flight.done
+                index += len(chunks)
+                for chunk in chunks:
+                    yield chunk
+                if finished and index == len(flight.chunks):
+                    break
+            if flight.stream_error is not None:
+                raise flight.stream_error
+        finally:
+            await self.aclose()
+
+    async def aclose(self):
+        if not self.closed:
+            self.closed = True
+            self.coalescer._leave(self.flight)
+
+
+class AsyncCoalescer:
+    def __init__(self):
+        self.flights = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    # Function to stream the reply for `key`, awaiting `open_stream()` only if no identical
+    # call is in flight. `on_done` runs once the upstream call has finished or been aborted.
+    async def stream(self, key, open_stream, on_done=None):
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.flights[key] = _AsyncFlight(key)
+            self.upstream_calls += 1
+            flight.task = asyncio.create_task(self._pump(flight, open_stream, on_done))
+        else:
+            self.coalesced += 1
+            note("coalesced")
+        flight.subscribers += 1
+
+        try:
+            async with flight.changed:
+                await flight.changed.wait_for(lambda: flight.opened or flight.done)
+        except BaseException:
+            # The request went away before the call opened
+            self._leave(flight)
+            raise
+        if flight.open_error is not None:
+            self._leave(flight)
+            raise flight.open_error
+        return AsyncSharedStream(self, flight)
+
+    async def _pump(self, flight, open_stream, on_done):
+        try:
+            upstream = await open_stream()
+        except Exception as e:
+            self._forget(flight)
+            async with flight.changed:
+                flight.open_error = e
+                flight.done = True
+                flight.changed.notify_all()
+            return
+        except asyncio.CancelledError:
+            # Every subscriber left while the call was being opened
+            self._forget(flight)
+            flight.open_error = RuntimeError("upstream call abandoned")
+            flight.done = True
+            raise
+
+        async with flight.changed:
+            flight.upstream = upstream
+            flight.opened = True
+            flight.changed.notify_all()
+        try:
+            async for chunk in upstream:
+                async with flight.changed:
+                    flight.chunks.append(chunk)
+                    flight.changed.notify_all()
+        except Exception as e:
+            flight.stream_error = e
+        finally:
+            self._forget(flight)
+            try:
+                await upstream.aclose()
+            finally:
+                flight.done = True
+                if on_done is not None:
+                    on_done()
+                # Notifying needs the lock; skipped when the task itself is being cancelled
+                if not asyncio.current_task().cancelling():
+                    async with flight.changed:
+                        flight.changed.notify_all()
+
+    def _forget(self, flight):
+        if self.flights.get(flight.key) is flight:
+            del self.flights[flight.key]
+
+    def _leave(self, flight):
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            self._forget(flight)
+            if flight.task is not None:
+                flight.task.cancel()
+
+    def stats(self):
+        return {"upstream_calls": self.upstream_calls, "coalesced": self.coalesced, "in_flight": len(self.flights)}
+
+
+# Process-wide coalescer used by the app variants
+coalescer = Coalescer()
+metrics.register("single_flight", coalescer.stats)
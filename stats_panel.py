@@ -0,0 +1,52 @@
+import streamlit as st
+
+from telemetry import metrics
+
+# Events summed into the panel's headline numbers
+HEADLINE_EVENTS = ("turns", "cache_hits", "faq_hits", "coalesced", "guardrail_blocks", "retries", "upstream_failures",
+                   "escalations", "completion_tokens")
+
+
+# Function to draw the live stats panel in the sidebar. With on_change="rerun" the body
+# only runs while the panel is open, so a closed panel costs nothing per rerun.
+def render_stats_panel(variant, session_state=None):
+    panel = st.sidebar.expander("Performance", key="stats_panel", on_change="rerun")
+    if not panel.open:
+        return
+    with panel:
+        snapshot = metrics.snapshot(variant)
+        events = snapshot["events"]
+        lookups = events.get("cache_hits", 0) + events.get("cache_misses", 0)
+        st.caption(
+            " · ".join(f"{name.replace('_', ' ')} {events.get(name, 0)}" for name in HEADLINE_EVENTS)
+            + (f" · cache hit rate {events.get('cache_hits', 0) / lookups:.0%}" if lookups else "")
+        )
+        if snapshot["stages"]:
+            st.dataframe(
+                [{"stage": s["stage"], "calls": s["count"], "p50 ms": s["p50_ms"], "p95 ms": s["p95_ms"]}
+                 for s in snapshot["stages"]],
+                hide_index=True,
+            )
+
+        # This session's last turn
+        last = session_state.get("last_trace") if session_state is not None else None
+        if last:
+            st.caption(f"Last turn: {last['total_ms']:.1f} ms")
+            route = last.get("details", {}).get("route")
+            if route:
+                st.caption(
+                    "Routed to " + " → ".join(attempt["model"] for attempt in route["attempts"])
+                    + f" (score {route['score']}), est. {route['cost_usd']:.6f} USD vs {route['baseline_cost_usd']:.6f} fixed"
+                )
+            st.dataframe(
+                [{"span": s["name"], "start ms": s["start_ms"], "ms": s["ms"]} for s in last["spans"]],
+                hide_index=True,
+            )
+
+        renderer = session_state.get("history_renderer") if session_state is not None else None
+        if renderer is not None:
+            history = renderer.stats()
+            st.caption(
+                f"History: {history['messages_drawn']} messages drawn, "
+                f"last {history['last_ms']:.1f} ms, p50 {history['p50_ms']:.1f} ms"
+            )
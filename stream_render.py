@@ -0,0 +1,91 @@
+import time
+
+import streamlit as st
+
+from telemetry import note
+
+# Frame budget: chunks are drawn together once either limit is reached
+FRAME_INTERVAL = 0.04    # seconds between frames
+FRAME_CHARS = 200        # characters waiting before a frame is drawn early
+
+
+# Function to get the text of one stream chunk: strings as they are, OpenAI chat chunks
+# by their delta, anything else None
+def _chunk_text(chunk):
+    if isinstance(chunk, str):
+        return chunk
+    choices = getattr(chunk, "choices", None)
+    if choices is not None:
+        delta = choices[0].delta if choices else None
+        return (delta.content if delta is not None else None) or ""
+    return None
+
+
+# Draws a reply stream like `st.write_stream`, but in frames instead of one update per
+# chunk. Each frame redraws the text so far with `st.markdown`, as `st.write_stream`
+# does, so the reply renders the same; only the number of redraws changes.
+class FrameRenderer:
+    def __init__(self, interval=FRAME_INTERVAL, max_chars=FRAME_CHARS):
+        self.interval = interval
+        self.max_chars = max_chars
+        self.parts = []
+        self.run = ""            # text of the current run, drawn in `placeholder`
+        self.pending = 0         # characters received since the last frame
+        self.placeholder = None
+        self.last_frame = 0.0
+        self.frames = 0
+        self.chunks = 0
+
+    def add(self, text):
+        self.parts.append(text)
+        self.run += text
+        self.pending += len(text)
+        self.chunks += 1
+        now = time.perf_counter()
+        # The first text is drawn at once so time to first token is not delayed
+        if self.placeholder is None or self.pending >= self.max_chars or now - self.last_frame >= self.interval:
+            self.frame(now)
+
+    # Function to draw the text received since the last frame
+    def frame(self, now=None):
+        if not self.pending:
+            return
+        if self.placeholder is None:
+            self.placeholder = st.empty()
+        self.placeholder.markdown(self.run)
+        self.frames += 1
+        self.pending = 0
+        self.last_frame = now or time.perf_counter()
+
+    # Function to end the current text run before something else is drawn in between
+    def break_run(self):
+        self.frame()
+        self.run = ""
+        self.placeholder = None
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+
+# Function to draw a reply stream in frames and return its full text, exactly as
+# received. Drop-in for `st.write_stream` with text streams (strings or OpenAI chat
+# chunks); callables in the stream are called and other objects passed to `st.write`.
+def write_stream(stream, interval=FRAME_INTERVAL, max_chars=FRAME_CHARS):
+    renderer = FrameRenderer(interval, max_chars)
+    try:
+        for chunk in stream:
+            text = _chunk_text(chunk)
+            if text:
+                renderer.add(text)
+            elif text is None:
+                renderer.break_run()
+                if callable(chunk):
+                    chunk()
+                else:
+                    st.write(chunk)
+        renderer.frame()
+    finally:
+        note("stream_chunks", renderer.chunks)
+        note("render_frames", renderer.frames)
+    return renderer.text
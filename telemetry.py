@@ -0,0 +1,352 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Export settings; both are off unless set
+TRACE_LOG = os.environ.get("TRACE_LOG")                    # JSON-lines file, one record per turn ("-" for stderr)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))    # serve /metrics from the Streamlit apps on this port
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PREFIX = "healthbot"
+
+# Histogram bucket bounds in seconds, from in-process routing to slow upstream replies
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RECENT_SAMPLES = 200      # samples per stage kept for the sidebar percentiles
+NO_VARIANT = "-"          # label for work done outside a traced turn (e.g. batch runs)
+
+
+# Latency histogram with fixed buckets (for export) and a window of recent samples
+# (for percentiles in the sidebar)
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def percentile(self, fraction):
+        samples = sorted(self.recent)
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))] if samples else 0.0
+
+
+# Process-wide stage timings and event counters, labelled by app variant. Other modules
+# register collectors (functions returning their stats dicts) to be exported alongside.
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}       # (variant, stage) -> Histogram
+        self.events = {}       # (variant, event) -> count
+        self.collectors = {}   # name -> function returning a dict or list of dicts
+
+    def observe(self, variant, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get((variant, stage))
+            if histogram is None:
+                histogram = self.stages[(variant, stage)] = Histogram()
+            histogram.observe(seconds)
+
+    def add(self, variant, event, amount=1):
+        with self.lock:
+            self.events[(variant, event)] = self.events.get((variant, event), 0) + amount
+
+    def register(self, name, collect):
+        self.collectors[name] = collect
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.events.clear()
+
+    # Function to summarize every stage and event, optionally for one variant only
+    def snapshot(self, variant=None):
+        with self.lock:
+            stages = [
+                {
+                    "variant": v, "stage": stage, "count": h.count, "total_ms": round(h.sum * 1000, 3),
+                    "p50_ms": round(h.percentile(0.5) * 1000, 3), "p95_ms": round(h.percentile(0.95) * 1000, 3),
+                }
+                for (v, stage), h in sorted(self.stages.items()) if variant in (None, v)
+            ]
+            events = {f"{v}/{e}" if variant is None else e: n
+                      for (v, e), n in sorted(self.events.items()) if variant in (None, v)}
+        return {"stages": stages, "events": events}
+
+    # Function to render everything in the Prometheus text exposition format
+    def prometheus(self):
+        lines = [f"# TYPE {METRICS_PREFIX}_stage_seconds histogram"]
+        with self.lock:
+            for (variant, stage), h in sorted(self.stages.items()):
+                labels = f'variant="{_escape(variant)}",stage="{_escape(stage)}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), h.counts):
+                    cumulative += count
+                    lines.append(f'{METRICS_PREFIX}_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{METRICS_PREFIX}_stage_seconds_sum{{{labels}}} {h.sum:.6f}")
+                lines.append(f"{METRICS_PREFIX}_stage_seconds_count{{{labels}}} {h.count}")
+            lines.append(f"# TYPE {METRICS_PREFIX}_events_total counter")
+            for (variant, event), count in sorted(self.events.items()):
+                lines.append(
+                    f'{METRICS_PREFIX}_events_total{{variant="{_escape(variant)}",event="{_escape(event)}"}} {count}'
+                )
+        for name, collect in list(self.collectors.items()):
+            try:
+                samples = list(_flatten(f"{METRICS_PREFIX}_{name}", collect(), ()))
+            except Exception:
+                continue
+            for metric in sorted({metric for metric, _, _ in samples}):
+                lines.append(f"# TYPE {metric} gauge")
+            for metric, labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels)
+                lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Function to turn a collector's stats into (metric, labels, number) samples: numbers
+# become samples, strings become labels, nested dicts extend the name, and lists of
+# dicts become one labelled sample set per item
+def _flatten(name, value, labels):
+    if isinstance(value, list):
+        for item in value:
+            yield from _flatten(name, item, labels)
+        return
+    if not isinstance(value, dict):
+        return
+    labels = labels + tuple((key, val) for key, val in value.items() if isinstance(val, str))
+    for key, val in value.items():
+        if isinstance(val, bool):
+            yield f"{name}_{key}", labels, int(val)
+        elif isinstance(val, (int, float)):
+            yield f"{name}_{key}", labels, val
+        elif isinstance(val, (dict, list)):
+            yield from _flatten(f"{name}_{key}", val, labels)
+
+
+metrics = Metrics()
+_current = contextvars.ContextVar("telemetry_trace", default=None)
+
+
+# The spans and events of one user turn. Started when the message arrives and
+# finished once the reply is shown; finishing records the turn and writes the trace
+# to the JSON log.
+class Trace:
+    def __init__(self, variant):
+        self.variant = variant
+        self.id = uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.timestamp = time.time()
+        self.spans = []
+        self.events = {}
+        self.details = {}
+        self.total = None
+        self.token = None
+
+    def add_span(self, name, start, seconds):
+        self.spans.append((name, start - self.started, seconds))
+
+    def add(self, event, amount=1):
+        self.events[event] = self.events.get(event, 0) + amount
+
+    # Function to attach a structured record (e.g. a routing decision) to the trace
+    def detail(self, name, value):
+        self.details[name] = value
+
+    def finish(self):
+        if self.total is not None:
+            return
+        self.total = time.perf_counter() - self.started
+        metrics.observe(self.variant, "turn", self.total)
+        metrics.add(self.variant, "turns")
+        write_trace(self.as_dict())
+
+    def as_dict(self):
+        return {
+            "trace_id": self.id,
+            "variant": self.variant,
+            "ts": round(self.timestamp, 3),
+            "total_ms": round(self.total * 1000, 3) if self.total is not None else None,
+            "spans": [{"name": name, "start_ms": round(start * 1000, 3), "ms": round(seconds * 1000, 3)}
+                      for name, start, seconds in self.spans],
+            "events": self.events,
+            "details": self.details,
+        }
+
+
+# Function to start tracing a turn; spans recorded in this context (and in threads or
+# tasks started from it) attach to the returned trace
+def start_trace(variant):
+    trace = Trace(variant)
+    trace.token = _current.set(trace)
+    if METRICS_PORT:
+        serve_metrics()
+    return trace
+
+
+# Function to finish a trace started in this context, after which spans no longer
+# attach to it
+def end_trace(trace):
+    trace.finish()
+    _current.reset(trace.token)
+
+
+def current_trace():
+    return _current.get()
+
+
+# Function to record one timed stage in the metrics and in the trace of its turn
+def record_span(name, start, seconds, trace=None):
+    trace = trace or _current.get()
+    metrics.observe(trace.variant if trace else NO_VARIANT, name, seconds)
+    if trace is not None:
+        trace.add_span(name, start, seconds)
+
+
+# Function to count an event (cache hit, retry, tokens...) in the metrics and the trace
+def note(event, amount=1, trace=None):
+    trace = trace or _current.get()
+    metrics.add(trace.variant if trace else NO_VARIANT, event, amount)
+    if trace is not None:
+        trace.add(event, amount)
+
+
+# Times the block it wraps: `with Span("render"): ...`
+class Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_span(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+# Function to decorate a function so every call is recorded as a span
+def traced(name=None):
+    def decorate(fn):
+        stage = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record_span(stage, start, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorate
+
+
+# Times one upstream reply stream, from the response headers onwards: time to the
+# first text chunk, the whole stream, time spent decoding chunks, and completion
+# tokens. Streams may be read on another thread or task, so the turn's trace is
+# captured when the stream is opened.
+class StreamTimer:
+    def __init__(self):
+        self.trace = _current.get()
+        self.start = time.perf_counter()
+        self.first = None
+        self.parse = 0.0
+        self.done = False
+
+    def chunk(self):
+        if self.first is None:
+            self.first = time.perf_counter()
+            record_span("first_token", self.start, self.first - self.start, self.trace)
+
+    def finish(self, text, usage=None, error=None):
+        if self.done:
+            return
+        self.done = True
+        record_span("stream", self.start, time.perf_counter() - self.start, self.trace)
+        if self.parse:
+            record_span("parse", self.start, self.parse, self.trace)
+        usage = usage or {}
+        if usage.get("promptTokenCount"):
+            note("prompt_tokens", usage["promptTokenCount"], self.trace)
+        if usage.get("candidatesTokenCount"):
+            note("completion_tokens", usage["candidatesTokenCount"], self.trace)
+        elif text:
+            from context_budget import count_tokens
+            note("completion_tokens", count_tokens(text), self.trace)
+        if error:
+            note("stream_errors", trace=self.trace)
+
+
+_log_lock = threading.Lock()
+_log_file = None
+
+
+# Function to append one trace record to the JSON log, if TRACE_LOG is set
+def write_trace(record):
+    global _log_file
+    if not TRACE_LOG:
+        return
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with _log_lock:
+        if _log_file is None:
+            _log_file = sys.stderr if TRACE_LOG == "-" else open(TRACE_LOG, "a", encoding="utf-8", buffering=1)
+        _log_file.write(line)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] == "/metrics":
+            body, content_type = metrics.prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+        elif self.path.split("?", 1)[0] == "/stats":
+            body, content_type = json.dumps(metrics.snapshot()).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server_lock = threading.Lock()
+_server_started = False
+
+
+# Function to serve /metrics (Prometheus text) and /stats (JSON) on a background thread,
+# once per process. The Streamlit apps have no routes of their own to put them on.
+def serve_metrics(port=METRICS_PORT, host=METRICS_HOST):
+    global _server_started
+    with _server_lock:
+        if _server_started:
+            return
+        _server_started = True
+        try:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            # Another process (e.g. a second Streamlit server) already serves this port
+            print(f"telemetry: not serving metrics on {host}:{port}: {e}", file=sys.stderr)
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("starlette")
+
+import chat_api  # noqa: E402
+from chat_api import ChatService, Overloaded, UnknownProvider, error_response  # noqa: E402
+from conversation_store import ConversationStore, SQLiteBackend  # noqa: E402
+from providers import ProviderError  # noqa: E402
+from resilience import CircuitOpenError, QuotaExceededError  # noqa: E402
+from response_cache import completion_cache  # noqa: E402
+
+UPSTREAM_QUESTION = "Could you explain how owls sleep during the day"
+
+
+# An upstream provider that streams a fixed reply and records the requests it got
+class FakeProvider:
+    name = "fake/model"
+
+    def __init__(self):
+        self.requests = []
+
+    async def stream(self, request):
+        self.requests.append(request)
+        return self._chunks()
+
+    async def _chunks(self):
+        for chunk in ("Owls ", "sleep ", "upright."):
+            yield chunk
+
+
+class NoClients:
+    async def aclose(self):
+        pass
+
+
+def run_turn(service, message, provider_name=None):
+    async def turn():
+        session = await service.session()
+        turn = await service.start_turn(session, message, provider_name)
+        return turn.source, await turn.collect()
+
+    return asyncio.run(turn())
+
+
+@pytest.fixture
+def service():
+    completion_cache.clear()
+    yield ChatService({"fake": FakeProvider()}, NoClients(), store=ConversationStore(SQLiteBackend(":memory:")))
+    completion_cache.clear()
+
+
+def test_local_stages_answer_without_upstream(service):
+    assert run_turn(service, "hello")[0] == "local"
+    assert service.providers["fake"].requests == []
+
+
+def test_upstream_reply_is_streamed_then_cached(service):
+    assert run_turn(service, UPSTREAM_QUESTION) == ("fake/model", "Owls sleep upright.")
+    request = service.providers["fake"].requests[0]
+    assert request[-1]["content"] == UPSTREAM_QUESTION
+    assert run_turn(service, UPSTREAM_QUESTION) == ("cache", "Owls sleep upright.")
+    assert len(service.providers["fake"].requests) == 1
+
+
+def test_guardrails_block_before_upstream(service):
+    source, reply = run_turn(service, "I want to kill myself, is there a medicine")
+    assert source == "guardrail" and reply
+    assert service.counters["blocked"] == 1
+
+
+def test_unknown_provider_is_rejected(service):
+    with pytest.raises(UnknownProvider):
+        run_turn(service, UPSTREAM_QUESTION, "nope")
+
+
+def test_full_upstream_is_overloaded(service):
+    service.max_upstream, service.queue_timeout = 0, 0.01
+    service.slots = asyncio.Semaphore(0)
+    with pytest.raises(Overloaded):
+        run_turn(service, UPSTREAM_QUESTION)
+    assert service.counters["rejected"] == 1
+
+
+@pytest.mark.parametrize("error, status, retry_after", [
+    (Overloaded("busy"), 503, "1"),
+    (CircuitOpenError("gemini", 12.2), 503, "13"),
+    (QuotaExceededError("gemini", 3), 429, "3"),
+    (ProviderError("bad gateway"), 502, None),
+])
+def test_error_responses(error, status, retry_after):
+    response = error_response(error)
+    assert response.status_code == status
+    assert response.headers.get("retry-after") == retry_after
+    assert json.loads(response.body) == {"error": str(error)}
+
+
+def test_service_follows_the_pipeline_variant():
+    assert chat_api.VARIANT is chat_api.VARIANTS["chat_api.py"]
+    service = ChatService({"gemini": FakeProvider(), "fake": FakeProvider()}, NoClients(),
+                          store=ConversationStore(SQLiteBackend(":memory:")))
+    assert service.default_provider == chat_api.VARIANT["upstream"]["provider"]
+    assert service.stages == chat_api.VARIANT["stages"]
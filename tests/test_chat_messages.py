@@ -0,0 +1,64 @@
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_messages import Message, gemini_body, openai_body  # noqa: E402
+from conversation_store import SQLiteBackend  # noqa: E402
+
+HISTORY = [
+    {"role": "system", "content": "You are a healthcare assistant."},
+    {"role": "user", "content": "J'ai mal à la tête 🤕, \"depuis\" hier\n"},
+    {"role": "assistant", "content": "Since yesterday? Any fever?"},
+]
+
+
+@pytest.mark.parametrize("messages", [HISTORY, [Message.coerce(m) for m in HISTORY]])
+def test_openai_body_round_trips(messages):
+    body = json.loads(openai_body("gpt-3.5-turbo", messages, stream=True))
+    assert body == {"model": "gpt-3.5-turbo", "messages": HISTORY, "stream": True}
+
+
+def test_gemini_body_round_trips():
+    body = json.loads(gemini_body([Message.coerce(m) for m in HISTORY]))
+    assert body == {
+        "contents": [
+            {"role": "user", "parts": [{"text": HISTORY[1]["content"]}]},
+            {"role": "model", "parts": [{"text": HISTORY[2]["content"]}]},
+        ],
+        "systemInstruction": {"parts": [{"text": HISTORY[0]["content"]}]},
+    }
+
+
+def test_message_reads_like_a_dict():
+    message = Message("user", HISTORY[1]["content"])
+    assert message["content"] == message.content == HISTORY[1]["content"]
+    assert message == HISTORY[1] and message == Message.coerce(HISTORY[1])
+    assert json.loads(message.to_json()) == HISTORY[1]
+
+
+def test_json_history_is_migrated(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    db = sqlite3.connect(path)
+    db.executescript(
+        """
+        CREATE TABLE messages (conversation_id TEXT NOT NULL, seq INTEGER NOT NULL, message TEXT NOT NULL,
+                               PRIMARY KEY (conversation_id, seq)) WITHOUT ROWID;
+        """
+    )
+    db.executemany("INSERT INTO messages VALUES (?, ?, ?)",
+                   [("c1", seq, json.dumps(message)) for seq, message in enumerate(HISTORY)])
+    db.commit()
+    db.close()
+
+    backend = SQLiteBackend(path)
+    try:
+        assert backend.load("c1", 0, len(HISTORY)) == HISTORY
+        columns = [row[1] for row in backend.db.execute("PRAGMA table_info(messages)")]
+        assert columns == ["conversation_id", "seq", "role", "content"]
+    finally:
+        backend.close()
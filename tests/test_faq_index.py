@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("numpy")
+
+from faq_index import FAQIndex  # noqa: E402
+
+ENTRIES = [
+    {"questions": ["What are the signs of diabetes?", "What are the symptoms of diabetes?"],
+     "answer": "Common signs include thirst, frequent urination and fatigue."},
+    {"questions": ["How much sleep do adults need?", "How many hours should an adult sleep?"],
+     "answer": "Most adults need 7 to 9 hours of sleep a night."},
+    {"questions": ["How can I lower my blood pressure?"],
+     "answer": "Cut down on salt, stay active and limit alcohol."},
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    return FAQIndex.build(ENTRIES, str(tmp_path / "faq_index"))
+
+
+@pytest.mark.parametrize("question", ["What are the symptoms of diabetes?", "what are the signs of diabetes"])
+def test_close_question_is_answered(index, question):
+    assert index.answer(question) == ENTRIES[0]["answer"]
+
+
+@pytest.mark.parametrize("question", ["Tell me a fun fact about owls", "Does diabetes run in families?"])
+def test_other_questions_are_not_answered(index, question):
+    assert index.answer(question) is None
+
+
+def test_grounding_passages_use_the_lower_threshold(index):
+    passages = index.passages("signs of diabetes in adults")
+    assert passages == [ENTRIES[0]["answer"]]
+    assert index.answer("signs of diabetes in adults") is None
+
+
+def test_rebuild_replaces_the_index_in_place(tmp_path, index):
+    directory = str(tmp_path / "faq_index")
+    rebuilt = FAQIndex.build(ENTRIES[:1], directory, source="v2")
+
+    assert rebuilt.meta["answers"] == 1 and rebuilt.meta["source"] == "v2"
+    # The old index stays readable through its mapped files, and no build files are left
+    assert index.answer("How much sleep do adults need?") == ENTRIES[1]["answer"]
+    assert sorted(os.listdir(tmp_path)) == ["faq_index"]
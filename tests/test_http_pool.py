@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_pool  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clean_pool():
+    http_pool.close_all()
+    yield
+    http_pool.close_all()
+
+
+def test_openai_client_uses_the_pooled_http_client():
+    pytest.importorskip("openai")
+    assert http_pool.httpx is not None, "neither httpx2 nor httpx could be imported"
+
+    client = http_pool.get_openai_client("test-key")
+
+    # The SDK's own default client has no request hook; ours counts every request
+    http_client = client._client
+    assert isinstance(http_client, http_pool.httpx.Client)
+    assert len(http_client.event_hooks["request"]) == 1
+    assert client.max_retries == 0
+
+
+def test_openai_client_is_shared_per_api_key():
+    pytest.importorskip("openai")
+
+    client = http_pool.get_openai_client("test-key")
+    assert http_pool.get_openai_client("test-key") is client
+    assert http_pool.get_openai_client("other-key") is not client
+    assert len(http_pool.pool_stats()["clients"]) == 2
+
+
+def test_client_in_use_survives_eviction(monkeypatch):
+    pytest.importorskip("openai")
+    monkeypatch.setattr(http_pool, "MAX_CLIENTS", 2)
+
+    held = http_pool.get_openai_client("held-key")
+    http_pool.get_openai_client("second-key")
+    http_pool.get_openai_client("third-key")
+
+    # Pushed out of the cache by the cap, but still open for the caller holding it
+    assert len(http_pool.pool_stats()["clients"]) == 2
+    assert not held._client.is_closed
+    assert http_pool.get_openai_client("held-key") is not held
+
+
+def test_idle_clients_are_closed(monkeypatch):
+    pytest.importorskip("openai")
+    idle = http_pool.get_openai_client("idle-key")
+    later = time.monotonic() + http_pool.IDLE_TIMEOUT + 1
+    monkeypatch.setattr(http_pool.time, "monotonic", lambda: later)
+
+    http_pool.get_openai_client("other-key")
+    assert idle._client.is_closed
+    assert [client["key_id"] for client in http_pool.pool_stats()["clients"]] == [http_pool._key_id("other-key")]
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prefetch  # noqa: E402
+from prefetch import FOLLOW_UPS, Prefetcher, match_follow_up  # noqa: E402
+from response_cache import completion_cache  # noqa: E402
+
+
+@pytest.fixture
+def predictions():
+    return {follow_up["name"]: {"answer": follow_up["answer"]} for follow_up in FOLLOW_UPS["cough"]}
+
+
+@pytest.mark.parametrize("user_input", ["It is a dry cough.", "it is a dry cough", "  It is a DRY cough!  "])
+def test_quick_reply_matches_its_prediction(predictions, user_input):
+    assert match_follow_up(user_input, predictions) == "dry"
+
+
+@pytest.mark.parametrize("user_input", [
+    "I have a fever but my breathing is fine",
+    "I can't sleep because of a sharp pain in my chest",
+    "it's dry",
+    "no, it is not a dry cough",
+    "It is a dry cough, and I also have a sharp chest pain.",
+])
+def test_typed_replies_are_never_matched(predictions, user_input):
+    assert match_follow_up(user_input, predictions) is None
+
+
+@pytest.fixture
+def prefetcher(monkeypatch):
+    completion_cache.clear()
+    monkeypatch.setattr(prefetch, "generate_content",
+                        lambda url, payload, session=None, timeout=None: {"candidates": [
+                            {"content": {"parts": [{"text": "predicted reply"}]}}]})
+    prefetcher = Prefetcher("http://upstream.invalid", session=None, budget=6)
+    prefetcher.schedule("cough", "Is it a dry cough or with mucus?", {})
+    yield prefetcher
+    prefetcher.cancel()
+    completion_cache.clear()
+
+
+def test_lookup_serves_a_clicked_suggestion(prefetcher):
+    assert "It is a dry cough." in prefetcher.suggestions()
+    assert prefetcher.lookup("It is a dry cough.") == "predicted reply"
+    assert prefetcher.suggestions() == []
+
+
+def test_lookup_answers_nothing_for_a_paraphrase(prefetcher):
+    assert prefetcher.lookup("I have a fever but my breathing is fine") is None
+    assert prefetcher.suggestions() == []
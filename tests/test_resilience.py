@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import resilience  # noqa: E402
+from resilience import CircuitBreaker, QuotaExceededError, call_with_retry  # noqa: E402
+from shared_state import MemoryBackend  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+
+# An SDK error carrying the status of the response it came from
+class FakeStatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(status_code, headers)
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    store = MemoryBackend()
+    breaker = CircuitBreaker("test", failure_threshold=2, store=store)
+    monkeypatch.setattr(resilience, "get_breaker", lambda endpoint: breaker)
+    monkeypatch.setattr(resilience, "quota", resilience.QuotaTracker(store=store))
+    return breaker
+
+
+@pytest.mark.parametrize("outcome", [FakeResponse(400), FakeResponse(401), FakeStatusError(400),
+                                     FakeStatusError(401), FakeStatusError(403)])
+def test_client_errors_do_not_open_the_circuit(breaker, outcome):
+    for _ in range(5):
+        try:
+            call_with_retry("test", lambda: _answer(outcome), sleep=lambda delay: None, api_key="bad-key")
+        except FakeStatusError:
+            pass
+    assert breaker.as_dict()["state"] == "closed"
+
+
+@pytest.mark.parametrize("outcome", [FakeResponse(429, {"Retry-After": "5"}),
+                                     FakeStatusError(429, {"Retry-After": "5"})])
+def test_rate_limits_pause_the_key_not_the_endpoint(breaker, outcome):
+    try:
+        call_with_retry("test", lambda: _answer(outcome), sleep=lambda delay: None, api_key="busy-key")
+    except (FakeStatusError, QuotaExceededError):
+        pass
+    assert breaker.as_dict()["state"] == "closed"
+    with pytest.raises(QuotaExceededError):
+        call_with_retry("test", lambda: FakeResponse(200), api_key="busy-key")
+    assert call_with_retry("test", lambda: FakeResponse(200), api_key="other-key").status_code == 200
+
+
+@pytest.mark.parametrize("outcome", [FakeResponse(500), FakeResponse(503), FakeStatusError(502)])
+def test_server_errors_open_the_circuit(breaker, outcome):
+    for _ in range(2):
+        try:
+            call_with_retry("test", lambda: _answer(outcome), sleep=lambda delay: None, max_attempts=1)
+        except FakeStatusError:
+            pass
+    assert breaker.as_dict()["state"] == "open"
+
+
+def _answer(outcome):
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome